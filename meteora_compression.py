@@ -0,0 +1,164 @@
+import gzip
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，未安装时只生成 .gz
+    brotli = None
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 预压缩的编码 -> 文件后缀（静态服务器如 nginx gzip_static / brotli_static 直接返回同名压缩文件）
+COMPRESSED_SUFFIXES = {"gzip": ".gz", "brotli": ".br"}
+DEFAULT_COMPRESSION = ("gzip", "brotli")
+
+# 预压缩只在发布时做一次，使用较高的压缩等级；brotli 的 11 级对大分片太慢
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+def available_encodings(encodings: Iterable[str] = DEFAULT_COMPRESSION) -> List[str]:
+    """过滤出当前环境可用的压缩编码（未安装 brotli 时忽略 brotli）"""
+    unknown = set(encodings) - set(COMPRESSED_SUFFIXES)
+    if unknown:
+        raise ValueError(f"不支持的压缩编码: {sorted(unknown)}")
+    return [encoding for encoding in encodings if encoding != "brotli" or brotli is not None]
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # mtime=0：内容相同的文件压缩结果相同
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+
+def decompress_bytes(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    return brotli.decompress(data)
+
+
+def remove_compressed_siblings(path: str):
+    """删除文件的压缩副本；重写文件后调用，发布时会重新压缩"""
+    for suffix in COMPRESSED_SUFFIXES.values():
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def compress_file(path: str, encodings: List[str]) -> Dict[str, int]:
+    """
+    为文件写入缺失的压缩副本（先写临时文件再替换）
+
+    Returns:
+        Dict[str, int]: 原始大小和各编码压缩后的大小（字节）
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    sizes = {"raw": len(data)}
+    for encoding in encodings:
+        target = path + COMPRESSED_SUFFIXES[encoding]
+        if not os.path.exists(target):
+            tmp_file = target + ".tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(compress_bytes(data, encoding))
+            os.replace(tmp_file, target)
+        sizes[encoding] = os.path.getsize(target)
+    return sizes
+
+
+def _json_files(directory: str) -> List[str]:
+    """目录树中的所有 JSON 文件（相对路径，按名称排序）"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.endswith(".json"):
+                files.append(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/'))
+    return sorted(files)
+
+
+def _file_group(name: str) -> str:
+    """按文件类型汇总大小：wallets_0a.json -> wallets_*.json，wallet_prefix/1f.json -> wallet_prefix/*.json"""
+    if '/' in name:
+        return name.rsplit('/', 1)[0] + "/*.json"
+    return re.sub(r'_[0-9a-f]+\.json$', '_*.json', name)
+
+
+def _remove_orphan_siblings(directory: str) -> int:
+    """删除原文件已不存在的压缩副本（例如已删除的旧分片）"""
+    removed = 0
+    for root, _, names in os.walk(directory):
+        for name in names:
+            base, suffix = os.path.splitext(name)
+            if suffix in COMPRESSED_SUFFIXES.values() and base not in names:
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
+
+
+def compress_output_dir(directory: str, encodings: Iterable[str] = DEFAULT_COMPRESSION,
+                        max_workers: int = None) -> dict:
+    """
+    为目录中的每个 JSON 文件（分片、索引、列表等）生成预压缩副本，按文件并行压缩；
+    已有副本的文件（增量发布时继承的未变化文件）直接跳过。
+    原始和压缩后的大小写入 metadata.json 的 compression 字段，最后再压缩 metadata.json 本身
+
+    Args:
+        directory: 输出目录（发布版本目录）
+        encodings: 压缩编码，"gzip" 和/或 "brotli"（未安装 brotli 时忽略）
+        max_workers: 并行压缩的线程数（zlib/brotli 压缩时释放GIL）
+
+    Returns:
+        dict: 写入 metadata.json 的压缩统计
+    """
+    encodings = available_encodings(encodings)
+    if not encodings:
+        return {}
+
+    _remove_orphan_siblings(directory)
+    files = [name for name in _json_files(directory) if name != "metadata.json"]
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        sizes = list(executor.map(lambda name: compress_file(os.path.join(directory, name), encodings), files))
+
+    # 按文件类型汇总（每个分片单独记录会让前端每次下载的 metadata.json 变大）
+    groups = {}
+    for name, size in zip(files, sizes):
+        group = groups.setdefault(_file_group(name), dict.fromkeys(["files", "raw"] + encodings, 0))
+        group["files"] += 1
+        for key, value in size.items():
+            group[key] += value
+
+    summary = {
+        "encodings": encodings,
+        "suffixes": {encoding: COMPRESSED_SUFFIXES[encoding] for encoding in encodings},
+        "raw_bytes": sum(size["raw"] for size in sizes),
+        "compressed_bytes": {encoding: sum(size[encoding] for size in sizes) for encoding in encodings},
+        "groups": groups
+    }
+
+    metadata_file = os.path.join(directory, "metadata.json")
+    if os.path.exists(metadata_file):
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        metadata["compression"] = summary
+        tmp_file = metadata_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(tmp_file, metadata_file)
+        remove_compressed_siblings(metadata_file)
+        compress_file(metadata_file, encodings)
+
+    ratios = ", ".join(f"{encoding} {summary['compressed_bytes'][encoding] / max(summary['raw_bytes'], 1):.1%}"
+                       for encoding in encodings)
+    logger.info(f"预压缩完成: {len(files)} 个文件，原始 {summary['raw_bytes'] / 1024:.1f} KB，压缩后 {ratios}")
+    return summary
@@ -1,14 +1,38 @@
+import cProfile
+import hashlib
+import heapq
 import json
 import logging
 import os
+import shutil
+import sqlite3
+import sys
+import threading
 import time
 from collections import defaultdict
-from typing import Dict, List
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
+from pandas.api.types import union_categoricals
 from dune_client.client import DuneClient
 
+from meteora_compression import (DEFAULT_COMPRESSION, available_encodings, compress_output_dir,
+                                 remove_compressed_siblings)
+from meteora_pair_table import LazyItemsView, WalletPairTable
+from meteora_prefix_index import (PREFIX_BLOCK_DIR, PREFIX_INDEX_FILE, WalletPrefixIndex, add_wallets_to_prefix_index,
+                                  build_prefix_index, prefix_index_summary)
+
+try:
+    import resource  # 仅类Unix系统提供，用于读取峰值常驻内存
+except ImportError:
+    resource = None
+
 # 加载环境变量
 load_dotenv()
 
@@ -16,29 +40,1275 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# FNV-1a 32位哈希参数（前端 fees_checker.html 使用相同算法定位分片）
+FNV_OFFSET_BASIS = 0x811c9dc5
+FNV_PRIME = 0x01000193
+
+# plan_shard_count 逐步增加分片数的最大次数（每次约增加5%）
+MAX_SHARD_PLAN_STEPS = 1000
+
+# 增量更新的变更日志文件名
+WALLET_CHANGES_FILE = "wallet_changes.jsonl"
+
+# 钱包-交易对状态的列式快照文件名
+WALLET_SNAPSHOT_FILE = "wallet_pairs_snapshot.npz"
+
+# 可选的文本导出格式（列式快照总是生成）
+EXPORT_FORMATS = ("csv", "json")
+
+# 批次合并的去重键，也是摄入时总是保留的必要列（滚动合并只保留这两列）
+MERGE_KEY_COLUMNS = ["evt_tx_signer", "lbPair"]
+
+# extra_columns 中包含该值时保留Dune查询返回的全部列
+ALL_COLUMNS = "*"
+
+# 运行指标报告和cProfile输出文件名
+RUN_METRICS_FILE = "run_metrics.json"
+RUN_PROFILE_FILE = "run_profile.prof"
+
+# Dune结果缓存文件名：记录每个查询最近一次已入库结果的执行ID和内容哈希
+RESULT_CACHE_FILE = "result_cache.json"
+
+# SQLite钱包存储（storage_backend="sqlite" 时代替JSON备份和列式快照）
+WALLET_STORE_FILE = "wallet_store.sqlite"
+STORAGE_BACKENDS = ("json", "sqlite")
+
+# 版本化发布：每次运行把输出文件写入 generations/<编号>/，完成后原子替换 current.json 指针
+GENERATIONS_DIR = "generations"
+CURRENT_POINTER_FILE = "current.json"
+DEFAULT_KEEP_GENERATIONS = 3  # 保留当前版本和之前的2个版本，正在读取旧版本的客户端不受影响
+
+# 反向索引（交易对 -> 钱包）：各交易对钱包数的完整统计，metadata.json 中只保留前 TOP_POOLS_LIMIT 个
+POOL_COUNTS_FILE = "pool_counts.json"
+TOP_POOLS_LIMIT = 100
+
+
+def wallet_shard_id(wallet: str, shard_count: int) -> int:
+    """
+    计算钱包地址所在的分片编号：FNV-1a 32位哈希对分片数取模
+    base58地址的各个字符（包括大小写）都参与哈希，分片大小均衡
+
+    Args:
+        wallet: 钱包地址
+        shard_count: 分片总数
+
+    Returns:
+        int: 分片编号 [0, shard_count)
+    """
+    h = FNV_OFFSET_BASIS
+    for byte in wallet.encode('utf-8'):
+        h = ((h ^ byte) * FNV_PRIME) & 0xffffffff
+    return h % shard_count
+
+
+def wallet_hashes(wallets: List[str]) -> np.ndarray:
+    """批量计算钱包地址的 FNV-1a 32位哈希（uint32）"""
+    if len(wallets) == 0:
+        return np.zeros(0, dtype=np.uint32)
+
+    encoded = np.array([wallet.encode('utf-8') for wallet in wallets])
+    lengths = np.char.str_len(encoded)
+    byte_matrix = encoded.view(np.uint8).reshape(len(wallets), -1)
+
+    h = np.full(len(wallets), FNV_OFFSET_BASIS, dtype=np.uint32)
+    prime = np.uint32(FNV_PRIME)
+    for j in range(byte_matrix.shape[1]):
+        active = lengths > j
+        h[active] = (h[active] ^ byte_matrix[active, j]) * prime
+
+    return h
+
+
+def wallet_shard_ids(wallets: List[str], shard_count: int) -> np.ndarray:
+    """批量计算分片编号，结果与 wallet_shard_id 相同"""
+    return (wallet_hashes(wallets) % np.uint32(shard_count)).astype(np.int64)
+
+
+def shard_id_width(shard_count: int) -> int:
+    """分片编号的16进制位数"""
+    return len(f"{max(shard_count - 1, 0):x}")
+
+
+def shard_filename(shard_id: int, shard_count: int) -> str:
+    """分片文件名，编号使用定宽16进制"""
+    return f"wallets_{shard_id:0{shard_id_width(shard_count)}x}.json"
+
+
+def pool_shard_filename(shard_id: int, shard_count: int) -> str:
+    """反向索引分片文件名，交易对地址按与钱包相同的 FNV-1a 哈希分片"""
+    return f"pools_{shard_id:0{shard_id_width(shard_count)}x}.json"
+
+
+class ShardIndex(Mapping):
+    """
+    钱包 -> 分片文件名 的只读映射（create_wallet_index 的返回值）
+    只保存按分片排列的钱包地址和每个钱包的分片编号，文件名在访问时生成
+    """
+
+    def __init__(self, wallets: np.ndarray, shard_ids: np.ndarray, shard_count: int):
+        self.wallets = wallets
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self._positions = None
+
+    def __len__(self) -> int:
+        return len(self.wallets)
+
+    def __iter__(self):
+        return iter(self.wallets.tolist())
+
+    def __getitem__(self, wallet: str) -> str:
+        if self._positions is None:
+            self._positions = pd.Index(self.wallets, dtype=object)
+        try:
+            position = self._positions.get_loc(wallet)
+        except (KeyError, TypeError):
+            raise KeyError(wallet)
+        return shard_filename(int(self.shard_ids[position]), self.shard_count)
+
+    def files(self) -> List[str]:
+        """用到的分片文件名（按分片编号排序）"""
+        return [shard_filename(shard_id, self.shard_count) for shard_id in np.unique(self.shard_ids).tolist()]
+
+    def iter_items(self):
+        filenames = {shard_id: shard_filename(shard_id, self.shard_count)
+                     for shard_id in np.unique(self.shard_ids).tolist()}
+        return zip(self.wallets.tolist(), (filenames[shard_id] for shard_id in self.shard_ids.tolist()))
+
+    def items(self):
+        return LazyItemsView(self)
+
+    def to_dict(self) -> Dict[str, str]:
+        return dict(self.iter_items())
+
+
+def build_pool_shard_data(group_key: str, pool_wallets: Dict[str, List[str]], created_at: str = None) -> dict:
+    """构建反向索引分片文件的数据结构：交易对 -> 钱包列表"""
+    return {
+        "group_info": {
+            "group_key": group_key,
+            "pool_count": len(pool_wallets),
+            "total_wallets": sum(len(wallets) for wallets in pool_wallets.values()),
+            "created_at": created_at or pd.Timestamp.now().isoformat()
+        },
+        "pools": pool_wallets
+    }
+
+
+def top_pool_counts(pool_counts: Dict[str, int], limit: int = TOP_POOLS_LIMIT) -> List[list]:
+    """按钱包数降序（相同时按地址）取前 limit 个交易对，返回 [交易对, 钱包数] 列表"""
+    top = heapq.nsmallest(limit, pool_counts.items(), key=lambda item: (-item[1], item[0]))
+    return [[pool, count] for pool, count in top]
+
+
+def build_shard_data(group_key: str, group_data: Dict[str, List[str]], shard_format: str = "json",
+                     created_at: str = None) -> dict:
+    """
+    构建分片文件的数据结构
+
+    Args:
+        group_key: 分片键
+        group_data: 钱包 -> 交易对列表
+        shard_format: "json" 直接存储交易对地址；"compact" 使用分片内的池子字典，
+            钱包只存储池子在字典中的整数下标
+        created_at: 创建时间，不提供则使用当前时间（批量写入时所有分片共用一个时间）
+
+    Returns:
+        dict: 可直接 json.dump 的分片数据
+    """
+    group_info = {
+        "group_key": group_key,
+        "wallet_count": len(group_data),
+        "total_pairs": sum(len(pairs) for pairs in group_data.values()),
+        "created_at": created_at or pd.Timestamp.now().isoformat()
+    }
+
+    if shard_format == "json":
+        return {"group_info": group_info, "wallets": group_data}
+
+    if shard_format != "compact":
+        raise ValueError(f"不支持的分片格式: {shard_format}")
+
+    # 按引用次数降序编号，热门池子使用更短的下标
+    pool_counts = defaultdict(int)
+    for pairs in group_data.values():
+        for pair in pairs:
+            pool_counts[pair] += 1
+    pools = sorted(pool_counts, key=lambda pair: (-pool_counts[pair], pair))
+    pool_ids = {pair: i for i, pair in enumerate(pools)}
+
+    group_info["format"] = "compact"
+    group_info["pool_count"] = len(pools)
+    return {
+        "group_info": group_info,
+        "pools": pools,
+        "wallets": {wallet: [pool_ids[pair] for pair in pairs] for wallet, pairs in group_data.items()}
+    }
+
+
+def decode_shard_wallets(file_data: dict) -> Dict[str, List[str]]:
+    """读取分片文件数据，兼容 json / compact 格式以及最早的纯字典格式"""
+    wallets = file_data['wallets'] if 'wallets' in file_data else file_data
+    pools = file_data.get('pools')
+    if pools is None:
+        return wallets
+    return {wallet: [pools[i] for i in pair_ids] for wallet, pair_ids in wallets.items()}
+
+
+def _encode_strings(values: List[str]) -> np.ndarray:
+    """把字符串列表编码为以NUL分隔的UTF-8字节数组"""
+    return np.frombuffer('\x00'.join(values).encode('utf-8'), dtype=np.uint8)
+
+
+def _decode_strings(buffer: np.ndarray, count: int) -> List[str]:
+    """_encode_strings 的逆操作"""
+    if count == 0:
+        return []
+    return buffer.tobytes().decode('utf-8').split('\x00')
+
+
+def _is_bool_column(series: pd.Series) -> bool:
+    """布尔列：bool / boolean 类型，或非空值全部为布尔值的对象列（含空值的布尔数据）"""
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return True
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "boolean"
+
+
+def save_columnar_snapshot(df: pd.DataFrame, path: str, compress: bool = False):
+    """
+    把DataFrame保存为列式二进制快照（.npz）
+    数值列和时间列直接保存（带时区的时间列保存UTC时间和时区名），
+    布尔列保存为 int8（1/0，空值为 -1），
+    其他列按字符串做字典编码（整数编码 + 字典），空值编码为 -1
+
+    Args:
+        df: 要保存的数据
+        path: 快照文件路径（.npz）
+        compress: 是否使用zip压缩（更小但更慢）
+    """
+    columns = [str(col) for col in df.columns]
+    arrays = {
+        "columns": _encode_strings(columns),
+        "num_columns": np.array(len(columns)),
+        "num_rows": np.array(len(df))
+    }
+
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if _is_bool_column(series):
+            flags = np.full(len(series), -1, dtype=np.int8)
+            present = series.notna().to_numpy()
+            flags[present] = series[present].to_numpy(dtype=bool)
+            arrays[f"c{i}_bool"] = flags
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            tz = getattr(series.dtype, "tz", None)
+            if tz is not None:
+                series = series.dt.tz_convert(None)
+                arrays[f"c{i}_tz"] = _encode_strings([str(tz)])
+            arrays[f"c{i}_values"] = series.to_numpy()
+        elif pd.api.types.is_numeric_dtype(series) and not isinstance(series.dtype, pd.CategoricalDtype):
+            arrays[f"c{i}_values"] = series.to_numpy()
+        else:
+            codes, categories = pd.factorize(series, use_na_sentinel=True)
+            arrays[f"c{i}_codes"] = codes.astype(np.int32)
+            arrays[f"c{i}_categories"] = _encode_strings([str(value) for value in categories])
+            arrays[f"c{i}_num_categories"] = np.array(len(categories))
+
+    (np.savez_compressed if compress else np.savez)(path, **arrays)
+
+
+def concat_frames(frames: List[pd.DataFrame], **kwargs) -> pd.DataFrame:
+    """
+    拼接数据块；在所有数据块中都是 category 类型的列先统一类别再拼接，
+    结果仍为 category（类别不同的 category 列直接拼接会退化为对象列）
+    """
+    frames = list(frames)
+    if len(frames) > 1:
+        for col in frames[0].columns:
+            if all(col in frame.columns and isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+                categories = union_categoricals([frame[col] for frame in frames]).categories
+                frames = [frame.assign(**{col: frame[col].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, **kwargs)
+
+
+def load_columnar_snapshot(path: str) -> pd.DataFrame:
+    """
+    读取 save_columnar_snapshot 生成的快照，字典编码列还原为 category 类型，
+    布尔列还原为 bool（有空值时为 boolean），时间列还原为 datetime64（保留时区）
+    如果 path 不存在但存在流式写入的分块（{path去掉.npz}_part*.npz），则按顺序拼接
+    """
+    if not os.path.exists(path):
+        import glob
+        parts = sorted(glob.glob(f"{path[:-len('.npz')]}_part*.npz"))
+        if not parts:
+            raise FileNotFoundError(path)
+        return concat_frames([load_columnar_snapshot(part) for part in parts], ignore_index=True)
+
+    with np.load(path) as snapshot:
+        columns = _decode_strings(snapshot["columns"], int(snapshot["num_columns"]))
+        data = {}
+        for i, col in enumerate(columns):
+            if f"c{i}_bool" in snapshot:
+                flags = snapshot[f"c{i}_bool"]
+                if (flags < 0).any():
+                    data[col] = pd.array(np.where(flags < 0, None, flags == 1), dtype="boolean")
+                else:
+                    data[col] = flags == 1
+                continue
+            if f"c{i}_values" in snapshot:
+                values = snapshot[f"c{i}_values"]
+                if f"c{i}_tz" in snapshot:
+                    tz = _decode_strings(snapshot[f"c{i}_tz"], 1)[0]
+                    values = pd.DatetimeIndex(values).tz_localize("UTC").tz_convert(tz)
+                data[col] = values
+                continue
+
+            categories = _decode_strings(snapshot[f"c{i}_categories"], int(snapshot[f"c{i}_num_categories"]))
+            codes = snapshot[f"c{i}_codes"]
+            try:
+                data[col] = pd.Categorical.from_codes(codes, categories=categories)
+            except ValueError:
+                # 字符串化后出现重复取值时退回普通对象列
+                values = np.asarray(categories + [None], dtype=object)
+                data[col] = values[np.where(codes < 0, len(categories), codes)]
+
+        return pd.DataFrame(data, columns=columns)
+
+
+# 发布到前端的输出文件（其余文件是获取器自身的状态，不参与版本化发布）
+PUBLISHED_FILE_PATTERNS = ("wallets_*.json", "pools_*.json", POOL_COUNTS_FILE, "metadata.json", "wallet_index.json",
+                           "wallet_list.json", "query_help.json", "wallet_pairs_api.json", PREFIX_INDEX_FILE,
+                           PREFIX_BLOCK_DIR)
+
+
+def write_json_atomic(path: str, data, **dump_kwargs) -> int:
+    """
+    先写临时文件再 os.replace 替换，读者只会看到完整的旧文件或新文件；
+    版本目录中的文件可能与旧版本共享硬链接，替换目录项而不是原地改写可以保证旧版本不被修改；
+    过期的 .gz/.br 副本同时删除，发布时重新压缩
+
+    Returns:
+        int: 写入的字节数
+    """
+    dump_kwargs.setdefault('separators', (',', ':'))
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+        size = f.tell()
+    os.replace(tmp_file, path)
+    remove_compressed_siblings(path)
+    return size
+
+
+def write_shard_file(filepath: str, group_key: str, group_data: Mapping, shard_format: str = "json",
+                     created_at: str = None, earnings: Dict[str, list] = None, earnings_updated: str = None) -> int:
+    """
+    构建并写入一个分片文件，返回文件大小（字节）
+    shard_format 为 "pools" 时写入反向索引分片；模块级函数，可以在进程池中执行
+    earnings 为已对齐到交易对顺序的手续费收入（全量重写时保留的预计算结果）
+    """
+    if isinstance(group_data, WalletPairTable):
+        group_data = group_data.to_dict()  # 只在写出时还原为字典
+    if shard_format == "pools":
+        data = build_pool_shard_data(group_key, group_data, created_at)
+    else:
+        data = build_shard_data(group_key, group_data, shard_format, created_at)
+        if earnings:
+            data["earnings"] = earnings
+            data["group_info"]["earnings_updated"] = earnings_updated
+    return write_json_atomic(filepath, data)
+
+
+def align_earnings(previous: Mapping[str, Mapping[str, float]], group_data: Mapping) -> Optional[dict]:
+    """
+    把上一版本的手续费收入（钱包 -> {交易对: 收入}）按分片中新的交易对顺序对齐，
+    新交易对记为 None 待补查；分片中没有带收入的钱包时返回 None
+    """
+    if not previous:
+        return None
+    earnings = {wallet: [previous[wallet].get(pair) for pair in pairs]
+                for wallet, pairs in group_data.items() if wallet in previous}
+    return earnings or None
+
+
+def _fsync_path(path: str):
+    """fsync 文件或目录（不支持目录 fsync 的平台上忽略）"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def fsync_tree(path: str):
+    """把目录树中的所有文件和目录刷到磁盘"""
+    for root, _, files in os.walk(path):
+        for name in files:
+            _fsync_path(os.path.join(root, name))
+        _fsync_path(root)
+
+
+def published_dir(data_dir: str) -> str:
+    """current.json 指向的当前发布版本目录；尚未使用版本化发布时为 data_dir 本身"""
+    pointer_file = os.path.join(data_dir, CURRENT_POINTER_FILE)
+    try:
+        with open(pointer_file, 'r', encoding='utf-8') as f:
+            return os.path.join(data_dir, json.load(f)["path"])
+    except (FileNotFoundError, KeyError, ValueError):
+        return data_dir
+
+
+class GenerationPublisher:
+    """
+    版本化发布目录
+    每次写入都在新的 generations/<编号>/ 目录中进行（增量写入时先用硬链接继承当前版本的文件），
+    全部写完、生成预压缩副本并 fsync 后原子替换 current.json 指针，读者总是看到一个完整一致的版本；
+    旧版本按 keep 数量回收
+    """
+
+    def __init__(self, data_dir: str, keep: int = DEFAULT_KEEP_GENERATIONS,
+                 compression: List[str] = DEFAULT_COMPRESSION):
+        """
+        Args:
+            data_dir: 数据目录
+            keep: 保留的已发布版本数（包括当前版本）
+            compression: 发布前为每个 JSON 文件生成的预压缩副本（"gzip" -> .gz，"brotli" -> .br，
+                未安装 brotli 时忽略），空列表表示不压缩
+        """
+        self.data_dir = data_dir
+        self.keep = max(1, keep)
+        self.compression = available_encodings(compression)
+        self.last_compression = {}  # 最近一次发布的压缩统计
+        self.generations_dir = os.path.join(data_dir, GENERATIONS_DIR)
+        self.pointer_file = os.path.join(data_dir, CURRENT_POINTER_FILE)
+
+    def current(self) -> Optional[int]:
+        """当前发布的版本编号，尚未发布过时返回 None"""
+        try:
+            with open(self.pointer_file, 'r', encoding='utf-8') as f:
+                return int(json.load(f)["generation"])
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def current_dir(self) -> str:
+        return published_dir(self.data_dir)
+
+    def generation_dir(self, number: int) -> str:
+        return os.path.join(self.generations_dir, f"{number:06d}")
+
+    def _generation_numbers(self) -> List[int]:
+        if not os.path.isdir(self.generations_dir):
+            return []
+        return sorted(int(name) for name in os.listdir(self.generations_dir) if name.isdigit())
+
+    def _link_tree(self, source: str, target: str, patterns=None):
+        """用硬链接把 source 中的文件复制到 target（不支持硬链接时复制文件），patterns 限定顶层条目"""
+        import glob
+        if patterns is None:
+            entries = [os.path.join(source, name) for name in os.listdir(source)]
+        else:
+            entries = [path for pattern in patterns for path in glob.glob(os.path.join(source, pattern))]
+
+        for entry in entries:
+            if os.path.isdir(entry):
+                for root, _, files in os.walk(entry):
+                    target_root = os.path.join(target, os.path.relpath(root, source))
+                    os.makedirs(target_root, exist_ok=True)
+                    for name in files:
+                        self._link_file(os.path.join(root, name), os.path.join(target_root, name))
+            else:
+                self._link_file(entry, os.path.join(target, os.path.basename(entry)))
+
+    @staticmethod
+    def _link_file(source: str, target: str):
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copy2(source, target)
+
+    def begin(self, inherit: bool = False) -> str:
+        """
+        创建新的版本目录
+
+        Args:
+            inherit: 是否继承当前版本的全部输出文件（增量更新只重写受影响的文件）
+
+        Returns:
+            str: 新版本目录路径
+        """
+        current = self.current()
+        numbers = self._generation_numbers()
+
+        # 编号大于当前版本的目录是之前运行中断后遗留的未发布版本
+        for number in numbers:
+            if current is None or number > current:
+                shutil.rmtree(self.generation_dir(number), ignore_errors=True)
+                logger.info(f"🧹 删除未发布的版本目录: {number:06d}")
+
+        path = self.generation_dir((current or 0) + 1)
+        os.makedirs(path)
+        if inherit:
+            if current is not None:
+                self._link_tree(self.current_dir(), path)
+            else:
+                # 旧布局：输出文件直接位于数据目录中
+                self._link_tree(self.data_dir, path, PUBLISHED_FILE_PATTERNS)
+        return path
+
+    def publish(self, path: str) -> str:
+        """生成预压缩副本并 fsync 版本目录，然后原子替换 current.json 指针，并回收旧版本"""
+        self.last_compression = compress_output_dir(path, self.compression) if self.compression else {}
+        fsync_tree(path)
+        _fsync_path(self.generations_dir)
+
+        name = os.path.basename(path)
+        pointer = {
+            "generation": name,
+            "path": f"{GENERATIONS_DIR}/{name}",
+            "published_at": pd.Timestamp.now().isoformat()
+        }
+        tmp_file = self.pointer_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(pointer, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.pointer_file)
+        _fsync_path(self.data_dir)
+
+        logger.info(f"📦 已发布版本 {name}")
+        self.collect_garbage()
+        return name
+
+    def abort(self, path: str):
+        """删除未发布的版本目录"""
+        shutil.rmtree(path, ignore_errors=True)
+        logger.warning(f"已放弃未发布的版本目录: {os.path.basename(path)}")
+
+    def collect_garbage(self) -> List[str]:
+        """删除超出保留数量的旧版本，以及已迁移到版本目录的旧布局输出文件"""
+        current = self.current()
+        if current is None:
+            return []
+
+        import glob
+        removed = []
+        published = [number for number in self._generation_numbers() if number <= current]
+        for number in published[:-self.keep]:
+            shutil.rmtree(self.generation_dir(number), ignore_errors=True)
+            removed.append(f"{number:06d}")
+
+        for pattern in PUBLISHED_FILE_PATTERNS:
+            for path in glob.glob(os.path.join(self.data_dir, pattern)):
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+                removed.append(os.path.basename(path))
+
+        if removed:
+            logger.info(f"🧹 回收旧版本: {removed}")
+        return removed
+
+
+def read_pool_wallets(data_dir: str, pool: str) -> Optional[List[str]]:
+    """从 data_dir（当前发布版本）的反向索引中读取交易对的钱包列表，只读取一个 pools_*.json 文件"""
+    data_dir = published_dir(data_dir)
+    metadata_file = os.path.join(data_dir, "metadata.json")
+    if not os.path.exists(metadata_file):
+        return None
+    with open(metadata_file, 'r', encoding='utf-8') as f:
+        pool_index = json.load(f).get("pool_index")
+    if not pool_index:
+        return None
+
+    shard_count = pool_index["shard_count"]
+    filepath = os.path.join(data_dir, pool_shard_filename(wallet_shard_id(pool, shard_count), shard_count))
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)["pools"].get(pool)
+
+
+def read_top_pools(data_dir: str, limit: int = TOP_POOLS_LIMIT) -> List[list]:
+    """钱包数最多的交易对：不超过 TOP_POOLS_LIMIT 时直接读取 metadata.json，否则读取 pool_counts.json"""
+    data_dir = published_dir(data_dir)
+    metadata_file = os.path.join(data_dir, "metadata.json")
+    if limit <= TOP_POOLS_LIMIT and os.path.exists(metadata_file):
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            pool_index = json.load(f).get("pool_index")
+        if pool_index:
+            return pool_index["top_pools"][:limit]
+
+    counts_file = os.path.join(data_dir, POOL_COUNTS_FILE)
+    if not os.path.exists(counts_file):
+        return []
+    with open(counts_file, 'r', encoding='utf-8') as f:
+        return top_pool_counts(json.load(f), limit)
+
+
+class TokenBucket:
+    """线程安全的令牌桶限速器，用于控制Dune API请求速率"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        """
+        Args:
+            rate: 每秒补充的令牌数（即平均每秒允许的请求数）
+            capacity: 令牌桶容量（允许的突发请求数）
+        """
+        if rate <= 0:
+            raise ValueError("令牌桶速率必须大于0")
+
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        获取令牌，令牌不足时阻塞等待
+
+        Returns:
+            float: 实际等待的秒数
+
+        Raises:
+            ValueError: 请求的令牌数超过桶容量（永远无法满足）
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"请求的令牌数 {tokens} 超过令牌桶容量 {self.capacity}")
+
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+
+                wait_seconds = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+
+class StreamingRecordWriter:
+    """
+    增量写入CSV、JSON记录文件和列式快照分块
+    每次只写入一个数据块，避免在内存中保留完整结果
+    """
+
+    def __init__(self, csv_file: str = None, json_file: str = None, snapshot_file: str = None):
+        self.csv_file = csv_file
+        self.json_file = json_file
+        self.snapshot_file = snapshot_file
+        self.columns = None
+        self.total_records = 0
+        self.parts = 0  # 已写入的快照分块数
+        self._json_handle = None
+
+        if snapshot_file:
+            # 清理上一次运行留下的快照和分块，避免拼接到旧数据
+            import glob
+            for stale_file in [snapshot_file] + glob.glob(f"{snapshot_file[:-len('.npz')]}_part*.npz"):
+                if os.path.exists(stale_file):
+                    os.remove(stale_file)
+
+        if json_file:
+            self._json_handle = open(json_file, 'w', encoding='utf-8')
+            self._json_handle.write('[')
+
+    def write(self, df: pd.DataFrame):
+        """追加一个数据块"""
+        if df.empty:
+            return
+
+        first_chunk = self.columns is None
+        if first_chunk:
+            self.columns = list(df.columns)
+        else:
+            # 后续数据块按首个数据块的列顺序追加
+            df = df.reindex(columns=self.columns)
+
+        if self.csv_file:
+            df.to_csv(self.csv_file, mode='w' if first_chunk else 'a', header=first_chunk,
+                      index=False, encoding='utf-8')
+
+        if self.snapshot_file:
+            # 每个数据块写一个分块，load_columnar_snapshot 会按顺序拼接
+            save_columnar_snapshot(df, f"{self.snapshot_file[:-len('.npz')]}_part{self.parts:05d}.npz")
+            self.parts += 1
+
+        if self._json_handle:
+            records = df.to_json(orient='records', lines=True, force_ascii=False).strip().split('\n')
+            prefix = '\n' if self.total_records == 0 else ',\n'
+            self._json_handle.write(prefix + ',\n'.join(records))
+
+        self.total_records += len(df)
+
+    def close(self):
+        if self._json_handle:
+            self._json_handle.write('\n]' if self.total_records else ']')
+            self._json_handle.close()
+            self._json_handle = None
+
+
+class PairKeySet:
+    """
+    钱包-交易对键的集合，用于跨批次判断记录是否首次出现
+
+    钱包和交易对通过持久的字典编码为整数（按首次出现的顺序，每批只对批内的唯一值查字典），
+    (钱包, 交易对) 组合成一个 int64 键，已见过的键保存在有序数组中；
+    成员检查和插入都用 searchsorted 向量化完成，不需要逐行的 Python 循环。
+    """
+
+    def __init__(self):
+        self._wallet_codes = {}
+        self._pool_codes = {}
+        self._seen = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    @staticmethod
+    def _encode(codes: dict, values, dropna: bool) -> np.ndarray:
+        """把值编码为整数，新值追加编号；dropna 时空值编码为 -1，否则所有空值共用一个编号"""
+        labels, uniques = pd.factorize(values, use_na_sentinel=dropna)
+        mapped = np.fromiter((codes.setdefault(None if pd.isna(value) else value, len(codes)) for value in uniques),
+                             dtype=np.int64, count=len(uniques))
+        return np.append(mapped, -1)[labels]  # 标签 -1（空值）取到末尾的 -1
+
+    def add(self, wallets, pools, dropna: bool = True) -> np.ndarray:
+        """
+        加入一批键
+
+        Args:
+            wallets: 钱包地址数组
+            pools: 交易对地址数组
+            dropna: 为 True 时含空值的行不加入集合；否则空值作为普通值参与去重（与 drop_duplicates 一致）
+
+        Returns:
+            np.ndarray: 布尔数组，该行的键在之前的批次和本批前面的行中都未出现过时为 True
+        """
+        wallet_codes = self._encode(self._wallet_codes, wallets, dropna)
+        pool_codes = self._encode(self._pool_codes, pools, dropna)
+        keys = (wallet_codes << 32) | pool_codes
+
+        is_new = ~pd.Series(keys).duplicated(keep='first').to_numpy()
+        if dropna:
+            is_new &= (wallet_codes >= 0) & (pool_codes >= 0)
+        if len(self._seen):
+            positions = np.minimum(np.searchsorted(self._seen, keys), len(self._seen) - 1)
+            is_new &= self._seen[positions] != keys
+
+        new_keys = np.sort(keys[is_new])
+        self._seen = np.insert(self._seen, np.searchsorted(self._seen, new_keys), new_keys)
+        return is_new
+
+    def contains(self, wallets, pools) -> np.ndarray:
+        """判断每行的键是否已在集合中（不修改集合，也不为未见过的值分配编号；含空值的行为 False）"""
+        def lookup(codes: dict, values) -> np.ndarray:
+            labels, uniques = pd.factorize(values, use_na_sentinel=True)
+            mapped = np.fromiter((codes.get(value, -1) for value in uniques), dtype=np.int64, count=len(uniques))
+            return np.append(mapped, -1)[labels]
+
+        wallet_codes = lookup(self._wallet_codes, wallets)
+        pool_codes = lookup(self._pool_codes, pools)
+        found = (wallet_codes >= 0) & (pool_codes >= 0)
+        if not len(self._seen) or not found.any():
+            return np.zeros(len(found), dtype=bool)
+
+        keys = (wallet_codes << 32) | pool_codes
+        positions = np.minimum(np.searchsorted(self._seen, keys), len(self._seen) - 1)
+        return found & (self._seen[positions] == keys)
+
+
+class RollingBatchMerger:
+    """
+    逐个合并批次数据，代替 pd.concat 全部批次后再 drop_duplicates
+
+    已见过的 (钱包, 交易对) 保存在 PairKeySet 中（持久的编码字典 + 有序 int64 键数组）；
+    每个批次只保留去重键列中首次出现的行，合并后即可释放。
+    峰值内存约为一个批次加上去重集合和已保留的行。
+
+    结果与 merge_batch_data 的整体合并一致：保留行、行顺序和行索引（拼接后的位置）都相同，
+    只是只包含去重键列；合并摘要所需的各批次行数、输入列和类型单独记录。
+    """
+
+    def __init__(self):
+        self.batch_record_counts = []
+        self._keys = PairKeySet()
+        self._parts = []
+        self._schema_rows = []
+        self._offset = 0
+
+    @property
+    def input_records(self) -> int:
+        return sum(self.batch_record_counts)
+
+    @property
+    def merged_records(self) -> int:
+        return sum(len(part) for part in self._parts)
+
+    def add(self, df: pd.DataFrame):
+        """合并一个批次（调用方随后可以释放该批次）"""
+        if df.empty:
+            return
+        self.batch_record_counts.append(len(df))
+        # 每个批次保留一行用于推导拼接后的列顺序和类型
+        self._schema_rows.append(df.iloc[:1].copy())
+
+        keys_df = df.reindex(columns=MERGE_KEY_COLUMNS)
+        # 空值与 drop_duplicates 一样作为普通值参与去重
+        keep = self._keys.add(keys_df['evt_tx_signer'], keys_df['lbPair'], dropna=False)
+
+        kept = keys_df[keep]
+        kept.index = pd.RangeIndex(self._offset, self._offset + len(df))[keep]
+        self._parts.append(kept)
+        self._offset += len(df)
+
+    def input_schema(self) -> Dict[str, str]:
+        """全部批次拼接后的列（按首次出现的顺序）及类型，与整体合并的结果一致"""
+        if not self._schema_rows:
+            return {}
+        return concat_frames(self._schema_rows).dtypes.astype(str).to_dict()
+
+    def result(self) -> pd.DataFrame:
+        """去重后的数据（只包含去重键列）"""
+        if not self._parts:
+            return pd.DataFrame()
+        return concat_frames(self._parts)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存（MB），平台不支持时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RunMetrics:
+    """
+    记录 run_data_fetch 各阶段的墙钟时间、CPU时间、峰值内存和行数/钱包数等计数
+    嵌套阶段的耗时同时计入外层阶段
+    """
+
+    def __init__(self):
+        self.started_at = pd.Timestamp.now().isoformat()
+        self.stages = []
+        self.status = "running"
+        self._stack = []
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def stage(self, name: str, **counts):
+        """
+        统计一个阶段，counts 为初始计数，可以在阶段内继续写入返回的字典
+
+        用法:
+            with metrics.stage("process_wallet_data", rows=len(df)) as stage:
+                stage["wallets"] = ...
+        """
+        record = {"name": name}
+        if self._stack:
+            record["parent"] = self._stack[-1]["name"]
+        record.update(counts)
+        self._stack.append(record)
+
+        rss_before = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall_start, 6)
+            record["cpu_seconds"] = round(time.process_time() - cpu_start, 6)
+            rss_after = peak_rss_mb()
+            if rss_after is not None:
+                record["peak_rss_mb"] = round(rss_after, 2)
+                # 峰值常驻内存只增不减，差值表示该阶段抬高了多少进程峰值
+                record["peak_rss_growth_mb"] = round(rss_after - rss_before, 2)
+            self._stack.pop()
+            self.stages.append(record)
+
+    def to_dict(self) -> dict:
+        """生成运行报告"""
+        return {
+            "started_at": self.started_at,
+            "finished_at": pd.Timestamp.now().isoformat(),
+            "status": self.status,
+            "total_wall_seconds": round(time.perf_counter() - self._wall_start, 6),
+            "total_cpu_seconds": round(time.process_time() - self._cpu_start, 6),
+            "peak_rss_mb": round(peak_rss_mb(), 2) if resource is not None else None,
+            "stages": self.stages
+        }
+
+    def save(self, path: str) -> dict:
+        """把运行报告写入 JSON 文件"""
+        report = self.to_dict()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        return report
+
+
+class WalletStore:
+    """
+    带索引的SQLite钱包存储，可代替JSON备份/列式快照作为累积数据的后端
+    累积通过批量upsert完成，单钱包查询和按交易对反查都走索引，
+    静态JSON分片按需从库中导出，整个过程不需要把全部数据读入Python字典
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite文件路径
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # hash 为地址的 FNV-1a 32位哈希，分片编号 = hash % shard_count
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS wallets ("
+            " id INTEGER PRIMARY KEY,"
+            " address TEXT NOT NULL UNIQUE,"
+            " hash INTEGER NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS pools ("
+            " id INTEGER PRIMARY KEY,"
+            " address TEXT NOT NULL UNIQUE,"
+            " hash INTEGER NOT NULL)")
+        # rowid 即插入顺序，钱包的交易对按首次出现的顺序返回
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS wallet_pairs ("
+            " wallet_id INTEGER NOT NULL,"
+            " pool_id INTEGER NOT NULL,"
+            " UNIQUE (wallet_id, pool_id))")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_wallet_pairs_pool ON wallet_pairs (pool_id, wallet_id)")
+        self.conn.execute(
+            "CREATE TEMP TABLE staging_pairs ("
+            " ord INTEGER PRIMARY KEY,"
+            " wallet TEXT NOT NULL,"
+            " pool TEXT NOT NULL,"
+            " wallet_hash INTEGER NOT NULL,"
+            " pool_hash INTEGER NOT NULL)")
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM wallets").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def total_pairs(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM wallet_pairs").fetchone()[0]
+
+    def total_pools(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pools").fetchone()[0]
+
+    def clear(self):
+        """删除全部数据（关闭累积模式时使用）"""
+        with self._lock:
+            self.conn.execute("DELETE FROM wallet_pairs")
+            self.conn.execute("DELETE FROM wallets")
+            self.conn.execute("DELETE FROM pools")
+            self.conn.commit()
+
+    def upsert(self, wallet_data: Mapping) -> Dict[str, object]:
+        """
+        合并新数据：已有的钱包/交易对保持原顺序，新交易对追加在已有交易对之后
+
+        Args:
+            wallet_data: 本次获取的钱包 -> 交易对列表
+
+        Returns:
+            dict: 新增钱包数、新增交易对数、合并后的总量，以及有新增交易对的钱包列表 changed_wallets
+                和新增了钱包的交易对列表 changed_pools
+        """
+        wallets = list(wallet_data)
+        pools = list(dict.fromkeys(pool for pairs in wallet_data.values() for pool in pairs))
+        pool_hashes = dict(zip(pools, wallet_hashes(pools).tolist()))
+        rows = [(wallet, pool, wallet_hash, pool_hashes[pool])
+                for (wallet, pairs), wallet_hash in zip(wallet_data.items(), wallet_hashes(wallets).tolist())
+                for pool in pairs]
+
+        with self._lock:
+            try:
+                self.conn.execute("DELETE FROM staging_pairs")
+                self.conn.executemany(
+                    "INSERT INTO staging_pairs (wallet, pool, wallet_hash, pool_hash) VALUES (?, ?, ?, ?)", rows)
+
+                new_wallets = self.conn.execute(
+                    "INSERT OR IGNORE INTO wallets (address, hash) "
+                    "SELECT wallet, wallet_hash FROM staging_pairs ORDER BY ord").rowcount
+                self.conn.execute("INSERT OR IGNORE INTO pools (address, hash) "
+                                  "SELECT pool, pool_hash FROM staging_pairs ORDER BY ord")
+
+                joined = ("FROM staging_pairs s JOIN wallets w ON w.address = s.wallet "
+                          "JOIN pools p ON p.address = s.pool")
+                added = self.conn.execute(
+                    f"SELECT s.wallet, s.pool {joined} WHERE NOT EXISTS ("
+                    f" SELECT 1 FROM wallet_pairs wp WHERE wp.wallet_id = w.id AND wp.pool_id = p.id) "
+                    f"ORDER BY s.ord").fetchall()
+                changed_wallets = list(dict.fromkeys(wallet for wallet, _ in added))
+                changed_pools = list(dict.fromkeys(pool for _, pool in added))
+                new_pairs = self.conn.execute(
+                    f"INSERT OR IGNORE INTO wallet_pairs (wallet_id, pool_id) SELECT w.id, p.id {joined} "
+                    f"ORDER BY s.ord").rowcount
+
+                self.conn.execute("DELETE FROM staging_pairs")
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+
+            total_wallets = self.conn.execute("SELECT COUNT(*) FROM wallets").fetchone()[0]
+            total_pairs = self.conn.execute("SELECT COUNT(*) FROM wallet_pairs").fetchone()[0]
+
+        logger.info(f"SQLite存储合并完成：新增 {new_wallets} 个钱包，{new_pairs} 个交易对；"
+                    f"当前共 {total_wallets} 个钱包，{total_pairs} 个交易对")
+        return {
+            "new_wallets": new_wallets,
+            "new_pairs": new_pairs,
+            "total_wallets": total_wallets,
+            "total_pairs": total_pairs,
+            "changed_wallets": changed_wallets,
+            "changed_pools": changed_pools
+        }
+
+    def get_pairs(self, wallet: str) -> Optional[List[str]]:
+        """单个钱包的交易对列表，钱包不存在时返回 None"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT p.address FROM wallets w JOIN wallet_pairs wp ON wp.wallet_id = w.id "
+                "JOIN pools p ON p.id = wp.pool_id WHERE w.address = ? ORDER BY wp.rowid", (wallet,)).fetchall()
+        return [row[0] for row in rows] or None
+
+    def search_prefix(self, prefix: str, limit: int = 20) -> List[str]:
+        """按地址排序返回以 prefix 开头的钱包（走地址唯一索引的范围扫描）"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT address FROM wallets WHERE address >= ? AND address < ? ORDER BY address LIMIT ?",
+                (prefix, prefix + '\U0010ffff', limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def get_wallets(self, pool: str) -> List[str]:
+        """反查参与过某个交易对的钱包，按钱包首次出现的顺序返回"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT w.address FROM pools p JOIN wallet_pairs wp ON wp.pool_id = p.id "
+                "JOIN wallets w ON w.id = wp.wallet_id WHERE p.address = ? ORDER BY w.id", (pool,)).fetchall()
+        return [row[0] for row in rows]
+
+    def shard_sizes(self, shard_count: int, table: str = "wallets") -> np.ndarray:
+        """各分片的钱包数（table="pools" 时为交易对数），由库中保存的地址哈希直接统计"""
+        if table not in ("wallets", "pools"):
+            raise ValueError(f"不支持的表: {table}")
+        sizes = np.zeros(shard_count, dtype=np.int64)
+        with self._lock:
+            for shard_id, count in self.conn.execute(
+                    f"SELECT hash % ?, COUNT(*) FROM {table} GROUP BY 1", (shard_count,)):
+                sizes[shard_id] = count
+        return sizes
+
+    def pool_counts(self) -> Dict[str, int]:
+        """每个交易对的钱包数"""
+        with self._lock:
+            return dict(self.conn.execute(
+                "SELECT p.address, COUNT(*) FROM wallet_pairs wp JOIN pools p ON p.id = wp.pool_id "
+                "GROUP BY wp.pool_id"))
+
+    def _iter_rows(self, query: str, params=(), batch_size: int = 10000):
+        """分批读取查询结果，避免一次性 fetchall"""
+        with self._lock:
+            cursor = self.conn.execute(query, params)
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def iter_wallet_addresses(self):
+        """按地址排序逐个返回钱包地址（走唯一索引，不需要额外排序）"""
+        for row in self._iter_rows("SELECT address FROM wallets ORDER BY address"):
+            yield row[0]
+
+    def iter_wallets(self):
+        """按钱包首次出现的顺序逐个返回 (钱包, 交易对列表)"""
+        rows = self._iter_rows(
+            "SELECT w.address, p.address FROM wallets w JOIN wallet_pairs wp ON wp.wallet_id = w.id "
+            "JOIN pools p ON p.id = wp.pool_id ORDER BY w.id, wp.rowid")
+        for wallet, wallet_rows in groupby(rows, key=lambda row: row[0]):
+            yield wallet, [pool for _, pool in wallet_rows]
+
+    def iter_shards(self, shard_count: int, shard_ids: List[int] = None):
+        """
+        按分片编号逐个返回分片数据，内存中同时只保留一个分片
+
+        Args:
+            shard_count: 分片总数
+            shard_ids: 只导出这些分片，不提供则导出全部
+
+        Yields:
+            (分片编号, 钱包 -> 交易对列表)
+        """
+        query = ("SELECT w.hash % ? AS shard_id, w.address, p.address FROM wallets w "
+                 "JOIN wallet_pairs wp ON wp.wallet_id = w.id JOIN pools p ON p.id = wp.pool_id")
+        params = [shard_count]
+        if shard_ids is not None:
+            shard_ids = sorted(set(shard_ids))
+            if not shard_ids:
+                return
+            query += f" WHERE shard_id IN ({','.join('?' * len(shard_ids))})"
+            params.extend(shard_ids)
+        query += " ORDER BY shard_id, w.id, wp.rowid"
+
+        for shard_id, shard_rows in groupby(self._iter_rows(query, params), key=lambda row: row[0]):
+            group_data = {}
+            for _, wallet, pool in shard_rows:
+                group_data.setdefault(wallet, []).append(pool)
+            yield shard_id, group_data
+
+    def iter_pool_shards(self, shard_count: int, shard_ids: List[int] = None):
+        """
+        按交易对分片逐个返回反向索引数据（交易对 -> 钱包列表），与 iter_shards 相同的哈希分片方式
+
+        Yields:
+            (分片编号, 交易对 -> 钱包列表)
+        """
+        query = ("SELECT p.hash % ? AS shard_id, p.address, w.address FROM pools p "
+                 "JOIN wallet_pairs wp ON wp.pool_id = p.id JOIN wallets w ON w.id = wp.wallet_id")
+        params = [shard_count]
+        if shard_ids is not None:
+            shard_ids = sorted(set(shard_ids))
+            if not shard_ids:
+                return
+            query += f" WHERE shard_id IN ({','.join('?' * len(shard_ids))})"
+            params.extend(shard_ids)
+        query += " ORDER BY shard_id, p.id, w.id"
+
+        for shard_id, shard_rows in groupby(self._iter_rows(query, params), key=lambda row: row[0]):
+            pool_wallets = {}
+            for _, pool, wallet in shard_rows:
+                pool_wallets.setdefault(pool, []).append(wallet)
+            yield shard_id, pool_wallets
+
 
 class MeteoraDataFetcher:
-    def __init__(self, query_ids: List[int] = None):
+    def __init__(self, query_ids: List[int] = None, data_dir: str = "meteora_data", dune_client=None,
+                 export_formats: List[str] = None, storage_backend: str = "json",
+                 keep_generations: int = DEFAULT_KEEP_GENERATIONS, compression: List[str] = DEFAULT_COMPRESSION,
+                 write_workers: int = 1, extra_columns: List[str] = None):
         """
         初始化Meteora数据获取器
 
         Args:
             query_ids: Dune查询ID列表，如果不提供则使用默认值
+            data_dir: 数据输出目录
+            dune_client: 自定义Dune客户端（需提供 get_latest_result），不提供则使用DUNE_API_KEY创建
+            export_formats: 额外导出的文本格式（"csv"、"json"），批次和合并数据默认只保存列式快照
+            storage_backend: 累积数据的存储后端，"json"（JSON备份 + 列式快照）或
+                "sqlite"（data_dir/wallet_store.sqlite，分片文件按需从库中导出）
+            keep_generations: run_data_fetch 发布的版本目录保留数量（包括当前版本）
+            compression: 发布时生成的预压缩副本编码（"gzip"、"brotli"），空列表表示不压缩
+            write_workers: 全量写入分片文件时的进程数，大于1时在进程池中并行编码和写入
+            extra_columns: 摄入时在 evt_tx_signer / lbPair 之外额外保留的Dune列，默认不保留；
+                包含 "*" 时保留全部列
         """
-        # 从环境变量获取API密钥
-        dune_api_key = os.getenv('DUNE_API_KEY')
-        if not dune_api_key:
-            raise ValueError("请在.env文件中设置DUNE_API_KEY")
+        unknown_formats = set(export_formats or ()) - set(EXPORT_FORMATS)
+        if unknown_formats:
+            raise ValueError(f"不支持的导出格式: {sorted(unknown_formats)}")
+        self.export_formats = set(export_formats or ())
+
+        if storage_backend not in STORAGE_BACKENDS:
+            raise ValueError(f"不支持的存储后端: {storage_backend}")
 
-        self.dune = DuneClient(dune_api_key)
+        if dune_client is None:
+            # 从环境变量获取API密钥
+            dune_api_key = os.getenv('DUNE_API_KEY')
+            if not dune_api_key:
+                raise ValueError("请在.env文件中设置DUNE_API_KEY")
+
+            dune_client = DuneClient(dune_api_key)
+
+        self.dune = dune_client
         self.query_ids = query_ids or [5556654]  # 默认查询ID，支持多个
-        self.data_dir = "meteora_data"
+        self.data_dir = data_dir
         self.batch_data_dir = os.path.join(self.data_dir, "batches")
+        self.shard_count = None  # 最近一次 create_wallet_index 使用的分片数
+        self.pool_index = None  # 最近一次写入的反向索引（交易对 -> 钱包）元数据
+        self.earnings_info = None  # 全量重写时从上一版本保留的手续费收入统计（metadata.json 的 earnings）
 
         # 创建数据目录
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.batch_data_dir, exist_ok=True)
 
+        self.storage_backend = storage_backend
+        self.wallet_store = (WalletStore(os.path.join(self.data_dir, WALLET_STORE_FILE))
+                             if storage_backend == "sqlite" else None)
+
+        # 版本化发布：run_data_fetch 写入新的版本目录，其余时间读写 current.json 指向的当前版本
+        self.generations = GenerationPublisher(self.data_dir, keep=keep_generations, compression=compression)
+        self.write_workers = max(1, write_workers)
+        self._staging_dir = None
+
+        # 摄入时的列投影：后续的保存、合并和去重只处理这些列
+        self.extra_columns = list(extra_columns or [])
+
+        # 结果缓存：查询ID -> 已入库结果的执行ID/内容哈希，本次运行的新条目在成功入库后才提交
+        self.result_cache = self._load_result_cache()
+        self._pending_cache = {}
+        self._cache_lock = threading.Lock()
+        self.unchanged_queries = []  # 最近一次获取中结果未变化而被跳过的查询ID
+        self.metrics = RunMetrics()  # 各阶段耗时/内存统计，每次 run_data_fetch 重新创建
+
+    @property
+    def output_dir(self) -> str:
+        """输出文件所在目录：正在写入的版本目录，否则为当前发布的版本（旧布局为 data_dir）"""
+        return self._staging_dir or self.generations.current_dir()
+
+    @contextmanager
+    def publishing(self, inherit: bool = False):
+        """
+        在新的版本目录中写入输出文件，正常结束后 fsync 并原子切换 current.json，出错时删除该目录
+
+        Args:
+            inherit: 是否用硬链接继承当前版本的文件（增量更新只替换受影响的文件）
+        """
+        staging_dir = self.generations.begin(inherit=inherit)
+        self._staging_dir = staging_dir
+        try:
+            yield staging_dir
+            with self.metrics.stage("publish_generation", inherit=inherit) as stage:
+                stage["generation"] = self.generations.publish(staging_dir)
+                compression = self.generations.last_compression
+                if compression:
+                    stage["raw_bytes"] = compression["raw_bytes"]
+                    stage.update({f"{encoding}_bytes": size
+                                  for encoding, size in compression["compressed_bytes"].items()})
+        except BaseException:
+            self.generations.abort(staging_dir)
+            raise
+        finally:
+            self._staging_dir = None
+
     def save_raw_dune_data(self, df: pd.DataFrame, query_result):
         """保存原始Dune数据"""
         try:
@@ -48,7 +1318,7 @@ class MeteoraDataFetcher:
 
             # 保存处理后的DataFrame为JSON格式
             json_file = os.path.join(self.data_dir, "raw_dune_data.json")
-            df.to_json(json_file, orient='records', ensure_ascii=False, indent=2)
+            df.to_json(json_file, orient='records', force_ascii=False, indent=2)
 
             # 保存完整的原始响应数据
             raw_response_file = os.path.join(self.data_dir, "dune_raw_response.json")
@@ -88,13 +1358,14 @@ class MeteoraDataFetcher:
         except Exception as e:
             logger.warning(f"保存原始Dune数据失败: {str(e)}")
 
-    def fetch_single_batch(self, query_id: int, batch_name: str = None) -> pd.DataFrame:
+    def fetch_single_batch(self, query_id: int, batch_name: str = None, use_cache: bool = False) -> pd.DataFrame:
         """
         获取单个批次的数据
 
         Args:
             query_id: 查询ID
             batch_name: 批次名称，用于保存文件
+            use_cache: 结果内容与缓存一致时不保存批次，返回空DataFrame
 
         Returns:
             DataFrame: 该批次的数据
@@ -112,26 +1383,30 @@ class MeteoraDataFetcher:
                 logger.warning(f"批次 '{batch_name}' 未获取到数据或数据为空")
                 return pd.DataFrame()
 
-            # 从result.rows中提取数据
+            # 从result.rows中提取数据，只构建需要的列
             rows_data = query_result.result.rows
-            df = pd.DataFrame(rows_data)
-
-            if df.empty:
-                logger.warning(f"批次 '{batch_name}' 获取到的数据为空")
-                return df
 
             # 验证必要列
-            required_columns = ['evt_tx_signer', 'lbPair']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-
+            missing_columns = [col for col in MERGE_KEY_COLUMNS if col not in rows_data[0]]
             if missing_columns:
                 logger.error(f"批次 '{batch_name}' 数据中缺少必要列: {missing_columns}")
                 return pd.DataFrame()
 
+            df = self.project_rows(rows_data)
+
             logger.info(f"批次 '{batch_name}' 成功获取 {len(df)} 条记录")
 
+            execution_id = getattr(query_result, 'execution_id', None)
+            content_hash = self.compute_content_hash(df)
+            if use_cache and self.is_result_unchanged(query_id, content_hash=content_hash):
+                # 查询重新执行但结果相同：只更新缓存中的执行ID，不保存也不参与合并
+                logger.info(f"⏭️  批次 '{batch_name}' 内容未变化，跳过保存和合并")
+                self.mark_result_unchanged(query_id, execution_id)
+                return pd.DataFrame()
+
             # 保存批次数据
             self.save_batch_data(df, query_result, batch_name, query_id)
+            self.record_result(query_id, execution_id, content_hash, batch_name, len(df))
 
             return df
 
@@ -139,72 +1414,163 @@ class MeteoraDataFetcher:
             logger.error(f"获取批次 '{batch_name}' 数据失败: {str(e)}")
             return pd.DataFrame()
 
-    def fetch_all_batches(self, delay_seconds: float = 1.0, preserve_batches: bool = True) -> List[pd.DataFrame]:
+    def select_columns(self, available_columns) -> List[str]:
         """
-        获取所有批次的数据
+        摄入时保留的列（按查询结果中的顺序）：必要列总是保留，其余列只保留 extra_columns 中列出的
 
         Args:
-            delay_seconds: 每个批次之间的延迟时间（秒）
-            preserve_batches: 是否保留历史批次数据（避免覆盖）
-
-        Returns:
-            List[DataFrame]: 所有批次的数据列表
+            available_columns: 查询结果包含的列
         """
-        logger.info(f"开始获取 {len(self.query_ids)} 个批次的数据...")
+        available_columns = list(available_columns)
+        if ALL_COLUMNS in self.extra_columns:
+            return available_columns
+        wanted = set(MERGE_KEY_COLUMNS) | set(self.extra_columns)
+        return [col for col in available_columns if col in wanted]
 
-        batch_dataframes = []
+    def project_rows(self, rows: List[dict]) -> pd.DataFrame:
+        """
+        把Dune结果行转换为只包含 select_columns 所选列的DataFrame，未选中的列不会被构建；
+        evt_tx_signer / lbPair 使用 category 类型（每个地址只保存一次，行中只存整数编码）
+        """
+        df = pd.DataFrame.from_records(rows, columns=self.select_columns(rows[0].keys()))
+        for col in MERGE_KEY_COLUMNS:
+            df[col] = df[col].astype("category")
+        return df
 
+    def _batch_names(self, preserve_batches: bool) -> List[str]:
+        """按 query_ids 顺序生成批次名称"""
         # 生成时间戳用于批次命名
         import datetime
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
+        batch_names = []
         for i, query_id in enumerate(self.query_ids):
             if preserve_batches:
                 # 使用时间戳避免覆盖历史数据
-                batch_name = f"batch_{timestamp}_{i + 1}_{query_id}"
+                batch_names.append(f"batch_{timestamp}_{i + 1}_{query_id}")
             else:
                 # 传统命名方式（会覆盖）
-                batch_name = f"batch_{i + 1}_{query_id}"
+                batch_names.append(f"batch_{i + 1}_{query_id}")
 
-            logger.info(f"获取批次: {batch_name}")
+        return batch_names
 
-            # 获取单个批次数据
-            df = self.fetch_single_batch(query_id, batch_name)
+    def fetch_all_batches(self, delay_seconds: float = 1.0, preserve_batches: bool = True,
+                          max_workers: int = 1, rate_limit: float = None,
+                          use_cache: bool = False, merger: RollingBatchMerger = None) -> List[pd.DataFrame]:
+        """
+        获取所有批次的数据
 
-            if not df.empty:
-                batch_dataframes.append(df)
+        Args:
+            delay_seconds: 每个批次之间的延迟时间（秒），未指定 rate_limit 时换算为令牌桶速率
+            preserve_batches: 是否保留历史批次数据（避免覆盖）
+            max_workers: 并发获取的最大线程数，1 表示逐个获取
+            rate_limit: 每秒允许的最大请求数，不提供则使用 1 / delay_seconds
+            use_cache: 跳过执行ID或内容哈希与结果缓存一致的查询（记录在 unchanged_queries）
+            merger: 滚动合并器，提供时每个批次按顺序合并后立即释放，不保留在返回列表中
 
-            # 添加延迟避免API限制（除了最后一个）
-            if i < len(self.query_ids) - 1:
-                logger.info(f"等待 {delay_seconds} 秒后获取下一批次...")
-                time.sleep(delay_seconds)
+        Returns:
+            List[DataFrame]: 所有批次的数据列表，顺序与 query_ids 一致（提供 merger 时为空）
+        """
+        max_workers = max(1, min(max_workers, len(self.query_ids) or 1))
+        logger.info(f"开始获取 {len(self.query_ids)} 个批次的数据（并发数: {max_workers}）...")
+        self.unchanged_queries = []
+
+        batch_names = self._batch_names(preserve_batches)
+
+        # 用令牌桶代替固定的 sleep 控制请求速率
+        if rate_limit is None and delay_seconds > 0:
+            rate_limit = 1.0 / delay_seconds
+        rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+
+        def fetch(query_id: int, batch_name: str) -> pd.DataFrame:
+            if use_cache and self.has_cached_result(query_id):
+                # 先用1行样本探测最新执行ID，未变化则不下载完整结果
+                if rate_limiter:
+                    rate_limiter.acquire()
+                try:
+                    execution_id = self._get_latest_execution_id(query_id)
+                except Exception as e:
+                    # 探测失败不影响本批次，按未命中缓存继续完整获取
+                    logger.warning(f"探测查询 {query_id} 的执行ID失败，直接获取完整结果: {str(e)}")
+                    execution_id = None
+                if self.is_result_unchanged(query_id, execution_id=execution_id):
+                    logger.info(f"⏭️  查询 {query_id} 的执行ID未变化 ({execution_id})，跳过批次: {batch_name}")
+                    self.mark_result_unchanged(query_id, execution_id)
+                    return pd.DataFrame()
+
+            if rate_limiter:
+                waited = rate_limiter.acquire()
+                if waited > 0:
+                    logger.info(f"限速等待 {waited:.2f} 秒后获取批次: {batch_name}")
 
-        logger.info(f"完成所有批次数据获取，共获取 {len(batch_dataframes)} 个有效批次")
+            logger.info(f"获取批次: {batch_name}")
+            return self.fetch_single_batch(query_id, batch_name, use_cache=use_cache)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dune-fetch") as executor:
+            futures = [executor.submit(fetch, query_id, batch_name)
+                       for query_id, batch_name in zip(self.query_ids, batch_names)]
+
+            # 按提交顺序收集结果，保证 merge_batch_data 的 keep='first' 去重语义不变
+            batch_dataframes = []
+            for i, future in enumerate(futures):
+                df = future.result()
+                futures[i] = None  # 释放 future 持有的批次
+                if df.empty:
+                    continue
+                if merger is not None:
+                    merger.add(df)
+                else:
+                    batch_dataframes.append(df)
+                del df
+
+        self.unchanged_queries.sort(key=self.query_ids.index)
+        batch_count = len(merger.batch_record_counts) if merger is not None else len(batch_dataframes)
+        logger.info(f"完成所有批次数据获取，共获取 {batch_count} 个有效批次")
+        if self.unchanged_queries:
+            logger.info(f"  结果未变化而跳过的查询: {self.unchanged_queries}")
         return batch_dataframes
 
-    def merge_batch_data(self, batch_dataframes: List[pd.DataFrame]) -> pd.DataFrame:
+    def merge_batch_data(self, batch_dataframes: List[pd.DataFrame],
+                         merger: RollingBatchMerger = None) -> pd.DataFrame:
         """
         合并所有批次的数据
 
         Args:
             batch_dataframes: 批次数据列表
+            merger: 滚动合并器；提供时逐个批次合并并从列表中移除（合并结果只包含去重键列），
+                不提供则一次性拼接全部批次后去重
 
         Returns:
             DataFrame: 合并后的数据
         """
-        if not batch_dataframes:
-            logger.warning("没有可合并的批次数据")
-            return pd.DataFrame()
+        if merger is not None:
+            # 从列表头部依次取出批次，合并后不再持有引用
+            batch_dataframes.reverse()
+            while batch_dataframes:
+                merger.add(batch_dataframes.pop())
+
+            if not merger.batch_record_counts:
+                logger.warning("没有可合并的批次数据")
+                return pd.DataFrame()
 
-        logger.info(f"开始合并 {len(batch_dataframes)} 个批次的数据...")
+            logger.info(f"滚动合并 {len(merger.batch_record_counts)} 个批次的数据...")
+            merged_df = merger.result()
+            initial_count = merger.input_records
+            final_count = len(merged_df)
+        else:
+            if not batch_dataframes:
+                logger.warning("没有可合并的批次数据")
+                return pd.DataFrame()
+
+            logger.info(f"开始合并 {len(batch_dataframes)} 个批次的数据...")
 
-        # 合并所有DataFrame
-        merged_df = pd.concat(batch_dataframes, ignore_index=True)
+            # 合并所有DataFrame（键列保持 category 类型）
+            merged_df = concat_frames(batch_dataframes, ignore_index=True)
 
-        # 去重（基于钱包地址和交易对）
-        initial_count = len(merged_df)
-        merged_df = merged_df.drop_duplicates(subset=['evt_tx_signer', 'lbPair'], keep='first')
-        final_count = len(merged_df)
+            # 去重（基于钱包地址和交易对）
+            initial_count = len(merged_df)
+            merged_df = merged_df.drop_duplicates(subset=MERGE_KEY_COLUMNS, keep='first')
+            final_count = len(merged_df)
 
         logger.info(f"数据合并完成：")
         logger.info(f"  合并前总记录数: {initial_count}")
@@ -227,23 +1593,28 @@ class MeteoraDataFetcher:
             batch_dir = os.path.join(self.batch_data_dir, batch_name)
             os.makedirs(batch_dir, exist_ok=True)
 
-            # 保存CSV格式
-            csv_file = os.path.join(batch_dir, f"{batch_name}.csv")
-            df.to_csv(csv_file, index=False, encoding='utf-8')
-
-            # 保存JSON格式
-            json_file = os.path.join(batch_dir, f"{batch_name}.json")
-            df.to_json(json_file, orient='records', ensure_ascii=False, indent=2)
-
-            # 保存原始rows数据（只保存rows，不包含metadata）
-            raw_rows_file = os.path.join(batch_dir, f"{batch_name}_raw_rows.json")
-            raw_rows_data = {
-                "batch_name": batch_name,
-                "query_id": query_result.query_id,
-                "rows": query_result.result.rows  # 只保存rows数据
-            }
-            with open(raw_rows_file, 'w', encoding='utf-8') as f:
-                json.dump(raw_rows_data, f, indent=2, ensure_ascii=False)
+            # 保存列式快照（默认格式）
+            save_columnar_snapshot(df, os.path.join(batch_dir, f"{batch_name}.npz"))
+
+            if "csv" in self.export_formats:
+                # 保存CSV格式
+                csv_file = os.path.join(batch_dir, f"{batch_name}.csv")
+                df.to_csv(csv_file, index=False, encoding='utf-8')
+
+            if "json" in self.export_formats:
+                # 保存JSON格式
+                json_file = os.path.join(batch_dir, f"{batch_name}.json")
+                df.to_json(json_file, orient='records', force_ascii=False, indent=2)
+
+                # 保存原始rows数据（只保存rows，不包含metadata）
+                raw_rows_file = os.path.join(batch_dir, f"{batch_name}_raw_rows.json")
+                raw_rows_data = {
+                    "batch_name": batch_name,
+                    "query_id": query_result.query_id,
+                    "rows": query_result.result.rows  # 只保存rows数据
+                }
+                with open(raw_rows_file, 'w', encoding='utf-8') as f:
+                    json.dump(raw_rows_data, f, indent=2, ensure_ascii=False)
 
             # 保存批次摘要
             summary = {
@@ -266,32 +1637,46 @@ class MeteoraDataFetcher:
         except Exception as e:
             logger.warning(f"保存批次 '{batch_name}' 数据失败: {str(e)}")
 
-    def save_merged_data(self, merged_df: pd.DataFrame, batch_dataframes: List[pd.DataFrame]):
+    def save_merged_data(self, merged_df: pd.DataFrame, batch_dataframes: List[pd.DataFrame],
+                         merger: RollingBatchMerger = None):
         """
         保存合并后的完整数据
 
         Args:
             merged_df: 合并后的数据
             batch_dataframes: 原始批次数据列表
+            merger: 滚动合并器，提供时摘要中的批次行数、列和类型取自合并器记录的输入批次
         """
         try:
-            # 保存合并后的CSV格式
+            # 保存合并后的列式快照
+            merged_snapshot_file = os.path.join(self.data_dir, "merged_dune_data.npz")
+            save_columnar_snapshot(merged_df, merged_snapshot_file)
+
             merged_csv_file = os.path.join(self.data_dir, "merged_dune_data.csv")
-            merged_df.to_csv(merged_csv_file, index=False, encoding='utf-8')
+            if "csv" in self.export_formats:
+                # 保存合并后的CSV格式
+                merged_df.to_csv(merged_csv_file, index=False, encoding='utf-8')
 
-            # 保存合并后的JSON格式
             merged_json_file = os.path.join(self.data_dir, "merged_dune_data.json")
-            merged_df.to_json(merged_json_file, orient='records', ensure_ascii=False, indent=2)
+            if "json" in self.export_formats:
+                # 保存合并后的JSON格式
+                merged_df.to_json(merged_json_file, orient='records', force_ascii=False, indent=2)
 
             # 创建合并摘要信息
+            if merger is not None:
+                batch_record_counts = list(merger.batch_record_counts)
+                data_types = merger.input_schema()
+            else:
+                batch_record_counts = [len(df) for df in batch_dataframes]
+                data_types = merged_df.dtypes.astype(str).to_dict()
             merge_summary = {
-                "total_batches": len(batch_dataframes),
-                "batch_record_counts": [len(df) for df in batch_dataframes],
+                "total_batches": len(batch_record_counts),
+                "batch_record_counts": batch_record_counts,
                 "merged_total_records": len(merged_df),
                 "unique_wallets": merged_df['evt_tx_signer'].nunique(),
                 "unique_pairs": merged_df['lbPair'].nunique(),
-                "columns": list(merged_df.columns),
-                "data_types": merged_df.dtypes.astype(str).to_dict(),
+                "columns": list(data_types),
+                "data_types": data_types,
                 "merge_timestamp": pd.Timestamp.now().isoformat(),
                 "blockchain": "Solana",
                 "project": "Meteora DLMM"
@@ -303,23 +1688,33 @@ class MeteoraDataFetcher:
                 json.dump(merge_summary, f, indent=2, ensure_ascii=False)
 
             logger.info(f"合并数据已保存:")
-            logger.info(f"  CSV文件: {merged_csv_file}")
-            logger.info(f"  JSON文件: {merged_json_file}")
+            logger.info(f"  列式快照: {merged_snapshot_file}")
+            if "csv" in self.export_formats:
+                logger.info(f"  CSV文件: {merged_csv_file}")
+            if "json" in self.export_formats:
+                logger.info(f"  JSON文件: {merged_json_file}")
             logger.info(f"  摘要文件: {summary_file}")
 
         except Exception as e:
             logger.warning(f"保存合并数据失败: {str(e)}")
 
-    def get_dune_data(self, delay_seconds: float = 1.0, preserve_batches: bool = True) -> pd.DataFrame:
+    def get_dune_data(self, delay_seconds: float = 1.0, preserve_batches: bool = True,
+                      max_workers: int = 1, rate_limit: float = None, use_cache: bool = False,
+                      rolling_merge: bool = False) -> pd.DataFrame:
         """
         从Dune获取所有批次数据并合并
 
         Args:
             delay_seconds: 每个批次之间的延迟时间（秒）
             preserve_batches: 是否保留历史批次数据（避免覆盖）
+            max_workers: 并发获取的最大线程数
+            rate_limit: 每秒允许的最大请求数
+            use_cache: 跳过结果未变化的查询，只合并有变化的批次
+            rolling_merge: 每个批次获取后立即滚动合并并释放（峰值内存约为并发批次加去重集合），
+                合并结果只包含 evt_tx_signer 和 lbPair 两列，合并摘要不变
 
         Returns:
-            DataFrame: 合并后的所有数据
+            DataFrame: 合并后的所有数据（所有查询都未变化时为空）
         """
         logger.info(f"开始从Dune获取数据，共 {len(self.query_ids)} 个查询...")
 
@@ -330,19 +1725,34 @@ class MeteoraDataFetcher:
 
         try:
             # 获取所有批次数据
-            batch_dataframes = self.fetch_all_batches(delay_seconds, preserve_batches)
+            merger = RollingBatchMerger() if rolling_merge else None
+            with self.metrics.stage("fetch_all_batches", queries=len(self.query_ids)) as stage:
+                batch_dataframes = self.fetch_all_batches(delay_seconds, preserve_batches, max_workers, rate_limit,
+                                                          use_cache=use_cache, merger=merger)
+                batch_record_counts = (merger.batch_record_counts if merger is not None
+                                       else [len(df) for df in batch_dataframes])
+                stage["batches"] = len(batch_record_counts)
+                stage["rows"] = sum(batch_record_counts)
+                stage["unchanged_queries"] = len(self.unchanged_queries)
+
+            if not batch_record_counts and self.unchanged_queries:
+                logger.info("所有查询结果均未变化，无需合并")
+                return pd.DataFrame()
 
-            if not batch_dataframes:
+            if not batch_record_counts:
                 raise Exception("所有批次都未获取到有效数据")
 
-            # 合并批次数据
-            merged_df = self.merge_batch_data(batch_dataframes)
+            # 合并批次数据（滚动合并时批次已在获取过程中合并）
+            with self.metrics.stage("merge_batch_data", rows=sum(batch_record_counts)) as stage:
+                merged_df = self.merge_batch_data(batch_dataframes, merger=merger)
+                stage["merged_rows"] = len(merged_df)
 
             if merged_df.empty:
                 raise Exception("合并后的数据为空")
 
             # 保存合并后的完整数据
-            self.save_merged_data(merged_df, batch_dataframes)
+            with self.metrics.stage("save_merged_data", rows=len(merged_df)):
+                self.save_merged_data(merged_df, batch_dataframes, merger=merger)
 
             return merged_df
 
@@ -350,113 +1760,520 @@ class MeteoraDataFetcher:
             logger.error(f"获取Dune数据失败: {str(e)}")
             raise
 
-    def process_wallet_data(self, df: pd.DataFrame) -> Dict[str, List[str]]:
-        """处理钱包数据，按钱包地址分组lbPair"""
-        wallet_pairs = defaultdict(set)
+    def _get_latest_execution_id(self, query_id: int) -> str:
+        """获取查询最新一次执行的ID（只拉取1行样本，不下载完整结果）"""
+        query_result = self.dune.get_latest_result(query_id, sample_count=1)
+        return query_result.execution_id if query_result else None
 
-        for _, row in df.iterrows():
-            wallet = row['evt_tx_signer']
-            lb_pair = row['lbPair']
+    def _load_result_cache(self) -> dict:
+        """读取结果缓存，文件不存在或损坏时返回空缓存"""
+        cache_file = os.path.join(self.data_dir, RESULT_CACHE_FILE)
+        if not os.path.exists(cache_file):
+            return {}
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取结果缓存失败，将重新获取所有查询: {str(e)}")
+            return {}
 
-            if pd.notna(wallet) and pd.notna(lb_pair):
-                wallet_pairs[wallet].add(lb_pair)
+    @staticmethod
+    def compute_content_hash(df: pd.DataFrame) -> str:
+        """计算批次数据的内容哈希（列名 + 逐行哈希），用于识别重新执行但结果相同的查询"""
+        digest = hashlib.sha256(json.dumps(list(map(str, df.columns))).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        return digest.hexdigest()
+
+    def has_cached_result(self, query_id: int) -> bool:
+        """查询是否已有入库记录"""
+        return str(query_id) in self.result_cache
+
+    def is_result_unchanged(self, query_id: int, execution_id: str = None, content_hash: str = None) -> bool:
+        """执行ID或内容哈希与缓存一致时认为结果未变化"""
+        cached = self.result_cache.get(str(query_id))
+        if not cached:
+            return False
+        if execution_id and execution_id == cached.get("execution_id"):
+            return True
+        return bool(content_hash) and content_hash == cached.get("content_hash")
+
+    def mark_result_unchanged(self, query_id: int, execution_id: str = None):
+        """记录本次被跳过的查询；执行ID变化但内容相同时同步更新缓存中的执行ID"""
+        with self._cache_lock:
+            self.unchanged_queries.append(query_id)
+            cached = self.result_cache.get(str(query_id))
+            if cached and execution_id and execution_id != cached.get("execution_id"):
+                self._pending_cache[str(query_id)] = dict(cached, execution_id=execution_id)
+
+    def record_result(self, query_id: int, execution_id: str, content_hash: str, batch_name: str, total_records: int):
+        """登记新入库的结果，调用 commit_result_cache 后才写入缓存文件"""
+        with self._cache_lock:
+            self._pending_cache[str(query_id)] = {
+                "execution_id": execution_id,
+                "content_hash": content_hash,
+                "batch_name": batch_name,
+                "total_records": total_records,
+                "fetch_timestamp": pd.Timestamp.now().isoformat()
+            }
 
-        # 转换为列表
-        result = {wallet: list(pairs) for wallet, pairs in wallet_pairs.items()}
+    def commit_result_cache(self):
+        """
+        把本次运行登记的结果写入缓存文件
+        只在数据成功入库后调用，避免中途失败导致下次运行误判为未变化而丢数据
+        """
+        with self._cache_lock:
+            if not self._pending_cache:
+                return
+            self.result_cache.update(self._pending_cache)
+            self._pending_cache = {}
 
-        logger.info(f"处理完成：{len(result)} 个唯一钱包")
-        total_pairs = sum(len(pairs) for pairs in result.values())
-        logger.info(f"总计 {total_pairs} 个钱包-交易对组合")
+            cache_file = os.path.join(self.data_dir, RESULT_CACHE_FILE)
+            tmp_file = cache_file + ".tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.result_cache, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, cache_file)
 
-        return result
+        logger.info(f"结果缓存已更新: {cache_file}")
 
-    def create_wallet_index(self, wallet_data: Dict[str, List[str]], max_files: int = 16, max_wallets_per_file: int = 10000) -> Dict[str, str]:
+    def discard_pending_results(self, query_ids: List[int] = None):
         """
-        创建钱包索引，用于快速查找
-        优化的分组策略：控制文件数量，适合GitHub仓库
+        丢弃尚未提交的结果缓存条目（数据未能入库时调用），避免之后的提交把它们误记为已入库
 
         Args:
-            wallet_data: 钱包数据
-            max_files: 最大文件数量
-            max_wallets_per_file: 每个文件最大钱包数量
+            query_ids: 要丢弃的查询ID，不提供则丢弃全部
         """
-        index = {}
+        with self._cache_lock:
+            if query_ids is None:
+                self._pending_cache = {}
+            else:
+                for query_id in query_ids:
+                    self._pending_cache.pop(str(query_id), None)
 
-        # 使用16进制字符作为第一级分组 (0-9, a-f)
-        hex_chars = '0123456789abcdef'
-        primary_groups = defaultdict(dict)
+    def prune_batches(self, keep: int) -> List[str]:
+        """
+        批次保留策略：每个查询只保留最近的 keep 个批次目录，结果缓存引用的批次总是保留
 
-        # 第一级分组：按钱包地址第一个字符分组
-        for wallet, pairs in wallet_data.items():
-            first_char = wallet[0].lower()
-            if first_char in hex_chars:
-                primary_groups[first_char][wallet] = pairs
-            else:
-                # 非标准字符归入 'other' 组
-                primary_groups['other'][wallet] = pairs
+        Args:
+            keep: 每个查询保留的批次数
 
-        logger.info(f"第一级分组完成，共 {len(primary_groups)} 个组")
+        Returns:
+            List[str]: 被删除的批次名称
+        """
+        referenced = {entry.get("batch_name") for entry in self.result_cache.values()}
+        batches_by_query = defaultdict(list)
+
+        for name in os.listdir(self.batch_data_dir):
+            path = os.path.join(self.batch_data_dir, name)
+            if not name.startswith("batch_") or not os.path.isdir(path):
+                continue
+            # 批次名以查询ID结尾: batch_{时间戳}_{序号}_{查询ID} 或 batch_{序号}_{查询ID}
+            batches_by_query[name.rsplit('_', 1)[-1]].append((os.path.getmtime(path), name))
+
+        removed = []
+        for batches in batches_by_query.values():
+            batches.sort(reverse=True)
+            for _, name in batches[max(keep, 0):]:
+                if name in referenced:
+                    continue
+                shutil.rmtree(os.path.join(self.batch_data_dir, name), ignore_errors=True)
+                removed.append(name)
+
+        if removed:
+            logger.info(f"🧹 按保留策略删除了 {len(removed)} 个旧批次目录（每个查询保留 {keep} 个）")
+        return sorted(removed)
+
+    def iter_result_pages(self, query_id: int, page_size: int = 50000, rate_limiter: TokenBucket = None,
+                          execution_id: str = None):
+        """
+        分页获取查询最新结果的行数据
 
-        # 检查是否需要进一步细分
-        final_groups = {}
+        Args:
+            query_id: 查询ID
+            page_size: 每页行数
+            rate_limiter: 可选的令牌桶限速器，每次请求前获取令牌
+            execution_id: 已探测到的执行ID，不提供则先查询最新执行ID
 
-        for group_key, group_data in primary_groups.items():
-            if len(group_data) <= max_wallets_per_file:
-                # 不需要细分
-                final_groups[group_key] = group_data
-                logger.info(f"组 '{group_key}': {len(group_data)} 个钱包，无需细分")
-            else:
-                # 需要细分：按第二个字符进一步分组
-                logger.info(f"组 '{group_key}': {len(group_data)} 个钱包，需要细分")
-                sub_groups = defaultdict(dict)
-
-                for wallet, pairs in group_data.items():
-                    if len(wallet) > 1:
-                        second_char = wallet[1].lower()
-                        if second_char in hex_chars:
-                            sub_key = f"{group_key}_{second_char}"
-                        else:
-                            sub_key = f"{group_key}_other"
-                    else:
-                        sub_key = f"{group_key}_short"
-
-                    sub_groups[sub_key][wallet] = pairs
-
-                # 将细分后的组加入最终组
-                for sub_key, sub_data in sub_groups.items():
-                    final_groups[sub_key] = sub_data
-                    logger.info(f"  子组 '{sub_key}': {len(sub_data)} 个钱包")
-
-        # 创建文件并建立索引
-        total_files = 0
-        for group_key, group_data in final_groups.items():
-            filename = f"wallets_{group_key}.json"
-            filepath = os.path.join(self.data_dir, filename)
-
-            # 创建优化的数据结构
-            optimized_data = {
-                "group_info": {
-                    "group_key": group_key,
-                    "wallet_count": len(group_data),
-                    "total_pairs": sum(len(pairs) for pairs in group_data.values()),
-                    "created_at": pd.Timestamp.now().isoformat()
-                },
-                "wallets": group_data
-            }
+        Yields:
+            List[dict]: 每页的行数据
+        """
+        if not execution_id:
+            if rate_limiter:
+                rate_limiter.acquire()
+            execution_id = self._get_latest_execution_id(query_id)
+        if not execution_id:
+            return
+
+        offset = 0
+        while offset is not None:
+            if rate_limiter:
+                rate_limiter.acquire()
+
+            page = self.dune.get_execution_results(execution_id, limit=page_size, offset=offset)
+            rows = page.result.rows if page and page.result else []
+            if rows:
+                yield rows
+
+            offset = page.next_offset if page and rows else None
+
+    def fetch_single_batch_streaming(self, query_id: int, batch_name: str, wallet_pairs: Dict[str, set],
+                                     merged_writer: StreamingRecordWriter = None, page_size: int = 50000,
+                                     rate_limiter: TokenBucket = None, execution_id: str = None,
+                                     seen_keys: PairKeySet = None) -> int:
+        """
+        流式获取单个批次：逐页写入批次文件，并增量更新钱包-交易对聚合结果
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(optimized_data, f, separators=(',', ':'), ensure_ascii=False)
+        Args:
+            query_id: 查询ID
+            batch_name: 批次名称
+            wallet_pairs: 钱包 -> 交易对集合，按批次顺序累积（等价于 keep='first' 去重）
+            merged_writer: 合并数据写入器，只写入首次出现的钱包-交易对记录
+            page_size: 每页行数
+            rate_limiter: 可选的令牌桶限速器
+            execution_id: 已探测到的执行ID
+            seen_keys: 与 wallet_pairs 同步的键集合（多个批次共用），不提供则由 wallet_pairs 构建
 
-            # 记录每个钱包属于哪个文件 - 确保所有钱包都被索引
-            for wallet in group_data.keys():
-                index[wallet] = filename
-                logger.debug(f"索引钱包 {wallet} -> {filename}")
+        Returns:
+            int: 该批次的记录数
 
-            total_files += 1
+        批次获取完成之前，首次出现的记录只写入批次目录中的待合并分块，新键只记在批次内；
+        全部分页成功后才并入 wallet_pairs、seen_keys 和 merged_writer，
+        中途失败的批次（缺少列、分页请求出错）不会留下部分数据
 
-            # 计算文件大小
-            file_size = os.path.getsize(filepath) / (1024 * 1024)  # MB
-            logger.info(f"创建文件 '{filename}': {len(group_data)} 个钱包, {file_size:.2f} MB")
+        Raises:
+            ValueError: 数据缺少必要列；此时删除不完整的批次目录，调用方应视为该批次失败
+        """
+        logger.info(f"流式获取批次 '{batch_name}' (查询ID: {query_id})，每页 {page_size} 行...")
+
+        if seen_keys is None:
+            seen_keys = PairKeySet()
+            if wallet_pairs:
+                seen_keys.add(np.array([wallet for wallet, pairs in wallet_pairs.items() for _ in pairs], dtype=object),
+                              np.array([pair for pairs in wallet_pairs.values() for pair in pairs], dtype=object))
+
+        batch_dir = os.path.join(self.batch_data_dir, batch_name)
+        os.makedirs(batch_dir, exist_ok=True)
+
+        export_json = "json" in self.export_formats
+        batch_writer = StreamingRecordWriter(
+            csv_file=os.path.join(batch_dir, f"{batch_name}.csv") if "csv" in self.export_formats else None,
+            json_file=os.path.join(batch_dir, f"{batch_name}.json") if export_json else None,
+            snapshot_file=os.path.join(batch_dir, f"{batch_name}.npz")
+        )
+        raw_file = open(os.path.join(batch_dir, f"{batch_name}_raw_rows.json"), 'w', encoding='utf-8') if export_json else None
+        pending_file = os.path.join(batch_dir, f"{batch_name}_pending_merge.npz")
+        pending_writer = StreamingRecordWriter(snapshot_file=pending_file) if merged_writer is not None else None
+        batch_keys = PairKeySet()  # 本批次内已出现的键
+        new_wallets = []
+        new_pools = []
+        batch_wallets = set()
+        batch_pairs = set()
+        data_types = {}
+        completed = False
+
+        try:
+            if raw_file:
+                raw_file.write(f'{{"batch_name": {json.dumps(batch_name)}, "query_id": {json.dumps(query_id)}, "rows": [')
+            first_row = True
+
+            for rows in self.iter_result_pages(query_id, page_size, rate_limiter, execution_id):
+                if not rows:
+                    continue
+
+                missing_columns = [col for col in MERGE_KEY_COLUMNS if col not in rows[0]]
+                if missing_columns:
+                    raise ValueError(f"批次 '{batch_name}' 数据中缺少必要列: {missing_columns}")
+
+                chunk = self.project_rows(rows)
+
+                if raw_file:
+                    for row in rows:
+                        raw_file.write(('' if first_row else ',') + json.dumps(row, ensure_ascii=False))
+                        first_row = False
+
+                batch_writer.write(chunk)
+                data_types = chunk.dtypes.astype(str).to_dict()
+
+                keys = chunk[['evt_tx_signer', 'lbPair']].dropna()
+                batch_wallets.update(keys['evt_tx_signer'])
+                batch_pairs.update(keys['lbPair'])
+
+                # 向量化判断首次出现的钱包-交易对（批次内首次出现，且之前完成的批次中没有）
+                is_new = batch_keys.add(chunk['evt_tx_signer'], chunk['lbPair'])
+                is_new &= ~seen_keys.contains(chunk['evt_tx_signer'], chunk['lbPair'])
+                new_wallets.append(chunk['evt_tx_signer'].to_numpy(dtype=object)[is_new])
+                new_pools.append(chunk['lbPair'].to_numpy(dtype=object)[is_new])
+
+                if pending_writer is not None:
+                    pending_writer.write(chunk[is_new])
+
+                logger.info(f"批次 '{batch_name}' 已处理 {batch_writer.total_records} 条记录")
+
+            if raw_file:
+                raw_file.write(']}')
+            completed = True
+        finally:
+            batch_writer.close()
+            if pending_writer is not None:
+                pending_writer.close()
+            if raw_file:
+                raw_file.close()
+            if not completed:
+                # 不完整的批次文件（未闭合的 raw_rows、缺少摘要）不能留给后续的合并和缓存使用
+                shutil.rmtree(batch_dir, ignore_errors=True)
+
+        # 批次完整获取后再并入共享的聚合结果和合并数据
+        if new_wallets:
+            wallets = np.concatenate(new_wallets)
+            pools = np.concatenate(new_pools)
+            seen_keys.add(wallets, pools)
+            for wallet, lb_pair in zip(wallets, pools):
+                wallet_pairs.setdefault(wallet, set()).add(lb_pair)
+        if pending_writer is not None:
+            for part in range(pending_writer.parts):
+                part_file = f"{pending_file[:-len('.npz')]}_part{part:05d}.npz"
+                merged_writer.write(load_columnar_snapshot(part_file))
+                os.remove(part_file)
+
+        summary = {
+            "batch_name": batch_name,
+            "query_id": query_id,
+            "total_records": batch_writer.total_records,
+            "unique_wallets": len(batch_wallets),
+            "unique_pairs": len(batch_pairs),
+            "columns": batch_writer.columns or [],
+            "data_types": data_types,
+            "fetch_timestamp": pd.Timestamp.now().isoformat(),
+            "streaming": True,
+            "page_size": page_size
+        }
+
+        summary_file = os.path.join(batch_dir, f"{batch_name}_summary.json")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+        logger.info(f"批次 '{batch_name}' 流式获取完成，共 {batch_writer.total_records} 条记录")
+        return batch_writer.total_records
+
+    def stream_dune_data(self, delay_seconds: float = 1.0, preserve_batches: bool = True,
+                         page_size: int = 50000, rate_limit: float = None,
+                         use_cache: bool = False) -> Dict[str, List[str]]:
+        """
+        流式获取所有批次并直接聚合为钱包数据
+        峰值内存只与单页大小和钱包-交易对聚合结果有关，与查询返回的总行数无关
+
+        Args:
+            delay_seconds: 请求之间的延迟时间（秒），未指定 rate_limit 时换算为令牌桶速率
+            preserve_batches: 是否保留历史批次数据（避免覆盖）
+            page_size: 每页行数
+            rate_limit: 每秒允许的最大请求数
+            use_cache: 跳过执行ID与结果缓存一致的查询（流式模式不计算内容哈希）
+
+        Returns:
+            Dict[str, List[str]]: 钱包 -> 交易对列表（所有查询都未变化时为空）
+        """
+        logger.info(f"开始流式获取 {len(self.query_ids)} 个批次的数据，每页 {page_size} 行...")
+        self.unchanged_queries = []
+
+        if rate_limit is None and delay_seconds > 0:
+            rate_limit = 1.0 / delay_seconds
+        rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+
+        wallet_pairs = {}
+        seen_keys = PairKeySet()
+        batch_record_counts = []
+        merged_writer = StreamingRecordWriter(
+            csv_file=os.path.join(self.data_dir, "merged_dune_data.csv") if "csv" in self.export_formats else None,
+            json_file=os.path.join(self.data_dir, "merged_dune_data.json") if "json" in self.export_formats else None,
+            snapshot_file=os.path.join(self.data_dir, "merged_dune_data.npz")
+        )
+
+        try:
+            for query_id, batch_name in zip(self.query_ids, self._batch_names(preserve_batches)):
+                try:
+                    # 分页前本来就要查询最新执行ID，提前探测以便判断缓存
+                    if rate_limiter:
+                        rate_limiter.acquire()
+                    execution_id = self._get_latest_execution_id(query_id)
+                    if use_cache and self.is_result_unchanged(query_id, execution_id=execution_id):
+                        logger.info(f"⏭️  查询 {query_id} 的执行ID未变化 ({execution_id})，跳过批次: {batch_name}")
+                        self.mark_result_unchanged(query_id, execution_id)
+                        continue
+
+                    record_count = self.fetch_single_batch_streaming(query_id, batch_name, wallet_pairs,
+                                                                     merged_writer, page_size, rate_limiter,
+                                                                     execution_id, seen_keys)
+                    if record_count and execution_id:
+                        self.record_result(query_id, execution_id, None, batch_name, record_count)
+                except Exception as e:
+                    logger.error(f"流式获取批次 '{batch_name}' 数据失败: {str(e)}")
+                    record_count = 0
+
+                if record_count:
+                    batch_record_counts.append(record_count)
+        finally:
+            merged_writer.close()
+
+        if not batch_record_counts and self.unchanged_queries:
+            logger.info("所有查询结果均未变化，无需合并")
+            return {}
+
+        if not batch_record_counts:
+            raise Exception("所有批次都未获取到有效数据")
+
+        merge_summary = {
+            "total_batches": len(batch_record_counts),
+            "batch_record_counts": batch_record_counts,
+            "merged_total_records": merged_writer.total_records,
+            "unique_wallets": len(wallet_pairs),
+            "unique_pairs": len({pair for pairs in wallet_pairs.values() for pair in pairs}),
+            "columns": merged_writer.columns or [],
+            "merge_timestamp": pd.Timestamp.now().isoformat(),
+            "blockchain": "Solana",
+            "project": "Meteora DLMM",
+            "streaming": True
+        }
+
+        summary_file = os.path.join(self.data_dir, "merge_summary.json")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            json.dump(merge_summary, f, indent=2, ensure_ascii=False)
+
+        logger.info(f"流式合并完成：合并前 {sum(batch_record_counts)} 条，去重后 {merged_writer.total_records} 条")
+
+        result = {wallet: list(pairs) for wallet, pairs in wallet_pairs.items()}
+        logger.info(f"处理完成：{len(result)} 个唯一钱包")
+        return result
+
+    @staticmethod
+    def build_wallet_table(df: pd.DataFrame) -> WalletPairTable:
+        """
+        处理钱包数据，按钱包地址分组lbPair，结果保存为整数编码的 WalletPairTable
+
+        使用列式分组代替逐行遍历：先对两列编码为整数，再用整数键去重、
+        排序后按钱包切分。钱包及其交易对均保持首次出现的顺序。
+        """
+        if df.empty or 'evt_tx_signer' not in df.columns or 'lbPair' not in df.columns:
+            logger.info("处理完成：0 个唯一钱包")
+            return WalletPairTable.empty()
+
+        pairs_df = df[['evt_tx_signer', 'lbPair']].dropna()
+        if pairs_df.empty:
+            logger.info("处理完成：0 个唯一钱包")
+            return WalletPairTable.empty()
+
+        table = WalletPairTable.from_columns(pairs_df['evt_tx_signer'], pairs_df['lbPair'])
+
+        logger.info(f"处理完成：{len(table)} 个唯一钱包")
+        logger.info(f"总计 {table.total_pairs} 个钱包-交易对组合")
+
+        return table
+
+    @staticmethod
+    def process_wallet_data(df: pd.DataFrame) -> Dict[str, List[str]]:
+        """处理钱包数据，按钱包地址分组lbPair（build_wallet_table 的字典形式）"""
+        return MeteoraDataFetcher.build_wallet_table(df).to_dict()
+
+    @staticmethod
+    def plan_shard_count(wallets: List[str], max_files: int = 16, max_wallets_per_file: int = 10000,
+                         shard_sizes=None) -> int:
+        """
+        选择分片数量：在不超过 max_wallets_per_file 的前提下尽量满足 max_files
+
+        哈希分片的大小存在随机波动，因此从理论最小分片数开始逐步增加，
+        直到最大的分片也不超过 max_wallets_per_file。两个限制冲突时以单文件钱包数为准，
+        因为它决定了每次查询需要下载的数据量。
+
+        Args:
+            wallets: 钱包地址列表
+            max_files: 最大文件数量
+            max_wallets_per_file: 每个文件最大钱包数量
+            shard_sizes: 可选的 分片数 -> 各分片钱包数 函数（如 WalletStore.shard_sizes），
+                提供时 wallets 可以只是钱包数量
+
+        Returns:
+            int: 分片数量
+        """
+        if shard_sizes is None:
+            def shard_sizes(count):
+                return np.bincount(wallet_shard_ids(wallets, count), minlength=count)
+
+        total = wallets if isinstance(wallets, int) else len(wallets)
+        max_wallets_per_file = max(1, max_wallets_per_file)
+        shard_count = max(1, -(-total // max_wallets_per_file))
+
+        # 数据量较小时充分利用文件数上限，让单个分片更小
+        if shard_count < max_files:
+            shard_count = max(shard_count, min(max_files, total) or 1)
+
+        # 超过 total 个分片后继续增加也无济于事（多个钱包的32位哈希相同时无法分开），此时放弃并告警
+        for _ in range(MAX_SHARD_PLAN_STEPS):
+            sizes = shard_sizes(shard_count)
+            if total == 0 or sizes.max() <= max_wallets_per_file:
+                break
+            if shard_count >= total:
+                logger.warning(f"无法让每个分片不超过 {max_wallets_per_file} 个钱包（哈希冲突），"
+                               f"最大的分片有 {sizes.max()} 个钱包")
+                break
+            shard_count = min(total, shard_count + max(1, shard_count // 20))
+        else:
+            logger.warning(f"分片数搜索达到 {MAX_SHARD_PLAN_STEPS} 次上限，使用 {shard_count} 个分片")
+
+        if shard_count > max_files:
+            logger.warning(f"钱包数量 {total} 超出 {max_files} 个文件 x {max_wallets_per_file} 个钱包的容量，"
+                           f"使用 {shard_count} 个分片以保证单文件钱包数不超限")
+
+        return shard_count
+
+    def create_wallet_index(self, wallet_data: Mapping, max_files: int = 16, max_wallets_per_file: int = 10000,
+                            shard_format: str = "json") -> ShardIndex:
+        """
+        创建钱包索引，用于快速查找
+        优化的分组策略：按地址哈希均衡分片，控制文件数量和单文件大小，适合GitHub仓库
+
+        Args:
+            wallet_data: 钱包数据（WalletPairTable 或 钱包 -> 交易对列表）
+            max_files: 最大文件数量
+            max_wallets_per_file: 每个文件最大钱包数量
+            shard_format: 分片格式，"json" 或 "compact"（分片内池子字典 + 整数下标）
+
+        Returns:
+            ShardIndex: 钱包 -> 分片文件名，实际分片数记录在 self.shard_count
+        """
+        table = WalletPairTable.from_mapping(wallet_data)
+        previous_earnings, earnings_updated = self._load_published_earnings()
+
+        # 按钱包地址哈希分片，分片数由 max_files / max_wallets_per_file 决定；哈希只计算一次
+        hashes = wallet_hashes(table.wallets)
+        shard_count = self.plan_shard_count(
+            len(table), max_files, max_wallets_per_file,
+            shard_sizes=lambda count: np.bincount(hashes % np.uint32(count), minlength=count))
+        self.shard_count = shard_count
+        shard_ids = (hashes % np.uint32(shard_count)).astype(np.int64)
+
+        sizes = np.bincount(shard_ids, minlength=shard_count)
+        sizes = sizes[sizes > 0]
+        if len(sizes):
+            logger.info(f"哈希分片完成，共 {shard_count} 个分片，"
+                        f"每个分片 {sizes.min()} - {sizes.max()} 个钱包（平均 {sizes.sum() / shard_count:.0f}）")
+
+        # 按分片编号顺序拆分子表（与写入的并行度无关），所有分片共用一个创建时间
+        created_at = pd.Timestamp.now().isoformat()
+        tasks = []
+        for shard_id, group_data in table.shard_groups(shard_ids):
+            filename = shard_filename(shard_id, shard_count)
+            group_key = filename[len("wallets_"):-len(".json")]
+            tasks.append((os.path.join(self.output_dir, filename), group_key, group_data, shard_format, created_at,
+                          align_earnings(previous_earnings, group_data), earnings_updated))
+
+        # 记录每个钱包属于哪个文件 - 确保所有钱包都被索引
+        order = np.argsort(shard_ids, kind='stable')
+        index = ShardIndex(table.wallets[order], shard_ids[order], shard_count)
+
+        # 创建文件
+        file_sizes = self._write_shard_files(tasks)
+        total_files = len(tasks)
+        for (filepath, _, group_data, *_), file_size in zip(tasks, file_sizes):
+            logger.info(f"创建文件 '{os.path.basename(filepath)}': {len(group_data)} 个钱包, "
+                        f"{file_size / (1024 * 1024):.2f} MB")
 
         # 验证索引完整性
         total_wallets_in_data = len(wallet_data)
@@ -472,32 +2289,268 @@ class MeteoraDataFetcher:
         else:
             logger.info(f"✅ 索引完整性验证通过: {total_wallets_in_index} 个钱包")
 
+        # 删除旧布局遗留的分组文件，避免与新分片混淆
+        self._remove_stale_shards(set(index.files()))
+
+        # 反向索引：交易对 -> 钱包（由整数编码的表转置得到）
+        self.create_pool_index(table.transpose(), max_files, max_wallets_per_file)
+
         logger.info(f"索引创建完成，共创建 {total_files} 个文件")
         return index
 
-    def save_optimized_data(self, wallet_data: Dict[str, List[str]], max_files: int = 16, max_wallets_per_file: int = 10000):
+    def _load_published_earnings(self, filenames: List[str] = None) -> Tuple[Dict[str, Dict[str, float]],
+                                                                             Optional[str]]:
+        """
+        读取当前发布版本分片中预计算的手续费收入，重写分片时据此保留已有结果
+        只有 metadata.json 记录过 earnings 时才扫描分片；统计同时保存在 self.earnings_info
+
+        Args:
+            filenames: 只读取这些分片文件（增量重写），不提供则读取所有 wallets_*.json
+
+        Returns:
+            (钱包 -> {交易对: 收入}, 最近一次的 earnings_updated)，没有收入时为 ({}, None)
+        """
+        import glob
+        self.earnings_info = None
+        directory = self.generations.current_dir()
+        try:
+            with open(os.path.join(directory, "metadata.json"), 'r', encoding='utf-8') as f:
+                earnings_info = json.load(f).get("earnings")
+        except (FileNotFoundError, ValueError):
+            return {}, None
+        if not earnings_info:
+            return {}, None
+
+        if filenames is None:
+            filepaths = glob.glob(os.path.join(directory, "wallets_*.json"))
+        else:
+            filepaths = [os.path.join(directory, filename) for filename in filenames]
+
+        earnings = {}
+        earnings_updated = None
+        for filepath in filepaths:
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    file_data = json.load(f)
+            except FileNotFoundError:
+                continue
+            shard_earnings = file_data.get("earnings")
+            if not shard_earnings:
+                continue
+            wallet_pairs = decode_shard_wallets(file_data)
+            for wallet, values in shard_earnings.items():
+                earnings[wallet] = dict(zip(wallet_pairs.get(wallet, ()), values))
+            updated = file_data.get("group_info", {}).get("earnings_updated")
+            if updated and (earnings_updated is None or updated > earnings_updated):
+                earnings_updated = updated
+
+        self.earnings_info = earnings_info
+        logger.info(f"保留 {len(earnings)} 个钱包的手续费收入")
+        return earnings, earnings_updated
+
+    def create_pool_index(self, pool_wallets: Mapping, max_files: int = 16,
+                          max_wallets_per_file: int = 10000) -> dict:
+        """
+        创建反向索引：交易对 -> 钱包列表，按交易对地址哈希分片写入 pools_*.json
+        并把每个交易对的钱包数写入 pool_counts.json
+
+        Args:
+            pool_wallets: 交易对 -> 钱包列表（或 WalletPairTable.transpose() 得到的反向表）
+            max_files: 最大文件数量
+            max_wallets_per_file: 每个文件最大交易对数量（与钱包分片使用相同的限制）
+
+        Returns:
+            dict: 反向索引元数据（写入 metadata.json 的 pool_index），同时记录在 self.pool_index
+        """
+        table = WalletPairTable.from_mapping(pool_wallets)
+        pools = table.wallets  # 反向表的行是交易对
+        hashes = wallet_hashes(pools)
+        shard_count = self.plan_shard_count(
+            len(pools), max_files, max_wallets_per_file,
+            shard_sizes=lambda count: np.bincount(hashes % np.uint32(count), minlength=count))
+        shard_ids = (hashes % np.uint32(shard_count)).astype(np.int64)
+
+        created_at = pd.Timestamp.now().isoformat()
+        tasks = []
+        for shard_id, group in table.shard_groups(shard_ids):
+            filename = pool_shard_filename(shard_id, shard_count)
+            tasks.append((os.path.join(self.output_dir, filename), filename[len("pools_"):-len(".json")], group,
+                          "pools", created_at))
+        self._write_shard_files(tasks)
+
+        current_files = {os.path.basename(task[0]) for task in tasks}
+        self._remove_stale_shards(current_files, pattern="pools_*.json")
+
+        self.pool_index = self._save_pool_counts(dict(zip(pools.tolist(), table.lengths().tolist())), shard_count)
+        logger.info(f"反向索引创建完成: {len(pools)} 个交易对，{len(current_files)} 个文件")
+        return self.pool_index
+
+    def _write_shard_files(self, tasks: List[tuple]) -> List[int]:
+        """
+        写入分片文件，每个任务是 write_shard_file 的参数元组；
+        write_workers > 1 时在进程池中并行编码和写入（JSON编码受GIL限制，线程无法并行）
+
+        Returns:
+            List[int]: 各文件大小（字节），顺序与 tasks 一致
+        """
+        workers = min(self.write_workers, len(tasks))
+        if workers <= 1:
+            return [write_shard_file(*task) for task in tasks]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(write_shard_file, *zip(*tasks),
+                                     chunksize=max(1, len(tasks) // (workers * 4))))
+
+    def _write_pool_shard(self, shard_id: int, shard_count: int, pool_wallets: Dict[str, List[str]]) -> str:
+        """写入一个反向索引分片，返回文件名"""
+        filename = pool_shard_filename(shard_id, shard_count)
+        group_key = filename[len("pools_"):-len(".json")]
+        write_shard_file(os.path.join(self.output_dir, filename), group_key, pool_wallets, "pools")
+        return filename
+
+    def _save_pool_counts(self, pool_counts: Dict[str, int], shard_count: int) -> dict:
+        """写入 pool_counts.json（按钱包数降序），返回反向索引元数据"""
+        ordered = dict(top_pool_counts(pool_counts, limit=len(pool_counts)))
+        write_json_atomic(os.path.join(self.output_dir, POOL_COUNTS_FILE), ordered)
+
+        return {
+            "scheme": "fnv1a32",
+            "shard_count": shard_count,
+            "id_width": shard_id_width(shard_count),
+            "file_pattern": "pools_{shard_id_hex}.json",
+            "total_pools": len(pool_counts),
+            "counts_file": POOL_COUNTS_FILE,
+            "top_pools": top_pool_counts(pool_counts)
+        }
+
+    def update_pool_index(self, changes: Dict[str, List[str]], pool_index: dict,
+                          max_pools_per_file: int = None) -> Optional[dict]:
+        """
+        增量更新反向索引：只重写包含新增钱包-交易对的 pools_*.json 分片
+
+        Args:
+            changes: 钱包 -> 新增的交易对列表
+            pool_index: 现有的反向索引元数据（metadata.json 的 pool_index）
+            max_pools_per_file: 每个分片最大交易对数量，重写的分片超出时返回 None
+
+        Returns:
+            dict: 更新后的反向索引元数据；分片超出上限时为 None，调用方应全量重新分片
+        """
+        shard_count = pool_index["shard_count"]
+        added = defaultdict(list)
+        for wallet, pairs in changes.items():
+            for pair in pairs:
+                added[pair].append(wallet)
+
+        pools = list(added.keys())
+        affected = defaultdict(list)
+        for pool, shard_id in zip(pools, wallet_shard_ids(pools, shard_count).tolist()):
+            affected[shard_id].append(pool)
+
+        oversized = False
+        for shard_id, shard_pools in sorted(affected.items()):
+            filepath = os.path.join(self.output_dir, pool_shard_filename(shard_id, shard_count))
+            pool_wallets = {}
+            if os.path.exists(filepath):
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    pool_wallets = json.load(f)["pools"]
+            for pool in shard_pools:
+                pool_wallets.setdefault(pool, []).extend(added[pool])
+            self._write_pool_shard(shard_id, shard_count, pool_wallets)
+            if max_pools_per_file and len(pool_wallets) > max_pools_per_file:
+                oversized = True
+
+        counts_file = os.path.join(self.output_dir, POOL_COUNTS_FILE)
+        pool_counts = {}
+        if os.path.exists(counts_file):
+            with open(counts_file, 'r', encoding='utf-8') as f:
+                pool_counts = json.load(f)
+        for pool, wallets in added.items():
+            pool_counts[pool] = pool_counts.get(pool, 0) + len(wallets)
+
+        logger.info(f"反向索引增量更新: {len(pools)} 个交易对，重写 {len(affected)} 个文件")
+        self.pool_index = self._save_pool_counts(pool_counts, shard_count)
+        if oversized:
+            logger.warning(f"反向索引分片超过 {max_pools_per_file} 个交易对的上限")
+            return None
+        return self.pool_index
+
+    def _remove_stale_shards(self, current_files: set, pattern: str = "wallets_*.json"):
+        """删除不在 current_files 中的分组文件（默认 wallets_*.json）"""
+        import glob
+        for filepath in glob.glob(os.path.join(self.output_dir, pattern)):
+            if os.path.basename(filepath) not in current_files:
+                os.remove(filepath)
+                logger.info(f"删除旧分组文件: {os.path.basename(filepath)}")
+
+    def save_optimized_data(self, wallet_data: Mapping, max_files: int = 16, max_wallets_per_file: int = 10000,
+                            write_wallet_index: bool = False, shard_format: str = "json"):
         """
         保存优化后的数据结构
 
         Args:
-            wallet_data: 钱包数据
+            wallet_data: 钱包数据（WalletPairTable 或 钱包 -> 交易对列表）
             max_files: 最大文件数量（用于GitHub仓库优化）
             max_wallets_per_file: 每个文件最大钱包数量
+            write_wallet_index: 是否额外生成完整的 wallet_index.json
+                （查询时可直接由地址计算分片，默认不再生成）
+            shard_format: 分片格式，"json" 或 "compact"
         """
 
+        wallet_data = WalletPairTable.from_mapping(wallet_data)
+
         # 1. 创建钱包分组文件和索引
-        wallet_index = self.create_wallet_index(wallet_data, max_files, max_wallets_per_file)
+        with self.metrics.stage("create_wallet_index", wallets=len(wallet_data)) as stage:
+            wallet_index = self.create_wallet_index(wallet_data, max_files, max_wallets_per_file, shard_format)
+            stage["shards"] = self.shard_count
+
+        # 2. 保存钱包索引（压缩格式，仅在需要时生成，并删除过期的旧索引）
+        index_file = os.path.join(self.output_dir, "wallet_index.json")
+        if write_wallet_index:
+            write_json_atomic(index_file, wallet_index.to_dict())
+        elif os.path.exists(index_file):
+            os.remove(index_file)
+
+        # 3-5. 保存前缀索引、元数据和查询帮助
+        total_files = len(wallet_index.files())
+        self._save_index_files(total_wallets=len(wallet_data),
+                               total_pairs=wallet_data.total_pairs,
+                               total_files=total_files,
+                               sorted_wallets=np.sort(wallet_data.wallets).tolist(),  # 排序便于搜索
+                               max_files=max_files, max_wallets_per_file=max_wallets_per_file,
+                               shard_format=shard_format)
+
+        logger.info("数据优化存储完成")
+        logger.info(f"数据目录: {self.data_dir}")
+        logger.info(f"总文件数: {total_files} (限制: {max_files})")
+        if write_wallet_index:
+            logger.info(f"索引文件: {index_file}")
+        logger.info("✅ GitHub仓库优化存储策略已应用")
 
-        # 2. 保存钱包索引（压缩格式，适合GitHub）
-        index_file = os.path.join(self.data_dir, "wallet_index.json")
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(wallet_index, f, separators=(',', ':'), ensure_ascii=False)
+    def _save_index_files(self, total_wallets: int, total_pairs: int, total_files: int, sorted_wallets,
+                          max_files: int, max_wallets_per_file: int, shard_format: str):
+        """
+        保存分片存储的前缀索引、元数据和查询帮助（分片数取 self.shard_count）
 
-        # 3. 保存元数据
-        total_files = len(set(wallet_index.values()))
+        Args:
+            total_wallets: 钱包总数
+            total_pairs: 钱包-交易对总数
+            total_files: 分片文件数
+            sorted_wallets: 已排序的钱包地址（可迭代对象，逐块写入前缀索引）
+            max_files: 最大文件数量
+            max_wallets_per_file: 每个文件最大钱包数量
+            shard_format: 分片格式
+        """
+        # 3. 创建前缀索引（代替 wallet_list.json，前端搜索提示只需下载目录和一个块），删除旧的钱包列表
+        prefix_directory = build_prefix_index(self.output_dir, sorted_wallets)
+        wallet_list_file = os.path.join(self.output_dir, "wallet_list.json")
+        if os.path.exists(wallet_list_file):
+            os.remove(wallet_list_file)
+
+        # 4. 保存元数据
         metadata = {
-            "total_wallets": len(wallet_data),
-            "total_pairs": sum(len(pairs) for pairs in wallet_data.values()),
+            "total_wallets": total_wallets,
+            "total_pairs": total_pairs,
             "total_files": total_files,
             "max_files_limit": max_files,
             "max_wallets_per_file": max_wallets_per_file,
@@ -505,49 +2558,205 @@ class MeteoraDataFetcher:
             "data_structure": "优化分组存储，适合GitHub仓库",
             "blockchain": "Solana",
             "project": "Meteora DLMM",
-            "storage_strategy": "16进制字符分组，自动细分大文件",
+            "storage_strategy": "FNV-1a哈希分片，分片大小均衡",
+            "sharding": {
+                "scheme": "fnv1a32",
+                "shard_count": self.shard_count,
+                "id_width": shard_id_width(self.shard_count),
+                "file_pattern": "wallets_{shard_id_hex}.json",
+                "shard_format": shard_format
+            },
             "github_optimized": True
         }
+        metadata["prefix_index"] = prefix_index_summary(prefix_directory)
+        if self.pool_index is not None:
+            metadata["pool_index"] = self.pool_index
+        if self.earnings_info is not None:
+            metadata["earnings"] = self.earnings_info
 
-        metadata_file = os.path.join(self.data_dir, "metadata.json")
-        with open(metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, separators=(',', ':'), ensure_ascii=False)
-
-        # 4. 创建钱包列表（压缩格式，用于前端搜索提示）
-        wallet_list = sorted(list(wallet_data.keys()))  # 排序便于搜索
-        wallet_list_file = os.path.join(self.data_dir, "wallet_list.json")
-        with open(wallet_list_file, 'w', encoding='utf-8') as f:
-            json.dump(wallet_list, f, separators=(',', ':'), ensure_ascii=False)
+        metadata_file = os.path.join(self.output_dir, "metadata.json")
+        write_json_atomic(metadata_file, metadata)
 
         # 5. 创建查询帮助文档
+        example_wallet = "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM"
+        example_file = shard_filename(wallet_shard_id(example_wallet, self.shard_count), self.shard_count)
         query_help = {
             "how_to_query": "根据钱包地址查询对应的数据文件",
             "steps": [
-                "1. 从 wallet_index.json 中查找钱包地址对应的文件名",
-                "2. 加载对应的 wallets_*.json 文件",
-                "3. 从文件的 wallets 字段中获取该钱包的 lbPair 列表"
+                "1. 从 metadata.json 读取 sharding.shard_count 和 sharding.id_width",
+                "2. 计算 FNV-1a 32位哈希(钱包地址) % shard_count 得到分片编号，"
+                "按 id_width 位16进制补零得到 wallets_*.json 文件名",
+                "3. 加载该文件，从 wallets 字段中获取该钱包的 lbPair 列表"
             ],
             "example": {
-                "wallet": "9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM",
-                "step1": "查找 wallet_index.json['9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM']",
-                "step2": "假设返回 'wallets_9.json'，则加载该文件",
-                "step3": "获取 wallets_9.json['wallets']['9WzDXwBbmkg8ZTbNMqUxvQRAyrZzDsGYdLVL9zYtAWWM']"
+                "wallet": example_wallet,
+                "step1": f"shard_count = {self.shard_count}",
+                "step2": f"FNV-1a('{example_wallet}') % {self.shard_count} -> '{example_file}'",
+                "step3": f"获取 {example_file}['wallets']['{example_wallet}']"
             },
-            "file_structure": "wallets_[group].json",
-            "total_files": total_files
+            "file_structure": "wallets_[shard_id_hex].json",
+            "total_files": total_files,
+            "prefix_search": [
+                "1. 读取 wallet_prefix_index.json，blocks 为按分隔键排序的 [分隔键, 钱包数, 块编号]",
+                "2. 二分查找最后一个分隔键 <= 前缀的块，读取 wallet_prefix/[块编号hex].json（已排序的地址数组）",
+                "3. 从前缀位置开始取以前缀开头的地址；块末尾仍有匹配时，继续读取分隔键以前缀开头的下一个块"
+            ]
         }
 
-        help_file = os.path.join(self.data_dir, "query_help.json")
-        with open(help_file, 'w', encoding='utf-8') as f:
-            json.dump(query_help, f, indent=2, ensure_ascii=False)
+        help_file = os.path.join(self.output_dir, "query_help.json")
+        write_json_atomic(help_file, query_help, indent=2, separators=None)
 
-        logger.info("数据优化存储完成")
-        logger.info(f"数据目录: {self.data_dir}")
-        logger.info(f"总文件数: {total_files} (限制: {max_files})")
-        logger.info(f"索引文件: {index_file}")
         logger.info(f"元数据文件: {metadata_file}")
         logger.info(f"查询帮助: {help_file}")
-        logger.info("✅ GitHub仓库优化存储策略已应用")
+
+    def export_wallet_store(self, max_files: int = 16, max_wallets_per_file: int = 10000,
+                            shard_format: str = "json", changed_wallets: List[str] = None,
+                            changed_pools: List[str] = None) -> Dict[str, int]:
+        """
+        从SQLite钱包存储导出静态分片文件和索引文件
+        按分片逐个读取和写入，内存占用只与单个分片的大小有关
+
+        Args:
+            max_files: 最大文件数量
+            max_wallets_per_file: 每个文件最大钱包数量
+            shard_format: 分片格式，"json" 或 "compact"
+            changed_wallets: 只重写这些钱包所在的分片（沿用现有的分片数），
+                不提供或尚无分片存储时全量导出
+            changed_pools: 增量导出时只重写这些交易对所在的反向索引分片
+
+        Returns:
+            导出统计：重写的分片数、分片总数以及钱包/交易对总量
+        """
+        store = self.wallet_store
+        if store is None:
+            raise ValueError("未启用SQLite存储后端")
+
+        metadata = self._load_metadata()
+        sharding = metadata.get("sharding", {})
+        if changed_wallets is not None and sharding.get("shard_count"):
+            # 增量导出：钱包所在分片只由地址决定，只需重写受影响的分片
+            shard_count = sharding["shard_count"]
+            shard_format = sharding.get("shard_format", shard_format)
+            shard_ids = set(wallet_shard_ids(changed_wallets, shard_count).tolist())
+            max_files = metadata.get("max_files_limit", max_files)
+            max_wallets_per_file = metadata.get("max_wallets_per_file", max_wallets_per_file)
+        else:
+            shard_count = self.plan_shard_count(len(store), max_files, max_wallets_per_file,
+                                                shard_sizes=store.shard_sizes)
+            shard_ids = None
+        self.shard_count = shard_count
+        previous_earnings, earnings_updated = self._load_published_earnings(
+            None if shard_ids is None else [shard_filename(shard_id, shard_count) for shard_id in sorted(shard_ids)])
+
+        written = 0
+        for shard_id, group_data in store.iter_shards(shard_count, shard_ids):
+            filename = shard_filename(shard_id, shard_count)
+            group_key = filename[len("wallets_"):-len(".json")]
+            write_shard_file(os.path.join(self.output_dir, filename), group_key, group_data, shard_format,
+                             earnings=align_earnings(previous_earnings, group_data),
+                             earnings_updated=earnings_updated)
+            written += 1
+
+        sizes = store.shard_sizes(shard_count)
+        current_files = {shard_filename(shard_id, shard_count) for shard_id in np.flatnonzero(sizes).tolist()}
+        if shard_ids is None:
+            self._remove_stale_shards(current_files)
+
+        # 反向索引：交易对 -> 钱包，增量导出时只重写新增了钱包的交易对所在分片
+        pool_index = metadata.get("pool_index")
+        if shard_ids is not None and pool_index:
+            pool_shard_count = pool_index["shard_count"]
+            pool_shard_ids = set(wallet_shard_ids(changed_pools or [], pool_shard_count).tolist())
+        else:
+            pool_shard_count = self.plan_shard_count(
+                store.total_pools(), max_files, max_wallets_per_file,
+                shard_sizes=lambda count: store.shard_sizes(count, table="pools"))
+            pool_shard_ids = None
+        pool_files = {self._write_pool_shard(shard_id, pool_shard_count, pool_wallets)
+                      for shard_id, pool_wallets in store.iter_pool_shards(pool_shard_count, pool_shard_ids)}
+        if pool_shard_ids is None:
+            self._remove_stale_shards(pool_files, pattern="pools_*.json")
+        self.pool_index = self._save_pool_counts(store.pool_counts(), pool_shard_count)
+
+        total_wallets = int(sizes.sum())
+        total_pairs = store.total_pairs()
+        self._save_index_files(total_wallets=total_wallets, total_pairs=total_pairs,
+                               total_files=len(current_files), sorted_wallets=store.iter_wallet_addresses(),
+                               max_files=max_files, max_wallets_per_file=max_wallets_per_file,
+                               shard_format=shard_format)
+
+        logger.info(f"✅ 从SQLite存储导出 {written} 个分片（共 {shard_count} 个分片，{total_wallets} 个钱包）")
+        return {
+            "shards_written": written,
+            "pool_shards_written": len(pool_files),
+            "shard_count": shard_count,
+            "total_wallets": total_wallets,
+            "total_pairs": total_pairs
+        }
+
+    def lookup_wallet_pairs(self, wallet: str) -> Optional[List[str]]:
+        """
+        查询单个钱包的交易对列表
+        由地址直接计算所在分片，只读取一个分片文件，不需要 wallet_index.json
+
+        Args:
+            wallet: 钱包地址
+
+        Returns:
+            交易对列表，钱包不存在时返回 None
+        """
+        if self.wallet_store is not None:
+            return self.wallet_store.get_pairs(wallet)
+
+        sharding = self._load_metadata().get("sharding")
+
+        if sharding and sharding.get("shard_count"):
+            filename = shard_filename(wallet_shard_id(wallet, sharding["shard_count"]), sharding["shard_count"])
+        else:
+            # 旧的数据格式：通过索引文件查找
+            index_file = os.path.join(self.output_dir, "wallet_index.json")
+            if not os.path.exists(index_file):
+                return None
+            with open(index_file, 'r', encoding='utf-8') as f:
+                filename = json.load(f).get(wallet)
+            if not filename:
+                return None
+
+        filepath = os.path.join(self.output_dir, filename)
+        if not os.path.exists(filepath):
+            return None
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            file_data = json.load(f)
+
+        return decode_shard_wallets(file_data).get(wallet)
+
+    def lookup_pool_wallets(self, pool: str) -> Optional[List[str]]:
+        """
+        查询参与过某个交易对的钱包
+        由交易对地址计算反向索引分片，只读取一个 pools_*.json 文件，不需要读取钱包分片
+
+        Args:
+            pool: 交易对地址（lbPair）
+
+        Returns:
+            钱包列表，交易对不存在或尚未生成反向索引时返回 None
+        """
+        if self.wallet_store is not None:
+            return self.wallet_store.get_wallets(pool) or None
+        return read_pool_wallets(self.output_dir, pool)
+
+    def search_wallets(self, prefix: str, limit: int = 20) -> List[str]:
+        """按地址排序返回以 prefix 开头的钱包（前端搜索提示），最多 limit 个"""
+        if self.wallet_store is not None:
+            return self.wallet_store.search_prefix(prefix, limit)
+        if not os.path.exists(os.path.join(self.output_dir, PREFIX_INDEX_FILE)):
+            return []
+        return WalletPrefixIndex(self.output_dir).lookup(prefix, limit)
+
+    def top_pools(self, limit: int = TOP_POOLS_LIMIT) -> List[list]:
+        """钱包数最多的 limit 个交易对，返回 [交易对, 钱包数] 列表"""
+        return read_top_pools(self.output_dir, limit)
 
     def rebuild_wallet_index(self):
         """
@@ -561,7 +2770,7 @@ class MeteoraDataFetcher:
 
         # 扫描所有钱包数据文件
         import glob
-        wallet_files = glob.glob(os.path.join(self.data_dir, "wallets_*.json"))
+        wallet_files = glob.glob(os.path.join(self.output_dir, "wallets_*.json"))
 
         for filepath in wallet_files:
             filename = os.path.basename(filepath)
@@ -589,9 +2798,8 @@ class MeteoraDataFetcher:
                 logger.error(f"处理文件 {filename} 时出错: {str(e)}")
 
         # 保存重建的索引
-        index_file = os.path.join(self.data_dir, "wallet_index.json")
-        with open(index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, separators=(',', ':'), ensure_ascii=False)
+        index_file = os.path.join(self.output_dir, "wallet_index.json")
+        write_json_atomic(index_file, index)
 
         logger.info(f"✅ 索引重建完成!")
         logger.info(f"   处理了 {len(wallet_files)} 个数据文件")
@@ -600,27 +2808,123 @@ class MeteoraDataFetcher:
 
         return index
 
-    def load_existing_wallet_data(self) -> Dict[str, List[str]]:
+    def load_existing_wallet_data(self) -> WalletPairTable:
         """
         加载现有的钱包数据（如果存在）
-        用于累积合并多次运行的数据
+        用于累积合并多次运行的数据，优先读取列式快照（直接得到整数编码的表），其次读取JSON备份
+
+        只有快照和备份都不存在时才从空数据集开始；存在但无法读取时抛出异常，
+        否则之后的压缩会用空数据覆盖备份，丢失全部历史数据
         """
+        snapshot_file = os.path.join(self.data_dir, WALLET_SNAPSHOT_FILE)
         backup_file = os.path.join(self.data_dir, "full_wallet_data_backup.json")
+        existing_data = None
+        snapshot_error = None
 
-        if os.path.exists(backup_file):
+        if os.path.exists(snapshot_file):
             try:
-                with open(backup_file, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-                logger.info(f"加载现有钱包数据: {len(existing_data)} 个钱包")
-                return existing_data
+                existing_data = self.load_wallet_table(snapshot_file)
+                logger.info(f"从列式快照加载现有钱包数据: {len(existing_data)} 个钱包")
             except Exception as e:
-                logger.warning(f"加载现有数据失败: {str(e)}")
-                return {}
-        else:
-            logger.info("未找到现有数据文件，将创建新的数据集")
-            return {}
+                logger.warning(f"加载列式快照失败，改用JSON备份: {str(e)}")
+                snapshot_error = e
+
+        if existing_data is None:
+            if os.path.exists(backup_file):
+                try:
+                    with open(backup_file, 'r', encoding='utf-8') as f:
+                        existing_data = WalletPairTable.from_mapping(json.load(f))
+                    logger.info(f"加载现有钱包数据: {len(existing_data)} 个钱包")
+                except Exception as e:
+                    logger.error(f"加载现有数据失败，请先修复或恢复 {backup_file}: {str(e)}")
+                    raise
+            elif snapshot_error is not None:
+                logger.error(f"列式快照无法读取且没有JSON备份，请先修复或恢复 {snapshot_file}")
+                raise snapshot_error
+            else:
+                logger.info("未找到现有数据文件，将创建新的数据集")
+                existing_data = WalletPairTable.empty()
+
+        # 回放增量更新写入的变更日志
+        return self.replay_wallet_changes(existing_data)
 
-    def merge_wallet_data(self, existing_data: Dict[str, List[str]], new_data: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    def save_wallet_snapshot(self, wallet_data: Mapping, path: str = None):
+        """
+        把钱包 -> 交易对数据保存为列式快照（CSR结构：钱包字典、偏移量、交易对字典编码），
+        即 WalletPairTable 的数组
+
+        Args:
+            wallet_data: 钱包数据（WalletPairTable 或 钱包 -> 交易对列表）
+            path: 快照路径，默认 data_dir/wallet_pairs_snapshot.npz
+        """
+        path = path or os.path.join(self.data_dir, WALLET_SNAPSHOT_FILE)
+        table = WalletPairTable.from_mapping(wallet_data)
+
+        # 先写临时文件并 fsync 再替换，中途退出不会留下截断的快照
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f,
+                     wallets=_encode_strings(table.wallets.tolist()), num_wallets=np.array(len(table.wallets)),
+                     pools=_encode_strings(table.pools.tolist()), num_pools=np.array(len(table.pools)),
+                     offsets=table.offsets, pair_codes=table.pool_ids)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+        _fsync_path(os.path.dirname(os.path.abspath(path)))
+
+    @staticmethod
+    def load_wallet_table(path: str) -> WalletPairTable:
+        """读取 save_wallet_snapshot 生成的快照，不展开为列表"""
+        with np.load(path) as snapshot:
+            return WalletPairTable(_decode_strings(snapshot["wallets"], int(snapshot["num_wallets"])),
+                                   _decode_strings(snapshot["pools"], int(snapshot["num_pools"])),
+                                   snapshot["offsets"], snapshot["pair_codes"])
+
+    @staticmethod
+    def load_wallet_snapshot(path: str) -> Dict[str, List[str]]:
+        """读取 save_wallet_snapshot 生成的快照（字典形式）"""
+        return MeteoraDataFetcher.load_wallet_table(path).to_dict()
+
+    def replay_wallet_changes(self, wallet_data: Mapping) -> WalletPairTable:
+        """
+        将变更日志中的增量回放到钱包数据上
+
+        Args:
+            wallet_data: 备份文件中的钱包数据
+
+        Returns:
+            回放后的钱包数据
+        """
+        wallet_data = WalletPairTable.from_mapping(wallet_data)
+        changes_file = os.path.join(self.data_dir, WALLET_CHANGES_FILE)
+        if not os.path.exists(changes_file):
+            return wallet_data
+
+        # 先按顺序汇总所有变更，再一次合并到表中
+        all_changes = {}
+        replayed = 0
+        with open(changes_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程中断时最后一行可能不完整，忽略即可
+                    logger.warning("变更日志存在不完整的记录，已跳过")
+                    continue
+
+                for wallet, pairs in entry.get("changes", {}).items():
+                    all_changes.setdefault(wallet, []).extend(pairs)
+                replayed += 1
+
+        wallet_data = wallet_data.merge(all_changes)
+
+        logger.info(f"回放变更日志: {replayed} 条记录，当前 {len(wallet_data)} 个钱包")
+        return wallet_data
+
+    def merge_wallet_data(self, existing_data: Mapping, new_data: Mapping) -> WalletPairTable:
         """
         合并现有数据和新数据
 
@@ -629,32 +2933,23 @@ class MeteoraDataFetcher:
             new_data: 新获取的钱包数据
 
         Returns:
-            合并后的钱包数据
+            合并后的钱包数据：已有钱包在前、新钱包在后，每个钱包先保留已有交易对再追加新交易对
         """
         logger.info("开始合并钱包数据...")
 
-        # 使用set来避免重复
-        merged_data = defaultdict(set)
-
-        # 添加现有数据
-        for wallet, pairs in existing_data.items():
-            merged_data[wallet].update(pairs)
-
-        # 添加新数据
-        for wallet, pairs in new_data.items():
-            merged_data[wallet].update(pairs)
-
-        # 转换回列表格式
-        result = {wallet: list(pairs) for wallet, pairs in merged_data.items()}
+        # 在整数编码的表上用 (钱包ID, 交易对ID) 键去重
+        existing_data = WalletPairTable.from_mapping(existing_data)
+        new_data = WalletPairTable.from_mapping(new_data)
+        result = existing_data.merge(new_data)
 
         # 统计信息
         existing_wallets = len(existing_data)
         new_wallets = len(new_data)
         merged_wallets = len(result)
 
-        existing_pairs = sum(len(pairs) for pairs in existing_data.values())
-        new_pairs = sum(len(pairs) for pairs in new_data.values())
-        merged_pairs = sum(len(pairs) for pairs in result.values())
+        existing_pairs = existing_data.total_pairs
+        new_pairs = new_data.total_pairs
+        merged_pairs = result.total_pairs
 
         logger.info(f"数据合并完成:")
         logger.info(f"  现有钱包: {existing_wallets} -> 新钱包: {new_wallets} -> 合并后: {merged_wallets}")
@@ -664,22 +2959,295 @@ class MeteoraDataFetcher:
 
         return result
 
+    def _load_metadata(self) -> dict:
+        """读取 metadata.json（当前输出目录），不存在或损坏时返回空字典"""
+        metadata_file = os.path.join(self.output_dir, "metadata.json")
+        if not os.path.exists(metadata_file):
+            return {}
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取元数据失败: {str(e)}")
+            return {}
+
+    def refresh_shard_earnings(self, earnings_aggregator, active_data: Dict[str, List[str]]):
+        """
+        刷新预计算的手续费收入并写入分片文件，失败只记录警告，不影响已完成的数据存储
+
+        只重写本次刷新过收入的钱包（活跃钱包以及缓存过期后重新查询的钱包）所在的分片；
+        其余分片的收入在重写分片时已经保留
+
+        Args:
+            earnings_aggregator: MeteoraEarningsAggregator，data_dir 需与本获取器一致
+            active_data: 本次获取到的钱包 -> 交易对，视为近期活跃，总是重新查询
+        """
+        earnings_aggregator.output_dir = self._staging_dir
+        try:
+            with self.metrics.stage("refresh_earnings", active_wallets=len(active_data)) as stage:
+                changed_wallets = list(active_data)
+                if earnings_aggregator.cache is not None:
+                    stage.update(earnings_aggregator.refresh_earnings(active_data=active_data))
+                    changed_wallets = list(dict.fromkeys(changed_wallets + earnings_aggregator.last_refreshed_wallets))
+                annotate_stats = earnings_aggregator.annotate_shards(changed_wallets)
+                stage["annotated_shards"] = annotate_stats["shards"]
+                stage["annotated_pairs"] = annotate_stats["pairs"]
+        except Exception as e:
+            logger.warning(f"刷新手续费收入失败: {str(e)}")
+        finally:
+            earnings_aggregator.output_dir = None
+
+    def _has_wallet_state(self) -> bool:
+        """是否已有累积的钱包数据（SQLite存储、列式快照或JSON备份）"""
+        if self.wallet_store is not None:
+            return len(self.wallet_store) > 0
+        return any(os.path.exists(os.path.join(self.data_dir, name))
+                   for name in (WALLET_SNAPSHOT_FILE, "full_wallet_data_backup.json"))
+
+    def _has_grouped_storage(self) -> bool:
+        """检查数据目录中是否已有可增量更新的哈希分片存储（旧的前缀分组需要先全量重建）"""
+        return bool(self._load_metadata().get("sharding", {}).get("shard_count"))
+
+    def apply_incremental_update(self, new_wallet_data: Mapping) -> Dict[str, int]:
+        """
+        增量更新分组存储
+        只读取和重写受影响的 wallets_*.json 分组文件，并把新增的钱包/交易对追加到变更日志，
+        耗时与新数据量成正比，而不是与历史数据总量成正比
+
+        Args:
+            new_wallet_data: 本次获取的钱包数据
+
+        Returns:
+            更新统计：新增钱包数、新增交易对数、重写文件数以及更新后的总量
+        """
+        logger.info("开始增量更新分组存储...")
+
+        # 沿用现有的分片数，钱包所在分片只由地址决定
+        metadata = self._load_metadata()
+        shard_count = metadata["sharding"]["shard_count"]
+        shard_format = metadata["sharding"].get("shard_format", "json")
+        max_wallets_per_file = metadata.get("max_wallets_per_file")
+        oversized = False
+
+        affected_groups = defaultdict(dict)
+        wallets = list(new_wallet_data.keys())
+        for (wallet, pairs), shard_id in zip(new_wallet_data.items(), wallet_shard_ids(wallets, shard_count).tolist()):
+            affected_groups[shard_id][wallet] = pairs
+
+        changes = {}
+        new_wallets = []
+        new_pairs_count = 0
+        files_rewritten = 0
+
+        for shard_id, group_updates in sorted(affected_groups.items()):
+            filename = shard_filename(shard_id, shard_count)
+            group_key = filename[len("wallets_"):-len(".json")]
+            filepath = os.path.join(self.output_dir, filename)
+
+            file_data = {}
+            if os.path.exists(filepath):
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    file_data = json.load(f)
+            group_wallets = decode_shard_wallets(file_data)
+
+            group_changed = False
+            for wallet, pairs in group_updates.items():
+                existing_pairs = group_wallets.get(wallet)
+                if existing_pairs is None:
+                    existing_pairs = group_wallets[wallet] = []
+                    new_wallets.append(wallet)
+
+                known = set(existing_pairs)
+                added = [pair for pair in dict.fromkeys(pairs) if pair not in known]
+                if added:
+                    existing_pairs.extend(added)
+                    changes[wallet] = added
+                    new_pairs_count += len(added)
+                    group_changed = True
+
+            if not group_changed:
+                continue
+
+            optimized_data = build_shard_data(group_key, group_wallets, shard_format)
+
+            # 保留预计算的手续费收入：新交易对追加在末尾，已有值保持对齐，新交易对记为 null 待补查
+            earnings = file_data.get("earnings")
+            if earnings:
+                for wallet, values in earnings.items():
+                    values.extend([None] * (len(group_wallets.get(wallet, ())) - len(values)))
+                optimized_data["earnings"] = earnings
+                optimized_data["group_info"]["earnings_updated"] = file_data["group_info"].get("earnings_updated")
+
+            write_json_atomic(filepath, optimized_data)
+            if max_wallets_per_file and len(group_wallets) > max_wallets_per_file:
+                oversized = True
+
+            files_rewritten += 1
+            logger.info(f"更新文件 '{filename}': {len(group_updates)} 个钱包受影响")
+
+        if changes:
+            self.append_wallet_changes(changes)
+
+        if new_wallets:
+            prefix_directory = self._add_wallets_to_index(new_wallets, shard_count)
+            if prefix_directory is not None:
+                metadata["prefix_index"] = prefix_index_summary(prefix_directory)
+
+        if changes and metadata.get("pool_index"):
+            pool_index = self.update_pool_index(changes, metadata["pool_index"], max_wallets_per_file)
+            if pool_index is None:
+                oversized = True
+            else:
+                metadata["pool_index"] = pool_index
+
+        if oversized:
+            # 有分片超过单文件上限：用更新后的全部分片重新选择分片数并全量重写
+            logger.warning(f"分片超过 {max_wallets_per_file} 个的单文件上限，全量重新分片")
+            files_rewritten = self.reshard(metadata)
+            metadata = self._load_metadata()
+        else:
+            # 更新元数据中的统计信息
+            import glob
+            metadata["total_wallets"] = metadata.get("total_wallets", 0) + len(new_wallets)
+            metadata["total_pairs"] = metadata.get("total_pairs", 0) + new_pairs_count
+            metadata["total_files"] = len(glob.glob(os.path.join(self.output_dir, "wallets_*.json")))
+            metadata["last_updated"] = pd.Timestamp.now().isoformat()
+            write_json_atomic(os.path.join(self.output_dir, "metadata.json"), metadata)
+
+        stats = {
+            "new_wallets": len(new_wallets),
+            "new_pairs": new_pairs_count,
+            "files_rewritten": files_rewritten,
+            "resharded": oversized,
+            "total_wallets": metadata["total_wallets"],
+            "total_pairs": metadata["total_pairs"]
+        }
+
+        logger.info(f"增量更新完成:")
+        logger.info(f"  新增钱包: {stats['new_wallets']}")
+        logger.info(f"  新增交易对: {stats['new_pairs']}")
+        logger.info(f"  重写文件: {stats['files_rewritten']} / {metadata['total_files']}")
+
+        return stats
+
+    def reshard(self, metadata: dict) -> int:
+        """
+        读取当前输出目录中的全部钱包分片，按元数据中的限制重新选择分片数并全量重写
+        （增量更新使分片超过单文件上限时调用，预计算的手续费收入由 create_wallet_index 保留）
+
+        Args:
+            metadata: 现有的元数据
+
+        Returns:
+            int: 重写后的分片文件数
+        """
+        import glob
+        wallet_data = {}
+        for filepath in sorted(glob.glob(os.path.join(self.output_dir, "wallets_*.json"))):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                wallet_data.update(decode_shard_wallets(json.load(f)))
+
+        self.save_optimized_data(wallet_data,
+                                 max_files=metadata.get("max_files_limit", 16),
+                                 max_wallets_per_file=metadata.get("max_wallets_per_file", 10000),
+                                 write_wallet_index=os.path.exists(os.path.join(self.output_dir, "wallet_index.json")),
+                                 shard_format=metadata.get("sharding", {}).get("shard_format", "json"))
+        return self._load_metadata()["total_files"]
+
+    def append_wallet_changes(self, changes: Dict[str, List[str]]):
+        """
+        把本次新增的钱包-交易对追加到变更日志（JSON Lines，写入后 fsync）
+
+        Args:
+            changes: 钱包 -> 新增的交易对列表
+        """
+        entry = {
+            "timestamp": pd.Timestamp.now().isoformat(),
+            "query_ids": self.query_ids,
+            "new_pairs": sum(len(pairs) for pairs in changes.values()),
+            "changes": changes
+        }
+
+        changes_file = os.path.join(self.data_dir, WALLET_CHANGES_FILE)
+        with open(changes_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+        logger.info(f"变更日志已追加: {len(changes)} 个钱包, {entry['new_pairs']} 个交易对")
+
+    def _add_wallets_to_index(self, new_wallets: List[str], shard_count: int) -> Optional[dict]:
+        """
+        把新增钱包加入 wallet_index.json 和前缀索引
+
+        Returns:
+            dict: 更新后的前缀索引目录，尚未生成前缀索引时返回 None
+        """
+        index_file = os.path.join(self.output_dir, "wallet_index.json")
+        if os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as f:
+                wallet_index = json.load(f)
+
+            for wallet, shard_id in zip(new_wallets, wallet_shard_ids(new_wallets, shard_count).tolist()):
+                wallet_index[wallet] = shard_filename(shard_id, shard_count)
+
+            write_json_atomic(index_file, wallet_index)
+
+        return add_wallets_to_prefix_index(self.output_dir, new_wallets)
+
+    def compact_wallet_changes(self, wallet_data: Mapping = None):
+        """
+        压缩变更日志：把备份与变更日志合并写回 full_wallet_data_backup.json 和列式快照，然后清空日志
+
+        Args:
+            wallet_data: 已合并好的完整钱包数据，不提供则从备份和变更日志加载
+        """
+        if wallet_data is None:
+            wallet_data = self.load_existing_wallet_data()
+
+        # 逐个钱包写入备份（格式与 json.dump(indent=2) 相同），不需要先转换为完整的字典；
+        # 先写临时文件并 fsync 再替换，中途退出时旧备份保持完整
+        backup_file = os.path.join(self.data_dir, "full_wallet_data_backup.json")
+        tmp_file = backup_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write('{')
+            for i, (wallet, pairs) in enumerate(wallet_data.items()):
+                f.write((',\n' if i else '\n') + json.dumps({wallet: pairs}, indent=2, ensure_ascii=False)[2:-2])
+            f.write('\n}' if wallet_data else '}')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, backup_file)
+        _fsync_path(self.data_dir)
+
+        # 列式快照，后续运行优先从这里加载
+        self.save_wallet_snapshot(wallet_data)
+
+        changes_file = os.path.join(self.data_dir, WALLET_CHANGES_FILE)
+        if os.path.exists(changes_file):
+            os.remove(changes_file)
+
+        logger.info(f"变更日志已压缩到备份文件: {len(wallet_data)} 个钱包")
+
     def create_simple_lookup_api_data(self, wallet_data: Dict[str, List[str]]):
         """
         创建简单的查找API数据结构
         将所有数据存储在一个经过优化的JSON文件中
-        """
-        # 创建压缩的数据结构
-        compressed_data = {}
-
-        for wallet, pairs in wallet_data.items():
-            # 只存储必要信息
-            compressed_data[wallet] = pairs
 
-        # 保存压缩数据
-        api_data_file = os.path.join(self.data_dir, "wallet_pairs_api.json")
-        with open(api_data_file, 'w', encoding='utf-8') as f:
-            json.dump(compressed_data, f, separators=(',', ':'), ensure_ascii=False)
+        Args:
+            wallet_data: 钱包数据，也可以是 (钱包, 交易对列表) 的可迭代对象（逐个写入文件）
+        """
+        items = wallet_data.items() if isinstance(wallet_data, Mapping) else wallet_data
+
+        # 保存压缩数据，只存储必要信息
+        api_data_file = os.path.join(self.output_dir, "wallet_pairs_api.json")
+        with open(api_data_file + ".tmp", 'w', encoding='utf-8') as f:
+            f.write('{')
+            for i, (wallet, pairs) in enumerate(items):
+                f.write((',' if i else '') + json.dumps(wallet, ensure_ascii=False) + ':' +
+                        json.dumps(pairs, separators=(',', ':'), ensure_ascii=False))
+            f.write('}')
+        os.replace(api_data_file + ".tmp", api_data_file)
+        remove_compressed_siblings(api_data_file)
 
         logger.info(f"API数据文件已创建: {api_data_file}")
 
@@ -691,7 +3259,11 @@ class MeteoraDataFetcher:
             logger.warning("数据文件较大，建议使用分组存储方案")
 
     def run_data_fetch(self, use_grouped_storage: bool = True, preserve_batches: bool = True,
-                      batch_delay: float = 1.0, accumulate_data: bool = True):
+                      batch_delay: float = 1.0, accumulate_data: bool = True,
+                      max_workers: int = 1, rate_limit: float = None,
+                      streaming: bool = False, page_size: int = 50000, incremental: bool = False,
+                      shard_format: str = "json", use_result_cache: bool = True, keep_batches: int = None,
+                      profile: bool = False, earnings_aggregator=None, rolling_merge: bool = False):
         """
         运行完整的数据获取和存储流程
 
@@ -700,42 +3272,137 @@ class MeteoraDataFetcher:
             preserve_batches: 是否保留历史批次数据（避免覆盖）
             batch_delay: 批次之间的延迟时间（秒）
             accumulate_data: 是否累积合并历史数据（解决覆盖问题）
+            max_workers: 并发获取批次的最大线程数
+            rate_limit: 每秒允许的最大Dune请求数（不提供则由 batch_delay 换算）
+            streaming: 是否使用流式分页获取（内存占用与结果总行数无关）
+            page_size: 流式获取时每页的行数
+            incremental: 累积模式下只增量更新受影响的分组文件（需已有分组存储）；
+                SQLite存储后端下只重新导出有新增交易对的分片
+            shard_format: 分片格式，"json" 或 "compact"（池子字典编码，文件更小）
+            use_result_cache: 累积模式下跳过结果未变化的查询（不下载、不保存、不合并）
+            keep_batches: 每个查询保留的批次目录数，不提供则保留全部
+            profile: 是否用cProfile记录整个运行过程，输出到 data_dir/run_profile.prof
+            earnings_aggregator: 可选的 meteora_earnings.MeteoraEarningsAggregator，存储完成后刷新
+                手续费收入缓存（本次获取到的交易对视为近期活跃）并写入分片文件
+            rolling_merge: 逐个批次滚动合并去重，不同时持有全部批次（非流式模式）
         """
-        try:
-            # 1. 获取Dune数据
-            df = self.get_dune_data(delay_seconds=batch_delay, preserve_batches=preserve_batches)
+        # 每次运行重新统计各阶段指标，结束时写入 data_dir/run_metrics.json
+        self.metrics = RunMetrics()
+        profiler = cProfile.Profile() if profile else None
+        if profiler:
+            profiler.enable()
 
-            # 2. 处理新获取的钱包数据
-            new_wallet_data = self.process_wallet_data(df)
+        try:
+            # 未变化的结果已在累积数据中，只有累积模式且已有数据时才能安全跳过
+            use_cache = use_result_cache and accumulate_data and self._has_wallet_state()
+
+            if streaming:
+                # 1-2. 流式获取Dune数据，边写入批次文件边聚合钱包数据
+                with self.metrics.stage("stream_dune_data", queries=len(self.query_ids)) as stage:
+                    new_wallet_data = self.stream_dune_data(delay_seconds=batch_delay,
+                                                            preserve_batches=preserve_batches,
+                                                            page_size=page_size, rate_limit=rate_limit,
+                                                            use_cache=use_cache)
+                    stage["wallets"] = len(new_wallet_data)
+            else:
+                # 1. 获取Dune数据
+                df = self.get_dune_data(delay_seconds=batch_delay, preserve_batches=preserve_batches,
+                                        max_workers=max_workers, rate_limit=rate_limit, use_cache=use_cache,
+                                        rolling_merge=rolling_merge)
+
+                # 2. 处理新获取的钱包数据
+                with self.metrics.stage("process_wallet_data", rows=len(df)) as stage:
+                    new_wallet_data = self.build_wallet_table(df)
+                    stage["wallets"] = len(new_wallet_data)
+
+            if not new_wallet_data and self.unchanged_queries:
+                logger.info("✅ 所有查询结果均未变化，跳过处理和存储")
+                self.commit_result_cache()
+                if keep_batches is not None:
+                    self.prune_batches(keep_batches)
+                self.metrics.status = "unchanged"
+                return
 
             if not new_wallet_data:
                 raise Exception("未找到有效的钱包数据")
 
-            # 3. 如果启用累积模式，合并历史数据
-            if accumulate_data:
-                logger.info("🔄 启用数据累积模式，合并历史数据...")
-                existing_data = self.load_existing_wallet_data()
-                wallet_data = self.merge_wallet_data(existing_data, new_wallet_data)
-            else:
-                logger.info("⚠️  数据累积已关闭，只使用当前批次数据")
-                wallet_data = new_wallet_data
+            # 3-4. 输出文件写入新的版本目录，全部完成后原子切换 current.json；
+            # 增量更新先用硬链接继承当前版本，只替换受影响的文件
+            incremental_update = accumulate_data and incremental and use_grouped_storage and self._has_grouped_storage()
+            with self.publishing(inherit=incremental_update):
+                if self.wallet_store is not None:
+                    # 3-4. SQLite存储：upsert合并新数据，再从库中导出静态文件，不加载历史数据
+                    if not accumulate_data:
+                        logger.info("⚠️  数据累积已关闭，只使用当前批次数据")
+                        self.wallet_store.clear()
+                    with self.metrics.stage("upsert_wallet_store", wallets=len(new_wallet_data)) as stage:
+                        stats = self.wallet_store.upsert(new_wallet_data)
+                        changed_wallets = stats.pop("changed_wallets")
+                        changed_pools = stats.pop("changed_pools")
+                        stage.update(stats)
+                    total_wallets = stats["total_wallets"]
+                    total_pairs = stats["total_pairs"]
+
+                    if use_grouped_storage:
+                        with self.metrics.stage("export_wallet_store") as stage:
+                            stage.update(self.export_wallet_store(
+                                shard_format=shard_format,
+                                changed_wallets=changed_wallets if incremental_update else None,
+                                changed_pools=changed_pools if incremental_update else None))
+                    else:
+                        with self.metrics.stage("create_simple_lookup_api_data", wallets=total_wallets):
+                            self.create_simple_lookup_api_data(self.wallet_store.iter_wallets())
+                elif incremental_update:
+                    # 3-4. 增量模式：只重写受影响的分组文件，增量追加到变更日志
+                    logger.info("⚡ 启用增量更新模式，只更新受影响的分组文件...")
+                    with self.metrics.stage("apply_incremental_update", wallets=len(new_wallet_data)) as stage:
+                        stats = self.apply_incremental_update(new_wallet_data)
+                        stage.update(stats)
+                    total_wallets = stats["total_wallets"]
+                    total_pairs = stats["total_pairs"]
+                else:
+                    # 3. 如果启用累积模式，合并历史数据
+                    if accumulate_data:
+                        logger.info("🔄 启用数据累积模式，合并历史数据...")
+                        with self.metrics.stage("load_existing_wallet_data") as stage:
+                            existing_data = self.load_existing_wallet_data()
+                            stage["wallets"] = len(existing_data)
+                        with self.metrics.stage("merge_wallet_data", existing_wallets=len(existing_data),
+                                                new_wallets=len(new_wallet_data)) as stage:
+                            wallet_data = self.merge_wallet_data(existing_data, new_wallet_data)
+                            stage["wallets"] = len(wallet_data)
+                    else:
+                        logger.info("⚠️  数据累积已关闭，只使用当前批次数据")
+                        wallet_data = WalletPairTable.from_mapping(new_wallet_data)
 
-            # 4. 根据选择保存数据
-            if use_grouped_storage:
-                self.save_optimized_data(wallet_data)
-            else:
-                self.create_simple_lookup_api_data(wallet_data)
+                    # 4. 根据选择保存数据
+                    if use_grouped_storage:
+                        with self.metrics.stage("save_optimized_data", wallets=len(wallet_data)):
+                            self.save_optimized_data(wallet_data, shard_format=shard_format)
+                    else:
+                        with self.metrics.stage("create_simple_lookup_api_data", wallets=len(wallet_data)):
+                            self.create_simple_lookup_api_data(wallet_data)
+
+                    # 4. 保存原始完整数据（备份），变更日志已并入备份
+                    with self.metrics.stage("compact_wallet_changes", wallets=len(wallet_data)):
+                        self.compact_wallet_changes(wallet_data)
+
+                    total_wallets = len(wallet_data)
+                    total_pairs = wallet_data.total_pairs
 
-            # 4. 保存原始完整数据（备份）
-            backup_file = os.path.join(self.data_dir, "full_wallet_data_backup.json")
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(wallet_data, f, indent=2, ensure_ascii=False)
+                # 手续费收入写入同一个版本目录，与分片一起发布
+                if earnings_aggregator is not None and use_grouped_storage:
+                    self.refresh_shard_earnings(earnings_aggregator, new_wallet_data)
 
+            # 数据已发布，提交结果缓存并清理旧批次
+            self.commit_result_cache()
+            if keep_batches is not None:
+                self.prune_batches(keep_batches)
+
+            self.metrics.status = "success"
             logger.info("数据获取和存储完成！")
 
             # 显示统计信息
-            total_wallets = len(wallet_data)
-            total_pairs = sum(len(pairs) for pairs in wallet_data.values())
             avg_pairs_per_wallet = total_pairs / total_wallets
 
             print(f"\n=== 数据统计 ===")
@@ -743,13 +3410,26 @@ class MeteoraDataFetcher:
             print(f"总交易对数: {total_pairs:,}")
             print(f"平均每钱包交易对数: {avg_pairs_per_wallet:.2f}")
             print(f"数据存储目录: {self.data_dir}")
+            print(f"发布版本目录: {self.output_dir}")
             print(f"区块链: Solana")
             print(f"项目: Meteora DLMM")
 
         except Exception as e:
+            self.metrics.status = "failed"
             logger.error(f"数据获取失败: {str(e)}")
             raise
 
+        finally:
+            if profiler:
+                profiler.disable()
+                profile_file = os.path.join(self.data_dir, RUN_PROFILE_FILE)
+                profiler.dump_stats(profile_file)
+                logger.info(f"cProfile结果已保存: {profile_file}（可用 python -m pstats 查看）")
+
+            metrics_file = os.path.join(self.data_dir, RUN_METRICS_FILE)
+            report = self.metrics.save(metrics_file)
+            logger.info(f"📈 运行指标已保存: {metrics_file}（总耗时 {report['total_wall_seconds']:.2f} 秒）")
+
 
 def main():
     """主函数"""
@@ -759,6 +3439,8 @@ def main():
     # 默认配置 - 可以直接在这里修改
     DEFAULT_QUERY_IDS = [5556654]  # 在这里添加你的查询ID列表
     DEFAULT_BATCH_DELAY = 1.0  # 批次间延迟时间（秒）
+    DEFAULT_FETCH_CONCURRENCY = 1  # 并发获取批次的线程数
+    DEFAULT_BATCH_RETENTION = 5  # 每个查询保留的批次目录数
 
     # 可以通过环境变量覆盖默认配置
     query_ids_env = os.getenv('DUNE_QUERY_IDS')
@@ -787,14 +3469,87 @@ def main():
         batch_delay = DEFAULT_BATCH_DELAY
         print(f"✅ 使用默认批次延迟: {batch_delay} 秒")
 
+    # 额外导出格式配置（列式快照总是生成）
+    export_formats_env = os.getenv('EXPORT_FORMATS', '')
+    export_formats = [fmt.strip().lower() for fmt in export_formats_env.split(',') if fmt.strip()]
+    if export_formats:
+        print(f"✅ 从环境变量读取导出格式: {export_formats}")
+
+    # 并发数配置
+    concurrency_env = os.getenv('FETCH_CONCURRENCY')
+    if concurrency_env:
+        try:
+            fetch_concurrency = max(1, int(concurrency_env))
+            print(f"✅ 从环境变量读取并发数: {fetch_concurrency}")
+        except ValueError:
+            print(f"⚠️  环境变量FETCH_CONCURRENCY格式错误，使用默认值: {DEFAULT_FETCH_CONCURRENCY}")
+            fetch_concurrency = DEFAULT_FETCH_CONCURRENCY
+    else:
+        fetch_concurrency = DEFAULT_FETCH_CONCURRENCY
+
+    # 批次保留配置
+    retention_env = os.getenv('BATCH_RETENTION')
+    if retention_env:
+        try:
+            batch_retention = max(1, int(retention_env))
+            print(f"✅ 从环境变量读取批次保留数: {batch_retention}")
+        except ValueError:
+            print(f"⚠️  环境变量BATCH_RETENTION格式错误，使用默认值: {DEFAULT_BATCH_RETENTION}")
+            batch_retention = DEFAULT_BATCH_RETENTION
+    else:
+        batch_retention = DEFAULT_BATCH_RETENTION
+
+    # 性能分析开关：PROFILE_RUN=1 时输出cProfile结果
+    profile_run = os.getenv('PROFILE_RUN', '').strip().lower() in ('1', 'true', 'yes')
+    if profile_run:
+        print("✅ 已启用cProfile性能分析")
+
+    # 存储后端配置：STORAGE_BACKEND=sqlite 时累积数据保存在SQLite中
+    storage_backend = os.getenv('STORAGE_BACKEND', 'json').strip().lower() or 'json'
+    if storage_backend not in STORAGE_BACKENDS:
+        print(f"⚠️  环境变量STORAGE_BACKEND格式错误，使用默认值: json")
+        storage_backend = 'json'
+
+    # 预压缩配置：OUTPUT_COMPRESSION=gzip,brotli（默认），none 表示不生成压缩副本
+    compression_env = os.getenv('OUTPUT_COMPRESSION', ','.join(DEFAULT_COMPRESSION)).strip().lower()
+    compression = [] if compression_env == 'none' else [enc.strip() for enc in compression_env.split(',') if enc.strip()]
+    try:
+        compression = available_encodings(compression)
+    except ValueError:
+        print(f"⚠️  环境变量OUTPUT_COMPRESSION格式错误，使用默认值: {list(DEFAULT_COMPRESSION)}")
+        compression = available_encodings()
+
+    # 分片写入进程数：WRITE_WORKERS>1 时在进程池中并行编码和写入分片文件
+    try:
+        write_workers = max(1, int(os.getenv('WRITE_WORKERS', '1')))
+    except ValueError:
+        print(f"⚠️  环境变量WRITE_WORKERS格式错误，使用默认值: 1")
+        write_workers = 1
+
+    # 摄入时额外保留的列：EXTRA_COLUMNS=block_time,amount，"*" 表示保留全部列（默认只保留必要列）
+    extra_columns = [col.strip() for col in os.getenv('EXTRA_COLUMNS', '').split(',') if col.strip()]
+
+    # 滚动合并开关：ROLLING_MERGE=1 时逐个批次合并去重，降低峰值内存
+    rolling_merge = os.getenv('ROLLING_MERGE', '').strip().lower() in ('1', 'true', 'yes')
+    if rolling_merge:
+        print("✅ 已启用滚动合并")
+
     try:
         # 创建数据获取器
-        fetcher = MeteoraDataFetcher(query_ids)
+        fetcher = MeteoraDataFetcher(query_ids, export_formats=export_formats, storage_backend=storage_backend,
+                                     compression=compression, write_workers=write_workers,
+                                     extra_columns=extra_columns)
 
         print(f"\n📋 配置摘要:")
         print(f"   查询ID列表: {query_ids}")
         print(f"   批次数量: {len(query_ids)}")
         print(f"   批次延迟: {batch_delay} 秒")
+        print(f"   并发数: {fetch_concurrency}")
+        print(f"   批次保留数: {batch_retention}")
+        print(f"   存储后端: {storage_backend}")
+        print(f"   预压缩: {', '.join(compression) or '关闭'}")
+        print(f"   分片写入进程数: {write_workers}")
+        print(f"   额外保留的列: {', '.join(extra_columns) or '无'}")
 
         print("\n" + "=" * 60)
         print("开始数据获取流程...")
@@ -802,15 +3557,21 @@ def main():
 
         # 运行数据获取，使用分组存储
         fetcher.run_data_fetch(
-            use_grouped_storage=True
+            use_grouped_storage=True,
+            batch_delay=batch_delay,
+            max_workers=fetch_concurrency,
+            keep_batches=batch_retention,
+            profile=profile_run,
+            rolling_merge=rolling_merge
         )
 
         print("\n🎉 所有操作完成！")
         print("\n📁 生成的文件:")
         print(f"   - 批次数据: {fetcher.batch_data_dir}/")
-        print(f"   - 合并数据: {fetcher.data_dir}/merged_dune_data.*")
+        print(f"   - 合并数据: {fetcher.data_dir}/merged_dune_data.npz")
         print(f"   - 钱包数据: {fetcher.data_dir}/wallet_group_*.json")
         print(f"   - 摘要信息: {fetcher.data_dir}/merge_summary.json")
+        print(f"   - 运行指标: {fetcher.data_dir}/{RUN_METRICS_FILE}")
 
         print("\n✅ 现在可以使用前端页面进行Solana钱包盈利查询了。")
         print("⚠️  注意：请使用Solana钱包地址进行查询")
@@ -0,0 +1,610 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from meteora_data_fetcher import (GenerationPublisher, MeteoraDataFetcher, decode_shard_wallets, load_columnar_snapshot,
+                                  published_dir, shard_filename, wallet_shard_ids, write_json_atomic)
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Meteora DLMM API（与 fees_checker.html 中的 meteora_base_url 一致）
+METEORA_API_BASE_URL = "https://dlmm-api.meteora.ag"
+
+# 手续费收入缓存文件名（位于数据目录中）
+EARNINGS_CACHE_FILE = "earnings_cache.sqlite"
+
+# 每条SQL语句中的最大键数量，避免超过SQLite的参数个数限制
+SQL_CHUNK_SIZE = 400
+
+# 可以重试的HTTP状态码：限流和服务端错误
+RETRYABLE_STATUS = frozenset([429, 500, 502, 503, 504])
+
+
+class AdaptiveConcurrencyController:
+    """
+    AIMD 并发窗口
+    请求成功且延迟正常时窗口加性增长（每个窗口的请求约 +1），遇到 429/5xx 或延迟明显升高时
+    窗口乘性减半；同一个往返时间内只减半一次，避免一批并发失败把窗口压到最小
+    """
+
+    def __init__(self, initial_window: int = 4, min_window: int = 1, max_window: int = 32,
+                 decrease_factor: float = 0.5, latency_factor: float = 4.0, latency_floor: float = 0.1):
+        """
+        Args:
+            initial_window: 初始并发数
+            min_window: 最小并发数
+            max_window: 最大并发数
+            decrease_factor: 拥塞时窗口的缩小倍数
+            latency_factor: 延迟超过观测到的最小延迟的多少倍时视为拥塞
+            latency_floor: 延迟低于该值（秒）时不视为拥塞，避免毫秒级抖动误触发
+        """
+        self.min_window = max(1, min_window)
+        self.max_window = max(self.min_window, max_window)
+        self.window = float(min(max(initial_window, self.min_window), self.max_window))
+        self.decrease_factor = decrease_factor
+        self.latency_factor = latency_factor
+        self.latency_floor = latency_floor
+        self.in_flight = 0
+        self.min_latency = None
+        self.throttled = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """等待并发窗口中有空位"""
+        with self._cond:
+            while self.in_flight >= int(self.window):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, congested: bool = False):
+        """
+        请求结束后调整窗口
+
+        Args:
+            latency: 本次请求耗时（秒）
+            congested: 是否收到 429/5xx 等拥塞信号
+        """
+        with self._cond:
+            self.in_flight -= 1
+            if congested:
+                self.throttled += 1
+            else:
+                self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+
+            slow = (not congested and self.min_latency is not None
+                    and latency > max(self.min_latency * self.latency_factor, self.latency_floor))
+            if congested or slow:
+                now = time.monotonic()
+                if now - self._last_decrease > max(latency, self.min_latency or 0):
+                    self.window = max(self.min_window, self.window * self.decrease_factor)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self.window = min(self.max_window, self.window + 1.0 / self.window)
+            self._cond.notify_all()
+
+
+def backoff_delay(attempt: int, base: float = 0.2, cap: float = 10.0, retry_after: float = None) -> float:
+    """
+    带抖动的指数退避（full jitter）：在 [0, min(cap, base * 2^attempt)] 中随机取值，
+    服务端给出 Retry-After 时至少等待该时间
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+class EarningsCache:
+    """
+    手续费收入的本地持久缓存（SQLite）
+    以 (钱包, 交易对) 为键保存 total_fee_usd_claimed 和获取时间，超过TTL的记录视为过期，
+    记录数超过上限时按最近访问时间淘汰
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 6 * 3600, max_entries: int = 1000000, clock=time.time):
+        """
+        Args:
+            path: SQLite文件路径
+            ttl_seconds: 缓存有效期（秒）
+            max_entries: 最多保留的记录数
+            clock: 返回当前时间戳的函数（测试时可替换）
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS earnings ("
+            " wallet TEXT NOT NULL,"
+            " lb_pair TEXT NOT NULL,"
+            " total_fee_usd_claimed REAL NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (wallet, lb_pair)"
+            ") WITHOUT ROWID")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_earnings_accessed ON earnings (accessed_at)")
+        self.conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM earnings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _select(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """读取键对应的 (收入, 获取时间)，不存在的键不出现在结果中"""
+        found = {}
+        for start in range(0, len(keys), SQL_CHUNK_SIZE):
+            chunk = keys[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join(['(?,?)'] * len(chunk))
+            params = [value for key in chunk for value in key]
+            rows = self.conn.execute(
+                f"SELECT wallet, lb_pair, total_fee_usd_claimed, fetched_at FROM earnings "
+                f"WHERE (wallet, lb_pair) IN (VALUES {placeholders})", params)
+            for wallet, lb_pair, value, fetched_at in rows:
+                found[(wallet, lb_pair)] = (value, fetched_at)
+        return found
+
+    def get_many(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], float]:
+        """
+        读取未过期的缓存记录，并更新这些记录的访问时间
+
+        Returns:
+            Dict[Tuple[str, str], float]: (钱包, 交易对) -> 收入，只包含命中且未过期的键
+        """
+        now = self.clock()
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            fresh = {key: value for key, (value, fetched_at) in self._select(keys).items()
+                     if now - fetched_at < self.ttl_seconds}
+            self.conn.executemany("UPDATE earnings SET accessed_at = ? WHERE wallet = ? AND lb_pair = ?",
+                                  [(now, wallet, lb_pair) for wallet, lb_pair in fresh])
+            self.conn.commit()
+        return fresh
+
+    def put_many(self, records: Iterable[Tuple[str, str, float]]):
+        """写入或覆盖 (钱包, 交易对, 收入) 记录，超过容量时淘汰最久未访问的记录"""
+        now = self.clock()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO earnings (wallet, lb_pair, total_fee_usd_claimed, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (wallet, lb_pair) DO UPDATE SET "
+                "total_fee_usd_claimed = excluded.total_fee_usd_claimed, "
+                "fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at",
+                [(wallet, lb_pair, value, now, now) for wallet, lb_pair, value in records])
+            self.conn.commit()
+        self.evict()
+
+    def stale_keys(self, keys: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """返回不在缓存中或已过期的键：未缓存的在前，其余按获取时间从旧到新"""
+        now = self.clock()
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            found = self._select(keys)
+
+        missing = [key for key in keys if key not in found]
+        expired = sorted((key for key in keys if key in found and now - found[key][1] >= self.ttl_seconds),
+                         key=lambda key: found[key][1])
+        return missing + expired
+
+    def evict(self) -> int:
+        """记录数超过 max_entries 时删除最久未访问的记录，返回删除条数"""
+        with self._lock:
+            excess = self.conn.execute("SELECT COUNT(*) FROM earnings").fetchone()[0] - self.max_entries
+            if excess <= 0:
+                return 0
+            self.conn.execute(
+                "DELETE FROM earnings WHERE (wallet, lb_pair) IN ("
+                " SELECT wallet, lb_pair FROM earnings ORDER BY accessed_at LIMIT ?)", (excess,))
+            self.conn.commit()
+
+        logger.info(f"🧹 手续费收入缓存超过 {self.max_entries} 条，淘汰了 {excess} 条最久未访问的记录")
+        return excess
+
+
+class MeteoraEarningsAggregator:
+    """
+    服务端手续费收入聚合器
+    用连接池和线程池批量查询每个钱包在各交易对的 total_fee_usd_claimed，
+    并把结果预先写入分片文件，前端一次静态查询即可得到结果
+    """
+
+    def __init__(self, data_dir: str = "meteora_data", base_url: str = METEORA_API_BASE_URL,
+                 max_workers: int = 32, timeout: float = 10.0, retries: int = 2,
+                 session: requests.Session = None, cache: EarningsCache = None,
+                 initial_concurrency: int = 4, retry_passes: int = 1, backoff_base: float = 0.2):
+        """
+        初始化手续费收入聚合器
+
+        Args:
+            data_dir: MeteoraDataFetcher 的数据输出目录
+            base_url: Meteora API 地址
+            max_workers: 最大并发请求数（同时也是连接池大小），实际并发由AIMD窗口自适应调整
+            timeout: 单次请求超时时间（秒）
+            retries: 连接错误、429和5xx响应的重试次数（带抖动的指数退避）
+            session: 自定义 requests.Session，不提供则创建带连接池的会话
+            cache: 手续费收入缓存，命中且未过期的交易对不再请求API
+            initial_concurrency: AIMD窗口的初始并发数
+            retry_passes: 第一轮结束后对可重试失败的交易对额外重试的轮数
+            backoff_base: 指数退避的基础等待时间（秒）
+        """
+        self.data_dir = data_dir
+        self.output_dir = None  # 写入分片的版本目录，不设置则为 current.json 指向的当前版本
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.retry_passes = max(0, retry_passes)
+        self.backoff_base = backoff_base
+        self.session = session or self._create_session(self.max_workers)
+        self.cache = cache
+        self.controller = AdaptiveConcurrencyController(initial_window=initial_concurrency,
+                                                        max_window=self.max_workers)
+        self.last_stats = {}  # 最近一次查询的缓存命中数和请求数
+        self.last_fetch_stats = {}  # 最近一次 fetch_keys 的吞吐量、重试和限流统计
+        self.last_refreshed_wallets = []  # 最近一次 refresh_earnings 重新查询过的钱包
+
+    @staticmethod
+    def _create_session(pool_size: int) -> requests.Session:
+        """
+        创建复用连接的会话：连接池大小与最大并发数一致，避免线程之间争抢连接
+        重试由 fetch_pair_earning 负责，以便把 429/5xx 反馈给并发窗口
+        """
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _request_earning(self, wallet: str, lb_pair: str) -> Tuple[Optional[float], bool, Optional[float]]:
+        """
+        在并发窗口内发送一次请求
+
+        Returns:
+            (收入, 是否可重试, Retry-After秒数)：成功时收入不为 None
+        """
+        url = f"{self.base_url}/wallet/{wallet}/{lb_pair}/earning"
+        self.controller.acquire()
+        start = time.monotonic()
+        congested = False
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            if response.status_code == 200:
+                return float(response.json().get("total_fee_usd_claimed") or 0), False, None
+
+            logger.debug(f"查询 {wallet}/{lb_pair} 失败: HTTP {response.status_code}")
+            congested = response.status_code in RETRYABLE_STATUS
+            retry_after = response.headers.get("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            return None, congested, retry_after
+        except Exception as e:
+            logger.debug(f"查询 {wallet}/{lb_pair} 失败: {str(e)}")
+            congested = True
+            return None, True, None
+        finally:
+            self.controller.release(time.monotonic() - start, congested)
+
+    def fetch_pair_earning(self, wallet: str, lb_pair: str) -> Optional[float]:
+        """
+        查询单个钱包在单个交易对的手续费收入，429/5xx/连接错误按带抖动的指数退避重试
+
+        Returns:
+            float: total_fee_usd_claimed，请求失败时返回 None
+        """
+        value, _ = self._fetch_with_retries(wallet, lb_pair)
+        return value
+
+    def _fetch_with_retries(self, wallet: str, lb_pair: str) -> Tuple[Optional[float], bool]:
+        """返回 (收入, 最终失败是否可重试)"""
+        for attempt in range(self.retries + 1):
+            value, retryable, retry_after = self._request_earning(wallet, lb_pair)
+            if value is not None or not retryable:
+                return value, False
+            if attempt < self.retries:
+                time.sleep(backoff_delay(attempt, self.backoff_base, retry_after=retry_after))
+        return None, True
+
+    def fetch_wallet_earnings(self, wallet_pairs: Dict[str, List[str]]) -> Dict[str, List[Optional[float]]]:
+        """
+        并发查询多个钱包的手续费收入
+
+        Args:
+            wallet_pairs: 钱包 -> 交易对列表
+
+        Returns:
+            Dict[str, List[Optional[float]]]: 钱包 -> 与交易对列表顺序一致的收入（失败为 None）
+        """
+        keys = [(wallet, lb_pair) for wallet, pairs in wallet_pairs.items() for lb_pair in pairs]
+        if not keys:
+            return {}
+
+        values = self.cache.get_many(keys) if self.cache is not None else {}
+        hits = len(values)
+        values.update(self.fetch_keys([key for key in dict.fromkeys(keys) if key not in values]))
+        self.last_stats = {"cache_hits": hits, "requests": len(values) - hits}
+
+        return {wallet: [values[(wallet, lb_pair)] for lb_pair in pairs] for wallet, pairs in wallet_pairs.items()}
+
+    def fetch_keys(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[float]]:
+        """
+        并发请求 (钱包, 交易对) 的手续费收入，成功的结果写入缓存
+
+        实际并发由AIMD窗口控制；第一轮中可重试的失败（限流、5xx、连接错误）
+        会在退避后再集中重试 retry_passes 轮，不可重试的失败（如404）直接记为 None
+        """
+        if not keys:
+            return {}
+
+        start = time.perf_counter()
+        throttled_before = self.controller.throttled  # 控制器跨调用累计，这里只统计本次调用
+        values = {}
+        pending = list(keys)
+        retried = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="meteora-earning") as executor:
+            for pass_index in range(self.retry_passes + 1):
+                if pass_index > 0:
+                    if not pending:
+                        break
+                    retried += len(pending)
+                    delay = backoff_delay(self.retries + pass_index, self.backoff_base)
+                    logger.info(f"🔁 第 {pass_index} 轮重试 {len(pending)} 个失败的交易对（{delay:.2f} 秒后）")
+                    time.sleep(delay)
+
+                results = list(executor.map(lambda key: self._fetch_with_retries(*key), pending))
+                failed = []
+                for key, (value, retryable) in zip(pending, results):
+                    values[key] = value
+                    if value is None and retryable:
+                        failed.append(key)
+                pending = failed
+
+        seconds = time.perf_counter() - start
+        succeeded = sum(value is not None for value in values.values())
+        self.last_fetch_stats = {
+            "pairs": len(keys),
+            "succeeded": succeeded,
+            "failed": len(keys) - succeeded,
+            "retried": retried,
+            "throttled": self.controller.throttled - throttled_before,
+            "window": round(self.controller.window, 2),
+            "seconds": round(seconds, 3),
+            "pairs_per_second": round(len(keys) / seconds, 2) if seconds > 0 else None
+        }
+        logger.info(f"⚡ 查询 {len(keys)} 个交易对: 成功 {succeeded} 个，耗时 {seconds:.2f} 秒，"
+                    f"{self.last_fetch_stats['pairs_per_second']} 交易对/秒，当前并发窗口 {self.controller.window:.1f}")
+
+        if self.cache is not None:
+            self.cache.put_many((wallet, lb_pair, value) for (wallet, lb_pair), value in values.items()
+                                if value is not None)
+        return values
+
+    def load_shard_wallets(self) -> Dict[str, List[str]]:
+        """读取所有分片中的钱包 -> 交易对数据"""
+        wallet_data = {}
+        for filepath in self.shard_files():
+            with open(filepath, 'r', encoding='utf-8') as f:
+                wallet_data.update(decode_shard_wallets(json.load(f)))
+        return wallet_data
+
+    def load_recent_activity(self) -> Dict[str, List[str]]:
+        """最近一次Dune获取中出现的钱包 -> 交易对（merged_dune_data.npz），视为近期活跃"""
+        merged_file = os.path.join(self.data_dir, "merged_dune_data.npz")
+        try:
+            return MeteoraDataFetcher.process_wallet_data(load_columnar_snapshot(merged_file))
+        except FileNotFoundError:
+            return {}
+
+    def refresh_earnings(self, wallet_data: Dict[str, List[str]] = None, active_data: Dict[str, List[str]] = None,
+                         max_pairs: int = None) -> Dict[str, int]:
+        """
+        刷新缓存：只重新查询近期活跃的交易对，以及缓存中缺失或已过期的交易对
+
+        Args:
+            wallet_data: 需要保持新鲜的钱包 -> 交易对（process_wallet_data 的输出格式），不提供则读取所有分片
+            active_data: 近期活跃的钱包 -> 交易对，无论缓存是否过期都重新查询
+            max_pairs: 本次最多查询的交易对数量，活跃的交易对优先，其次是最久未更新的
+
+        Returns:
+            Dict[str, int]: 刷新统计
+        """
+        if self.cache is None:
+            raise ValueError("刷新手续费收入需要配置 EarningsCache")
+
+        if wallet_data is None:
+            wallet_data = self.load_shard_wallets()
+
+        active = [(wallet, lb_pair) for wallet, pairs in (active_data or {}).items() for lb_pair in pairs]
+        stale = self.cache.stale_keys([(wallet, lb_pair) for wallet, pairs in wallet_data.items()
+                                       for lb_pair in pairs])
+        keys = list(dict.fromkeys(active + stale))
+        if max_pairs is not None:
+            keys = keys[:max_pairs]
+
+        values = self.fetch_keys(keys)
+        self.last_refreshed_wallets = list(dict.fromkeys(wallet for wallet, _ in keys))
+        stats = {
+            "checked_pairs": sum(len(pairs) for pairs in wallet_data.values()),
+            "active_pairs": len(set(active)),
+            "stale_pairs": len(stale),
+            "refreshed_pairs": sum(value is not None for value in values.values()),
+            "failed_pairs": sum(value is None for value in values.values())
+        }
+
+        logger.info(f"手续费收入缓存刷新完成: 检查 {stats['checked_pairs']} 个交易对，"
+                    f"活跃 {stats['active_pairs']} 个，过期或缺失 {stats['stale_pairs']} 个，"
+                    f"刷新 {stats['refreshed_pairs']} 个，失败 {stats['failed_pairs']} 个")
+        return stats
+
+    def shard_dir(self) -> str:
+        """分片文件所在目录"""
+        return self.output_dir or published_dir(self.data_dir)
+
+    def shard_files(self, wallets: Iterable[str] = None) -> List[str]:
+        """
+        分片目录中的钱包分片文件；提供 wallets 且元数据记录了分片数时，只返回这些钱包所在的分片
+        """
+        directory = self.shard_dir()
+        if wallets is not None:
+            try:
+                with open(os.path.join(directory, "metadata.json"), 'r', encoding='utf-8') as f:
+                    shard_count = json.load(f).get("sharding", {}).get("shard_count")
+            except (FileNotFoundError, ValueError):
+                shard_count = None
+            if shard_count:
+                wallets = list(wallets)
+                filenames = {shard_filename(shard_id, shard_count)
+                             for shard_id in wallet_shard_ids(wallets, shard_count).tolist()} if wallets else set()
+                return sorted(os.path.join(directory, filename) for filename in filenames
+                              if os.path.exists(os.path.join(directory, filename)))
+        return sorted(glob.glob(os.path.join(directory, "wallets_*.json")))
+
+    def annotate_shards(self, wallets: Iterable[str] = None) -> Dict[str, int]:
+        """
+        查询分片中钱包的手续费收入，写入分片文件的 earnings 字段
+
+        earnings 为 钱包 -> 与 wallets 中交易对顺序一致的 total_fee_usd_claimed 列表，
+        json 和 compact 两种分片格式相同；查询失败的交易对记为 null，前端会实时补查
+
+        Args:
+            wallets: 只更新这些钱包，不提供则更新所有钱包
+
+        Returns:
+            Dict[str, int]: 更新统计
+        """
+        selected = set(wallets) if wallets is not None else None
+        stats = {"shards": 0, "wallets": 0, "pairs": 0, "failed_pairs": 0, "cache_hits": 0}
+
+        for filepath in self.shard_files(selected):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                file_data = json.load(f)
+
+            wallet_pairs = decode_shard_wallets(file_data)
+            if selected is not None:
+                wallet_pairs = {wallet: pairs for wallet, pairs in wallet_pairs.items() if wallet in selected}
+            if not wallet_pairs:
+                continue
+
+            earnings = self.fetch_wallet_earnings(wallet_pairs)
+            stats["cache_hits"] += self.last_stats["cache_hits"]
+            file_data.setdefault("earnings", {}).update(earnings)
+            file_data["group_info"]["earnings_updated"] = pd.Timestamp.now().isoformat()
+
+            write_json_atomic(filepath, file_data)
+
+            failed = sum(value is None for values in earnings.values() for value in values)
+            stats["shards"] += 1
+            stats["wallets"] += len(earnings)
+            stats["pairs"] += sum(len(values) for values in earnings.values())
+            stats["failed_pairs"] += failed
+            logger.info(f"分片 '{os.path.basename(filepath)}' 已写入 {len(earnings)} 个钱包的手续费收入"
+                        f"（失败 {failed} 个交易对）")
+
+        self._update_metadata(stats)
+        logger.info(f"手续费收入聚合完成: {stats['wallets']} 个钱包, {stats['pairs']} 个交易对, "
+                    f"失败 {stats['failed_pairs']} 个")
+        return stats
+
+    def _update_metadata(self, stats: Dict[str, int]):
+        """在 metadata.json 中记录手续费收入的更新时间和统计"""
+        metadata_file = os.path.join(self.shard_dir(), "metadata.json")
+        if not os.path.exists(metadata_file):
+            return
+
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+
+        metadata["earnings"] = dict(stats, source=self.base_url, updated_at=pd.Timestamp.now().isoformat())
+        write_json_atomic(metadata_file, metadata)
+
+
+def main():
+    """主函数"""
+    print("💰 Meteora 盈利查询器 - 手续费收入预计算工具\n")
+
+    parser = argparse.ArgumentParser(description="预先查询钱包手续费收入并写入分片文件")
+    parser.add_argument('--data-dir', default="meteora_data", help="数据目录")
+    parser.add_argument('--wallets', default=None, help="逗号分隔的钱包地址，不提供则更新所有钱包")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('EARNINGS_CONCURRENCY', 32)),
+                        help="最大并发请求数（实际并发按延迟和429/5xx自适应调整）")
+    parser.add_argument('--base-url', default=os.getenv('METEORA_API_BASE_URL', METEORA_API_BASE_URL),
+                        help="Meteora API 地址")
+    parser.add_argument('--cache-ttl-hours', type=float, default=float(os.getenv('EARNINGS_CACHE_TTL_HOURS', 6)),
+                        help="手续费收入缓存有效期（小时）")
+    parser.add_argument('--cache-max-entries', type=int, default=1000000, help="缓存最多保留的记录数")
+    parser.add_argument('--no-cache', action='store_true', help="不使用缓存，所有交易对都重新查询")
+    parser.add_argument('--refresh', action='store_true',
+                        help="先刷新缓存：重新查询近期活跃（最近一次Dune获取中出现）以及过期的交易对")
+    parser.add_argument('--max-pairs', type=int, default=None, help="刷新时最多查询的交易对数量")
+    args = parser.parse_args()
+
+    wallets = [wallet.strip() for wallet in args.wallets.split(',') if wallet.strip()] if args.wallets else None
+
+    try:
+        cache = None
+        if not args.no_cache:
+            cache = EarningsCache(os.path.join(args.data_dir, EARNINGS_CACHE_FILE),
+                                  ttl_seconds=args.cache_ttl_hours * 3600, max_entries=args.cache_max_entries)
+        aggregator = MeteoraEarningsAggregator(args.data_dir, base_url=args.base_url, max_workers=args.workers,
+                                               cache=cache)
+
+        if args.refresh and cache is not None:
+            aggregator.refresh_earnings(active_data=aggregator.load_recent_activity(), max_pairs=args.max_pairs)
+
+        # 已使用版本化发布时，在继承当前版本的新版本目录中写入，完成后再切换 current.json
+        publisher = GenerationPublisher(args.data_dir)
+        if publisher.current() is not None:
+            aggregator.output_dir = publisher.begin(inherit=True)
+            try:
+                stats = aggregator.annotate_shards(wallets)
+                publisher.publish(aggregator.output_dir)
+            except BaseException:
+                publisher.abort(aggregator.output_dir)
+                raise
+        else:
+            stats = aggregator.annotate_shards(wallets)
+
+        print(f"\n=== 手续费收入统计 ===")
+        print(f"更新分片数: {stats['shards']:,}")
+        print(f"更新钱包数: {stats['wallets']:,}")
+        print(f"查询交易对数: {stats['pairs']:,}")
+        print(f"查询失败数: {stats['failed_pairs']:,}")
+        if cache is not None:
+            print(f"缓存记录数: {len(cache):,}")
+    except KeyboardInterrupt:
+        print(f"\n⏹️  用户中断操作")
+    except Exception as e:
+        print(f"❌ 执行失败: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
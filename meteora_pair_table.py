@@ -0,0 +1,231 @@
+import sys
+from collections.abc import ItemsView, Mapping, ValuesView
+from itertools import chain
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# items() 按块把交易对编码还原为字符串，块越大越快，临时列表也越大
+ITER_CHUNK_WALLETS = 65536
+
+
+def intern_labels(labels: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    把 values 编码为 labels 中的下标，不在 labels 中的值按首次出现的顺序追加到末尾
+
+    Returns:
+        (codes, labels): int64 编码和追加后的标签数组
+    """
+    codes = pd.Index(labels, dtype=object).get_indexer(values)
+    missing = codes < 0
+    if missing.any():
+        new_labels = pd.unique(values[missing])
+        codes[missing] = len(labels) + pd.Index(new_labels, dtype=object).get_indexer(values[missing])
+        labels = np.concatenate([labels, np.asarray(new_labels, dtype=object)])
+    return codes.astype(np.int64), labels
+
+
+class WalletPairTable(Mapping):
+    """
+    钱包 -> 交易对 的紧凑内存表示（CSR结构）
+
+    钱包和交易对地址各只保存一次，整数ID就是它们在 wallets / pools 中的下标；
+    钱包 i 的交易对ID是 pool_ids[offsets[i]:offsets[i + 1]]。每个钱包-交易对引用只占一个 int32，
+    而 Dict[str, List[str]] / Dict[str, set] 每个引用都需要列表槽位或集合条目。
+
+    实现只读的 Mapping 接口（访问时才生成交易对列表），可以直接传给接受 Dict[str, List[str]] 的函数；
+    写出 JSON 等输出环节再用 to_dict() 转换
+    """
+
+    def __init__(self, wallets, pools, offsets, pool_ids):
+        self.wallets = np.asarray(wallets, dtype=object)
+        self.pools = np.asarray(pools, dtype=object)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.pool_ids = np.asarray(pool_ids, dtype=np.int32)
+        self._wallet_index = None  # 钱包 -> 下标，首次按地址查找时构建
+
+    @classmethod
+    def empty(cls) -> "WalletPairTable":
+        return cls([], [], [0], [])
+
+    @classmethod
+    def from_codes(cls, wallet_codes: np.ndarray, pool_codes: np.ndarray, wallets, pools,
+                   dedupe: bool = True) -> "WalletPairTable":
+        """
+        由逐个引用的 (钱包ID, 交易对ID) 构建
+
+        Args:
+            wallet_codes: 每个引用的钱包ID
+            pool_codes: 每个引用的交易对ID
+            wallets: 钱包ID -> 地址（表中的钱包顺序）
+            pools: 交易对ID -> 地址
+            dedupe: 是否去掉重复的 (钱包, 交易对)，保留首次出现
+        """
+        wallet_codes = np.asarray(wallet_codes, dtype=np.int64)
+        pool_codes = np.asarray(pool_codes, dtype=np.int64)
+        if dedupe and len(wallet_codes):
+            num_pools = max(len(pools), 1)
+            keys = pd.unique(wallet_codes * num_pools + pool_codes)
+            wallet_codes = keys // num_pools
+            pool_codes = keys % num_pools
+
+        # 按钱包稳定排序：每个钱包的交易对保持首次出现的顺序
+        order = np.argsort(wallet_codes, kind='stable')
+        offsets = np.zeros(len(wallets) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(wallet_codes, minlength=len(wallets)), out=offsets[1:])
+        return cls(wallets, pools, offsets, pool_codes[order])
+
+    @classmethod
+    def from_columns(cls, wallet_values, pool_values) -> "WalletPairTable":
+        """由两列（钱包地址、交易对地址，不含空值）构建，钱包和交易对都按首次出现编号"""
+        wallet_codes, wallets = pd.factorize(np.asarray(wallet_values, dtype=object))
+        pool_codes, pools = pd.factorize(np.asarray(pool_values, dtype=object))
+        return cls.from_codes(wallet_codes, pool_codes, wallets, pools)
+
+    @classmethod
+    def from_mapping(cls, wallet_data: Mapping) -> "WalletPairTable":
+        """由 钱包 -> 交易对列表 构建（已经是 WalletPairTable 时直接返回），保留钱包和交易对的原有顺序"""
+        if isinstance(wallet_data, WalletPairTable):
+            return wallet_data
+
+        offsets = np.zeros(len(wallet_data) + 1, dtype=np.int64)
+        np.cumsum([len(pairs) for pairs in wallet_data.values()], out=offsets[1:])
+        all_pairs = np.fromiter(chain.from_iterable(wallet_data.values()), dtype=object, count=int(offsets[-1]))
+        pool_ids, pools = pd.factorize(all_pairs)
+        return cls(list(wallet_data.keys()), pools, offsets, pool_ids)
+
+    def __len__(self) -> int:
+        return len(self.wallets)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.wallets.tolist())
+
+    def __getitem__(self, wallet: str) -> List[str]:
+        try:
+            position = self.wallet_index().get_loc(wallet)
+        except (KeyError, TypeError):
+            raise KeyError(wallet)
+        return self.pairs_at(position)
+
+    def __getstate__(self):
+        # 在进程池中传递分片时不携带查找用的索引
+        state = self.__dict__.copy()
+        state["_wallet_index"] = None
+        return state
+
+    def wallet_index(self) -> pd.Index:
+        """按地址查找钱包下标的索引（首次调用时构建）"""
+        if self._wallet_index is None:
+            self._wallet_index = pd.Index(self.wallets, dtype=object)
+        return self._wallet_index
+
+    @property
+    def nbytes(self) -> int:
+        """表占用内存的估计值：数组、地址字符串以及已构建的查找索引（含哈希表）"""
+        size = self.wallets.nbytes + self.pools.nbytes + self.offsets.nbytes + self.pool_ids.nbytes
+        size += sum(map(sys.getsizeof, self.wallets)) + sum(map(sys.getsizeof, self.pools))
+        if self._wallet_index is not None:
+            size += self._wallet_index.memory_usage()
+        return size
+
+    def pairs_at(self, position: int) -> List[str]:
+        """第 position 个钱包的交易对列表"""
+        return self.pools[self.pool_ids[self.offsets[position]:self.offsets[position + 1]]].tolist()
+
+    def iter_items(self) -> Iterator[Tuple[str, List[str]]]:
+        """按表中顺序逐个产生 (钱包, 交易对列表)"""
+        for start in range(0, len(self.wallets), ITER_CHUNK_WALLETS):
+            end = min(start + ITER_CHUNK_WALLETS, len(self.wallets))
+            base = self.offsets[start]
+            pairs = self.pools[self.pool_ids[base:self.offsets[end]]].tolist()
+            bounds = (self.offsets[start:end + 1] - base).tolist()
+            for wallet, left, right in zip(self.wallets[start:end].tolist(), bounds[:-1], bounds[1:]):
+                yield wallet, pairs[left:right]
+
+    def items(self) -> ItemsView:
+        return LazyItemsView(self)
+
+    def values(self) -> ValuesView:
+        return LazyValuesView(self)
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return dict(self.iter_items())
+
+    def lengths(self) -> np.ndarray:
+        """每个钱包的交易对数"""
+        return np.diff(self.offsets)
+
+    @property
+    def total_pairs(self) -> int:
+        return int(self.offsets[-1])
+
+    def take(self, positions: np.ndarray) -> "WalletPairTable":
+        """取出部分钱包组成新表，交易对编号压缩为只包含用到的交易对"""
+        positions = np.asarray(positions, dtype=np.int64)
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        offsets = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        used, pool_ids = np.unique(self.pool_ids[gather], return_inverse=True)
+        return WalletPairTable(self.wallets[positions], self.pools[used], offsets, pool_ids.reshape(-1))
+
+    def shard_groups(self, shard_ids: np.ndarray) -> Iterator[Tuple[int, "WalletPairTable"]]:
+        """
+        按钱包的分片编号拆分，按分片编号升序产生 (分片编号, 子表)，子表内保持钱包原有顺序
+
+        Args:
+            shard_ids: 每个钱包的分片编号，顺序与 wallets 一致
+        """
+        shard_ids = np.asarray(shard_ids)
+        if not len(shard_ids):
+            return
+        order = np.argsort(shard_ids, kind='stable')
+        bounds = np.flatnonzero(np.diff(shard_ids[order])) + 1
+        for positions in np.split(order, bounds):
+            yield int(shard_ids[positions[0]]), self.take(positions)
+
+    def transpose(self) -> "WalletPairTable":
+        """
+        反向表：交易对 -> 钱包（返回表的 wallets 字段为交易对地址，pools 字段为钱包地址）。
+        交易对按首次被引用的顺序排列，每个交易对的钱包保持本表中的钱包顺序
+        """
+        wallet_codes = np.repeat(np.arange(len(self.wallets), dtype=np.int64), self.lengths())
+        pool_order = pd.unique(self.pool_ids)
+        remap = np.empty(len(self.pools), dtype=np.int64)
+        remap[pool_order] = np.arange(len(pool_order))
+        return WalletPairTable.from_codes(remap[self.pool_ids], wallet_codes, self.pools[pool_order], self.wallets,
+                                          dedupe=False)
+
+    def merge(self, other: Mapping) -> "WalletPairTable":
+        """
+        合并另一份钱包数据，返回新表：本表的钱包在前，新钱包按出现顺序追加；
+        每个钱包先保留已有的交易对，再追加新的交易对（重复的交易对只保留一次）
+        """
+        other = WalletPairTable.from_mapping(other)
+        wallet_map, wallets = intern_labels(self.wallets, other.wallets)
+        pool_map, pools = intern_labels(self.pools, other.pools)
+
+        wallet_codes = np.concatenate([
+            np.repeat(np.arange(len(self.wallets), dtype=np.int64), self.lengths()),
+            np.repeat(wallet_map, other.lengths())
+        ])
+        pool_codes = np.concatenate([self.pool_ids.astype(np.int64), pool_map[other.pool_ids]])
+        return WalletPairTable.from_codes(wallet_codes, pool_codes, wallets, pools)
+
+
+class LazyItemsView(ItemsView):
+    """按 mapping.iter_items() 遍历的 items 视图，不逐个按键查找"""
+
+    def __iter__(self):
+        return self._mapping.iter_items()
+
+
+class LazyValuesView(ValuesView):
+    """按 mapping.iter_items() 遍历的 values 视图"""
+
+    def __iter__(self):
+        for _, pairs in self._mapping.iter_items():
+            yield pairs
@@ -0,0 +1,48 @@
+import argparse
+import json
+
+from meteora_data_fetcher import TOP_POOLS_LIMIT, read_pool_wallets, read_top_pools
+
+
+def main():
+    """主函数"""
+    print("🏊 Meteora 盈利查询器 - 交易对反向索引查询工具\n")
+
+    parser = argparse.ArgumentParser(description="按交易对查询钱包，或列出钱包数最多的交易对（只读取反向索引）")
+    parser.add_argument('--data-dir', default="meteora_data", help="数据目录")
+    parser.add_argument('--pool', action='append', default=[],
+                        help="交易对地址（lbPair），可重复指定；输出参与过该交易对的钱包")
+    parser.add_argument('--top', type=int, default=None,
+                        help=f"列出钱包数最多的N个交易对（不超过 {TOP_POOLS_LIMIT} 时只读取 metadata.json）")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出")
+    args = parser.parse_args()
+
+    if not args.pool and args.top is None:
+        args.top = 10
+
+    result = {}
+    for pool in args.pool:
+        wallets = read_pool_wallets(args.data_dir, pool)
+        result[pool] = wallets
+        if not args.json:
+            if wallets is None:
+                print(f"⚠️  未找到交易对: {pool}")
+            else:
+                print(f"=== {pool}: {len(wallets):,} 个钱包 ===")
+                for wallet in wallets:
+                    print(wallet)
+
+    if args.top is not None:
+        top = read_top_pools(args.data_dir, args.top)
+        result["top_pools"] = top
+        if not args.json:
+            print(f"\n=== 钱包数最多的 {len(top)} 个交易对 ===")
+            for rank, (pool, count) in enumerate(top, 1):
+                print(f"{rank:>4}. {pool}  {count:,} 个钱包")
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import bisect
+import heapq
+import json
+import logging
+import os
+import shutil
+from typing import Iterable, List, Optional
+
+from meteora_compression import remove_compressed_siblings
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 前缀索引目录文件和块文件所在的子目录（位于数据目录中）
+PREFIX_INDEX_FILE = "wallet_prefix_index.json"
+PREFIX_BLOCK_DIR = "wallet_prefix"
+
+# 每个块的钱包数；增量更新时块超过两倍大小才拆分
+DEFAULT_PREFIX_BLOCK_SIZE = 2000
+
+
+def separator_key(previous: str, first: str) -> str:
+    """
+    块的分隔键：first 的最短前缀，且大于上一个块的最后一个地址 previous
+    块内所有地址 >= 分隔键，上一个块的所有地址 < 分隔键
+    """
+    for length in range(1, len(first) + 1):
+        if first[:length] > previous:
+            return first[:length]
+    return first
+
+
+def block_filename(block_id: int) -> str:
+    """块文件的相对路径"""
+    return f"{PREFIX_BLOCK_DIR}/{block_id:x}.json"
+
+
+def _write_json(path: str, data):
+    # 先写临时文件再替换：块文件可能与旧的发布版本共享硬链接，不能原地改写
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'), ensure_ascii=False)
+    os.replace(tmp_file, path)
+    remove_compressed_siblings(path)
+
+
+def _read_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_directory(data_dir: str, blocks: List[list], block_size: int, next_block_id: int) -> dict:
+    directory = {
+        "scheme": "sorted_blocks",
+        "block_size": block_size,
+        "total_wallets": sum(count for _, count, _ in blocks),
+        "file_pattern": f"{PREFIX_BLOCK_DIR}/{{block_id_hex}}.json",
+        "next_block_id": next_block_id,
+        # [分隔键, 钱包数, 块编号]，按分隔键排序
+        "blocks": blocks
+    }
+    _write_json(os.path.join(data_dir, PREFIX_INDEX_FILE), directory)
+    return directory
+
+
+def build_prefix_index(data_dir: str, sorted_wallets: Iterable[str],
+                       block_size: int = DEFAULT_PREFIX_BLOCK_SIZE) -> dict:
+    """
+    从已排序的钱包地址构建前缀索引：按顺序切成 block_size 个地址一块，
+    目录文件只记录每块的分隔键，查询时二分定位到块
+
+    Args:
+        data_dir: 数据目录
+        sorted_wallets: 已排序且不重复的钱包地址（可迭代对象，逐块写入）
+        block_size: 每块的钱包数
+
+    Returns:
+        dict: 目录文件内容
+    """
+    block_dir = os.path.join(data_dir, PREFIX_BLOCK_DIR)
+    shutil.rmtree(block_dir, ignore_errors=True)
+    os.makedirs(block_dir, exist_ok=True)
+
+    blocks = []
+    previous = None
+    block = []
+
+    def flush():
+        block_id = len(blocks)
+        separator = "" if previous is None else separator_key(previous, block[0])
+        _write_json(os.path.join(data_dir, block_filename(block_id)), block)
+        blocks.append([separator, len(block), block_id])
+
+    for wallet in sorted_wallets:
+        block.append(wallet)
+        if len(block) >= block_size:
+            flush()
+            previous = block[-1]
+            block = []
+    if block or not blocks:
+        flush()
+
+    directory = _save_directory(data_dir, blocks, block_size, len(blocks))
+    logger.info(f"前缀索引创建完成: {directory['total_wallets']} 个钱包，{len(blocks)} 个块")
+    return directory
+
+
+def add_wallets_to_prefix_index(data_dir: str, new_wallets: List[str]) -> Optional[dict]:
+    """
+    把新钱包插入前缀索引，只重写受影响的块；块超过两倍 block_size 时拆分，
+    新块使用新的编号，其他块的文件名保持不变
+
+    Returns:
+        dict: 更新后的目录文件内容，尚未生成前缀索引时返回 None
+    """
+    directory_file = os.path.join(data_dir, PREFIX_INDEX_FILE)
+    if not os.path.exists(directory_file):
+        return None
+
+    directory = _read_json(directory_file)
+    blocks = directory["blocks"]
+    block_size = directory["block_size"]
+    next_block_id = directory["next_block_id"]
+    separators = [block[0] for block in blocks]
+
+    affected = {}
+    for wallet in sorted(set(new_wallets)):
+        position = max(bisect.bisect_right(separators, wallet) - 1, 0)
+        affected.setdefault(position, []).append(wallet)
+
+    # 从后往前替换，拆分插入的新块不影响前面块的位置
+    for position in sorted(affected, reverse=True):
+        separator, _, block_id = blocks[position]
+        existing = _read_json(os.path.join(data_dir, block_filename(block_id)))
+        merged = list(dict.fromkeys(heapq.merge(existing, affected[position])))
+
+        chunks = [merged]
+        if len(merged) > 2 * block_size:
+            chunks = [merged[i:i + block_size] for i in range(0, len(merged), block_size)]
+
+        replacement = []
+        for i, chunk in enumerate(chunks):
+            if i == 0:
+                chunk_id, chunk_separator = block_id, separator
+            else:
+                chunk_id, chunk_separator = next_block_id, separator_key(chunks[i - 1][-1], chunk[0])
+                next_block_id += 1
+            _write_json(os.path.join(data_dir, block_filename(chunk_id)), chunk)
+            replacement.append([chunk_separator, len(chunk), chunk_id])
+        blocks[position:position + 1] = replacement
+
+    logger.info(f"前缀索引增量更新: {len(new_wallets)} 个钱包，重写 {len(affected)} 个块")
+    return _save_directory(data_dir, blocks, block_size, next_block_id)
+
+
+def prefix_index_summary(directory: dict) -> dict:
+    """写入 metadata.json 的前缀索引摘要"""
+    return {
+        "directory": PREFIX_INDEX_FILE,
+        "file_pattern": directory["file_pattern"],
+        "block_size": directory["block_size"],
+        "block_count": len(directory["blocks"])
+    }
+
+
+class WalletPrefixIndex:
+    """
+    钱包地址前缀查询
+    目录文件只需读取一次；查询时二分定位到第一个可能包含匹配的块，
+    前缀长于分隔键时只需读取一个块文件
+    """
+
+    def __init__(self, data_dir: str = "meteora_data"):
+        self.data_dir = data_dir
+        self.directory = _read_json(os.path.join(data_dir, PREFIX_INDEX_FILE))
+        self.separators = [block[0] for block in self.directory["blocks"]]
+        self.last_blocks_read = []  # 最近一次查询读取的块编号
+
+    def read_block(self, block_id: int) -> List[str]:
+        return _read_json(os.path.join(self.data_dir, block_filename(block_id)))
+
+    def lookup(self, prefix: str, limit: int = 20) -> List[str]:
+        """
+        按地址排序返回以 prefix 开头的钱包，最多 limit 个
+
+        Args:
+            prefix: 地址前缀（区分大小写）
+            limit: 最多返回的地址数
+        """
+        blocks = self.directory["blocks"]
+        self.last_blocks_read = []
+        matches = []
+
+        start = max(bisect.bisect_right(self.separators, prefix) - 1, 0)
+        for position in range(start, len(blocks)):
+            # 后续块的分隔键都大于 prefix；不以 prefix 开头时其中的地址都不可能匹配
+            if position > start and not self.separators[position].startswith(prefix):
+                break
+
+            block_id = blocks[position][2]
+            block = self.read_block(block_id)
+            self.last_blocks_read.append(block_id)
+
+            for wallet in block[bisect.bisect_left(block, prefix):]:
+                if not wallet.startswith(prefix):
+                    return matches
+                matches.append(wallet)
+                if len(matches) >= limit:
+                    return matches
+
+        return matches
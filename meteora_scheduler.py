@@ -0,0 +1,433 @@
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from meteora_compression import DEFAULT_COMPRESSION, available_encodings
+from meteora_data_fetcher import RUN_METRICS_FILE, MeteoraDataFetcher, RunMetrics, peak_rss_mb, write_json_atomic
+from meteora_pair_table import WalletPairTable
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 守护进程的健康/指标文件名（位于数据目录中）
+HEALTH_FILE = "daemon_health.json"
+
+# 默认调度参数（秒）
+DEFAULT_INTERVAL = 3600
+DEFAULT_BACKOFF = 60
+DEFAULT_MAX_BACKOFF = 3600
+DEFAULT_HEALTH_INTERVAL = 60
+
+
+def changed_wallets(before: WalletPairTable, after: WalletPairTable) -> WalletPairTable:
+    """
+    after = before.merge(...) 中交易对有增加的钱包和新钱包组成的子表
+    （merge 保持已有钱包的顺序并把新钱包追加在末尾）
+    """
+    grown = np.flatnonzero(after.lengths()[:len(before)] != before.lengths())
+    return after.take(np.concatenate([grown, np.arange(len(before), len(after))]))
+
+
+class QuerySchedule:
+    """单个查询的刷新计划：按固定间隔刷新，失败后按指数退避重试"""
+
+    def __init__(self, query_id: int, interval: float, backoff: float = DEFAULT_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF):
+        """
+        Args:
+            query_id: Dune查询ID
+            interval: 成功后到下一次刷新的间隔（秒）
+            backoff: 第一次失败后的重试等待（秒），之后每次失败翻倍
+            max_backoff: 重试等待的上限（秒）
+        """
+        self.query_id = query_id
+        self.interval = interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.next_run = 0.0  # 单调时钟，启动后立即刷新
+        self.failures = 0  # 连续失败次数
+        self.last_success = None
+        self.last_error = None
+        self.last_status = None  # "updated" / "unchanged" / "failed"
+        self.last_records = None
+
+    def retry_delay(self) -> float:
+        """当前连续失败次数对应的重试等待"""
+        return min(self.backoff * 2 ** max(self.failures - 1, 0), self.max_backoff)
+
+    def record_success(self, now: float, status: str, records: int = None):
+        self.failures = 0
+        self.last_error = None
+        self.last_status = status
+        self.last_records = records
+        self.last_success = pd.Timestamp.now().isoformat()
+        self.next_run = now + self.interval
+
+    def record_failure(self, now: float, error: str):
+        self.failures += 1
+        self.last_error = error
+        self.last_status = "failed"
+        self.next_run = now + self.retry_delay()
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "interval_seconds": self.interval,
+            "next_run_in_seconds": round(max(self.next_run - now, 0.0), 3),
+            "consecutive_failures": self.failures,
+            "last_status": self.last_status,
+            "last_success": self.last_success,
+            "last_error": self.last_error,
+            "last_records": self.last_records
+        }
+
+
+class RefreshScheduler:
+    """
+    常驻的定时刷新模式
+    启动时加载一次累积的钱包数据并常驻内存（WalletPairTable），之后每个查询按各自的间隔刷新：
+    新数据与内存中的状态合并，只把有变化的钱包增量发布到新的版本目录；
+    变更日志每发布 compact_every 次用内存中的状态压缩一次，不再重新加载备份。
+    每轮刷新后把各查询的状态和运行指标写入健康文件
+    """
+
+    def __init__(self, fetcher: MeteoraDataFetcher, intervals: Dict[int, float] = None,
+                 default_interval: float = DEFAULT_INTERVAL, backoff: float = DEFAULT_BACKOFF,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF, compact_every: int = 24, keep_batches: int = 5,
+                 shard_format: str = "json", use_result_cache: bool = True, health_file: str = None,
+                 health_interval: float = DEFAULT_HEALTH_INTERVAL, clock=time.monotonic):
+        """
+        Args:
+            fetcher: 数据获取器，其 query_ids 为要调度的查询
+            intervals: 查询ID -> 刷新间隔（秒），未列出的查询使用 default_interval
+            default_interval: 默认刷新间隔（秒）
+            backoff: 失败后第一次重试的等待（秒），连续失败时翻倍
+            max_backoff: 重试等待的上限（秒）
+            compact_every: 每增量发布多少次压缩一次变更日志（写出备份和列式快照）
+            keep_batches: 每个查询保留的批次目录数，None 表示保留全部
+            shard_format: 首次全量发布时的分片格式
+            use_result_cache: 跳过结果未变化的查询
+            health_file: 健康/指标文件路径，默认 data_dir/daemon_health.json
+            health_interval: 没有到期的查询时，健康文件的最长刷新间隔（秒）
+            clock: 单调时钟（测试时可以替换）
+        """
+        if fetcher.wallet_store is not None:
+            raise ValueError("定时刷新模式只支持 json 存储后端")
+
+        self.fetcher = fetcher
+        self.query_ids = list(fetcher.query_ids)
+        intervals = intervals or {}
+        self.schedules = {query_id: QuerySchedule(query_id, intervals.get(query_id, default_interval),
+                                                  backoff, max_backoff)
+                          for query_id in self.query_ids}
+        self.compact_every = max(1, compact_every)
+        self.keep_batches = keep_batches
+        self.shard_format = shard_format
+        self.use_result_cache = use_result_cache
+        self.health_file = health_file or os.path.join(fetcher.data_dir, HEALTH_FILE)
+        self.health_interval = health_interval
+        self.clock = clock
+
+        self.wallet_data = None  # 常驻内存的累积钱包数据
+        self.started_at = pd.Timestamp.now().isoformat()
+        self._started = clock()
+        self.status = "starting"
+        self.refreshes = 0
+        self.publishes = 0
+        self.failures = 0
+        self.last_publish = None
+        self.last_metrics = None
+        self._uncompacted = 0  # 上次压缩后的增量发布次数
+        self._stop = threading.Event()
+
+    def load_state(self) -> WalletPairTable:
+        """加载累积的钱包数据（只在启动时调用一次）"""
+        if self.wallet_data is None:
+            self.wallet_data = self.fetcher.load_existing_wallet_data()
+            logger.info(f"常驻内存的钱包数据: {len(self.wallet_data)} 个钱包, {self.wallet_data.total_pairs} 个交易对")
+        return self.wallet_data
+
+    def due_queries(self, now: float) -> List[int]:
+        """已到刷新时间的查询（按 query_ids 顺序）"""
+        return [query_id for query_id in self.query_ids if self.schedules[query_id].next_run <= now]
+
+    def next_wakeup(self) -> float:
+        """下一个查询到期的时间（单调时钟）"""
+        return min(schedule.next_run for schedule in self.schedules.values())
+
+    def fetch_query(self, query_id: int) -> Optional[WalletPairTable]:
+        """
+        获取单个查询的最新结果
+
+        Returns:
+            WalletPairTable: 本次获取的钱包数据，结果未变化时返回 None；获取失败时抛出异常
+        """
+        self.fetcher.query_ids = [query_id]
+        try:
+            df = self.fetcher.get_dune_data(delay_seconds=0, preserve_batches=True,
+                                            use_cache=self.use_result_cache and len(self.wallet_data) > 0)
+        finally:
+            self.fetcher.query_ids = self.query_ids
+        if df.empty:
+            return None
+        with self.fetcher.metrics.stage("build_wallet_table", query_id=query_id, rows=len(df)) as stage:
+            table = self.fetcher.build_wallet_table(df)
+            stage["wallets"] = len(table)
+        return table
+
+    def publish(self, new_data: WalletPairTable) -> dict:
+        """
+        把新数据合并进内存中的状态并发布：已有分片存储时只增量重写有变化的钱包所在的分片，
+        否则全量写入；发布成功后才替换内存中的状态
+
+        Returns:
+            dict: 新增钱包数、新增交易对数、重写文件数以及发布后的总量
+        """
+        metrics = self.fetcher.metrics
+        with metrics.stage("merge_wallet_data", existing_wallets=len(self.wallet_data),
+                           new_wallets=len(new_data)) as stage:
+            merged = self.wallet_data.merge(new_data)
+            changes = changed_wallets(self.wallet_data, merged)
+            stage["changed_wallets"] = len(changes)
+
+        if not len(changes):
+            logger.info("新数据没有新增的钱包或交易对，无需发布")
+            return {"new_wallets": 0, "new_pairs": 0, "files_rewritten": 0,
+                    "total_wallets": len(merged), "total_pairs": merged.total_pairs}
+
+        if self.fetcher._has_grouped_storage():
+            with self.fetcher.publishing(inherit=True):
+                with metrics.stage("apply_incremental_update", wallets=len(changes)) as stage:
+                    stats = self.fetcher.apply_incremental_update(changes)
+                    stage.update(stats)
+            self._uncompacted += 1
+        else:
+            with self.fetcher.publishing():
+                with metrics.stage("save_optimized_data", wallets=len(merged)):
+                    self.fetcher.save_optimized_data(merged, shard_format=self.shard_format)
+                with metrics.stage("compact_wallet_changes", wallets=len(merged)):
+                    self.fetcher.compact_wallet_changes(merged)
+            stats = {"new_wallets": len(merged) - len(self.wallet_data),
+                     "new_pairs": merged.total_pairs - self.wallet_data.total_pairs,
+                     "files_rewritten": self.fetcher.shard_count,
+                     "total_wallets": len(merged), "total_pairs": merged.total_pairs}
+            self._uncompacted = 0
+
+        self.wallet_data = merged
+        self.publishes += 1
+        self.last_publish = dict(stats, generation=self.fetcher.generations.current(),
+                                 published_at=pd.Timestamp.now().isoformat())
+
+        if self._uncompacted >= self.compact_every:
+            self.compact()
+        return stats
+
+    def compact(self):
+        """用内存中的状态压缩变更日志"""
+        if self._uncompacted:
+            with self.fetcher.metrics.stage("compact_wallet_changes", wallets=len(self.wallet_data)):
+                self.fetcher.compact_wallet_changes(self.wallet_data)
+            self._uncompacted = 0
+
+    def run_pending(self, now: float = None) -> List[int]:
+        """
+        刷新所有到期的查询：逐个获取（单个查询失败只影响它自己的重试计划），
+        再把获取到的新数据一次合并发布
+
+        Returns:
+            List[int]: 本轮刷新的查询ID
+        """
+        now = self.clock() if now is None else now
+        due = self.due_queries(now)
+        if not due:
+            return []
+
+        self.load_state()
+        self.fetcher.metrics = RunMetrics()
+        self.refreshes += 1
+        logger.info(f"🔄 刷新查询: {due}")
+
+        fetched = []
+        new_tables = []
+        for query_id in due:
+            try:
+                table = self.fetch_query(query_id)
+            except Exception as e:
+                logger.error(f"查询 {query_id} 刷新失败: {str(e)}")
+                self.fetcher.discard_pending_results([query_id])
+                self.schedules[query_id].record_failure(now, str(e))
+                self.failures += 1
+                continue
+            fetched.append((query_id, table))
+            if table is not None:
+                new_tables.append(table)
+
+        try:
+            if new_tables:
+                new_data = new_tables[0]
+                for table in new_tables[1:]:
+                    new_data = new_data.merge(table)
+                self.publish(new_data)
+
+            # 数据已发布，提交结果缓存并清理旧批次
+            self.fetcher.commit_result_cache()
+            if self.keep_batches is not None:
+                self.fetcher.prune_batches(self.keep_batches)
+        except Exception as e:
+            # 发布失败：本轮获取到的数据都没有入库，按失败重试
+            logger.error(f"发布失败: {str(e)}")
+            self.fetcher.discard_pending_results()
+            for query_id, _ in fetched:
+                self.schedules[query_id].record_failure(now, f"发布失败: {str(e)}")
+            self.failures += 1
+            self.fetcher.metrics.status = "failed"
+        else:
+            for query_id, table in fetched:
+                self.schedules[query_id].record_success(
+                    now, "unchanged" if table is None else "updated",
+                    records=None if table is None else table.total_pairs)
+            self.fetcher.metrics.status = "success" if new_tables else "unchanged"
+
+        self.last_metrics = self.fetcher.metrics.save(os.path.join(self.fetcher.data_dir, RUN_METRICS_FILE))
+        self.write_health(now)
+        return due
+
+    def health(self, now: float = None) -> dict:
+        """健康状态和指标：有查询连续失败时为 degraded"""
+        now = self.clock() if now is None else now
+        status = self.status
+        if status == "running" and any(schedule.failures for schedule in self.schedules.values()):
+            status = "degraded"
+        rss = peak_rss_mb()
+        return {
+            "status": status,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "updated_at": pd.Timestamp.now().isoformat(),
+            "uptime_seconds": round(now - self._started, 3),
+            "refreshes": self.refreshes,
+            "publishes": self.publishes,
+            "failures": self.failures,
+            "wallets": len(self.wallet_data) if self.wallet_data is not None else None,
+            "pairs": self.wallet_data.total_pairs if self.wallet_data is not None else None,
+            "peak_rss_mb": round(rss, 2) if rss is not None else None,
+            "generation": self.fetcher.generations.current(),
+            "last_publish": self.last_publish,
+            "queries": {str(query_id): self.schedules[query_id].to_dict(now) for query_id in self.query_ids},
+            "last_run_metrics": self.last_metrics
+        }
+
+    def write_health(self, now: float = None) -> dict:
+        """原子写入健康文件，外部监控只会读到完整的文件"""
+        health = self.health(now)
+        write_json_atomic(self.health_file, health, indent=2)
+        return health
+
+    def stop(self):
+        """请求停止（可以在信号处理函数或其他线程中调用）"""
+        self._stop.set()
+
+    def run_forever(self):
+        """循环刷新直到 stop()；退出前压缩变更日志并写入 stopped 状态"""
+        self.load_state()
+        self.status = "running"
+        self.write_health()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.run_pending()
+                except Exception as e:
+                    # 调度本身出错也不退出，下一轮继续
+                    logger.error(f"刷新循环出错: {str(e)}")
+                    self.failures += 1
+                now = self.clock()
+                wait = min(max(self.next_wakeup() - now, 0.0), self.health_interval)
+                if wait > 0 and not self._stop.wait(wait):
+                    self.write_health()
+        finally:
+            self.compact()
+            self.status = "stopped"
+            self.write_health()
+            logger.info("定时刷新已停止")
+
+
+def parse_intervals(values: List[str]) -> Dict[int, float]:
+    """解析 查询ID=秒 形式的刷新间隔"""
+    intervals = {}
+    for value in values:
+        query_id, _, seconds = value.partition('=')
+        intervals[int(query_id)] = float(seconds)
+    return intervals
+
+
+def main():
+    """主函数"""
+    print("⏰ Meteora 盈利查询器 - 定时刷新守护进程\n")
+
+    parser = argparse.ArgumentParser(description="常驻内存，按查询分别定时刷新Dune数据并增量发布")
+    parser.add_argument('--data-dir', default="meteora_data", help="数据目录")
+    parser.add_argument('--query-ids', default=os.getenv('DUNE_QUERY_IDS', '5556654'),
+                        help="逗号分隔的查询ID（默认读取 DUNE_QUERY_IDS）")
+    parser.add_argument('--interval', type=float, default=float(os.getenv('REFRESH_INTERVAL', DEFAULT_INTERVAL)),
+                        help="默认刷新间隔（秒）")
+    parser.add_argument('--query-interval', action='append', default=[],
+                        help="单个查询的刷新间隔，格式 查询ID=秒，可重复指定")
+    parser.add_argument('--backoff', type=float, default=DEFAULT_BACKOFF, help="失败后第一次重试的等待（秒），连续失败时翻倍")
+    parser.add_argument('--max-backoff', type=float, default=DEFAULT_MAX_BACKOFF, help="重试等待的上限（秒）")
+    parser.add_argument('--compact-every', type=int, default=24, help="每增量发布多少次压缩一次变更日志")
+    parser.add_argument('--keep-batches', type=int, default=5, help="每个查询保留的批次目录数")
+    parser.add_argument('--health-file', default=None, help=f"健康/指标文件，默认 <data-dir>/{HEALTH_FILE}")
+    parser.add_argument('--once', action='store_true', help="只刷新一轮（所有查询）后退出")
+    args = parser.parse_args()
+
+    try:
+        query_ids = [int(query_id.strip()) for query_id in args.query_ids.split(',') if query_id.strip()]
+        intervals = parse_intervals(args.query_interval)
+    except ValueError as e:
+        print(f"❌ 配置错误: {str(e)}")
+        return
+
+    compression_env = os.getenv('OUTPUT_COMPRESSION', ','.join(DEFAULT_COMPRESSION)).strip().lower()
+    compression = [] if compression_env == 'none' else [enc.strip() for enc in compression_env.split(',') if enc.strip()]
+    extra_columns = [col.strip() for col in os.getenv('EXTRA_COLUMNS', '').split(',') if col.strip()]
+
+    try:
+        fetcher = MeteoraDataFetcher(query_ids, data_dir=args.data_dir, compression=available_encodings(compression),
+                                     extra_columns=extra_columns)
+        scheduler = RefreshScheduler(fetcher, intervals=intervals, default_interval=args.interval,
+                                     backoff=args.backoff, max_backoff=args.max_backoff,
+                                     compact_every=args.compact_every, keep_batches=args.keep_batches,
+                                     health_file=args.health_file)
+
+        print(f"📋 查询ID列表: {query_ids}")
+        for query_id in query_ids:
+            print(f"   {query_id}: 每 {scheduler.schedules[query_id].interval:g} 秒刷新")
+        print(f"   健康文件: {scheduler.health_file}")
+
+        if args.once:
+            scheduler.status = "running"
+            scheduler.run_pending()
+            scheduler.compact()
+            scheduler.status = "stopped"
+            scheduler.write_health()
+            return
+
+        # SIGTERM/SIGINT 时完成当前一轮后退出
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        signal.signal(signal.SIGINT, lambda *_: scheduler.stop())
+        scheduler.run_forever()
+    except ValueError as e:
+        print(f"❌ 配置错误: {str(e)}")
+    except Exception as e:
+        print(f"❌ 执行失败: {str(e)}")
+
+
+if __name__ == "__main__":
+    main()
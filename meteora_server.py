@@ -0,0 +1,327 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+from urllib.parse import unquote, urlsplit
+
+from meteora_data_fetcher import (decode_shard_wallets, pool_shard_filename, published_dir, shard_filename,
+                                  wallet_shard_id)
+from meteora_pair_table import WalletPairTable
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 分片缓存的默认内存上限（MB）
+DEFAULT_CACHE_MB = 256
+
+# 两次检查 current.json / metadata.json 是否变化的最短间隔（秒）
+DEFAULT_RELOAD_INTERVAL = 1.0
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否包含 etag（支持逗号分隔的多个值、弱校验前缀 W/ 和 *）"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ShardCache:
+    """
+    分片文件 -> WalletPairTable 的 LRU 缓存
+    按表的内存估计值（WalletPairTable.nbytes）限制总大小，超出时淘汰最久未使用的分片；
+    单个分片超过上限时仍然返回，只是不会常驻
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # 路径 -> (表, 字节数)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, loader: Callable[[], Optional[WalletPairTable]]) -> Optional[WalletPairTable]:
+        """
+        读取缓存，未命中时调用 loader 加载（在锁外加载，慢的分片不阻塞其他请求）
+
+        Args:
+            key: 分片文件路径
+            loader: 加载分片的函数，文件不存在时返回 None（不缓存）
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        table = loader()
+        if table is None:
+            return None
+        size = table.nbytes
+
+        with self._lock:
+            if key in self._entries:
+                # 并发请求已经加载过同一个分片
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            self._entries[key] = (table, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+        return table
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "shards": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / requests, 4) if requests else None
+            }
+
+
+class LookupService:
+    """
+    基于 save_optimized_data 生成的文件查询钱包和交易对
+    由地址计算分片，分片读成 WalletPairTable 后放入 LRU 缓存；
+    current.json 指向的版本目录或 metadata.json 的 last_updated 变化时清空缓存（热更新）
+    """
+
+    def __init__(self, data_dir: str, cache_bytes: int = DEFAULT_CACHE_MB * 2 ** 20,
+                 reload_interval: float = DEFAULT_RELOAD_INTERVAL, clock=time.monotonic):
+        """
+        Args:
+            data_dir: 数据目录（包含 current.json，或旧布局下直接包含分片文件）
+            cache_bytes: 分片缓存的内存上限（字节）
+            reload_interval: 两次检查数据是否更新的最短间隔（秒），0 表示每个请求都检查
+            clock: 单调时钟（测试时可以替换）
+        """
+        self.data_dir = data_dir
+        self.cache = ShardCache(cache_bytes)
+        self.reload_interval = reload_interval
+        self.clock = clock
+        self.reloads = 0
+        self._version = None
+        self._signature = None  # (版本目录, metadata.json 的修改时间和大小)
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _load_version(self, directory: str) -> Optional[dict]:
+        metadata_file = os.path.join(directory, "metadata.json")
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return {
+            "directory": directory,
+            "last_updated": metadata.get("last_updated"),
+            "wallet_shards": metadata.get("sharding", {}).get("shard_count"),
+            "pool_shards": (metadata.get("pool_index") or {}).get("shard_count")
+        }
+
+    def version(self) -> Optional[dict]:
+        """当前数据版本（版本目录、last_updated 和分片数），尚未发布数据时返回 None"""
+        now = self.clock()
+        if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return self._version
+
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+                return self._version
+
+            directory = published_dir(self.data_dir)
+            try:
+                stat = os.stat(os.path.join(directory, "metadata.json"))
+                signature = (directory, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                signature = None
+
+            if signature != self._signature:
+                version = self._load_version(directory) if signature else None
+                key = (version or {}).get("directory"), (version or {}).get("last_updated")
+                current = (self._version or {}).get("directory"), (self._version or {}).get("last_updated")
+                if key != current:
+                    self._version = version
+                    self.cache.clear()
+                    self.reloads += 1
+                    if version is not None:
+                        logger.info(f"数据已更新: {directory}（last_updated={version['last_updated']}），已清空分片缓存")
+                self._signature = signature
+            self._checked_at = now
+            return self._version
+
+    def _shard(self, version: dict, filename: str, decode: Callable[[dict], dict]) -> Optional[WalletPairTable]:
+        filepath = os.path.join(version["directory"], filename)
+
+        def load() -> Optional[WalletPairTable]:
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    table = WalletPairTable.from_mapping(decode(json.load(f)))
+            except FileNotFoundError:
+                return None
+            table.wallet_index()  # 查找索引也计入缓存大小
+            return table
+
+        return self.cache.get(filepath, load)
+
+    def wallet_pairs(self, wallet: str) -> Optional[List[str]]:
+        """钱包的交易对列表，钱包不存在时返回 None"""
+        version = self.version()
+        if version is None or not version["wallet_shards"]:
+            return None
+        shard_count = version["wallet_shards"]
+        table = self._shard(version, shard_filename(wallet_shard_id(wallet, shard_count), shard_count),
+                            decode_shard_wallets)
+        return table.get(wallet) if table is not None else None
+
+    def pool_wallets(self, pool: str) -> Optional[List[str]]:
+        """参与过交易对的钱包，交易对不存在或尚未生成反向索引时返回 None"""
+        version = self.version()
+        if version is None or not version["pool_shards"]:
+            return None
+        shard_count = version["pool_shards"]
+        table = self._shard(version, pool_shard_filename(wallet_shard_id(pool, shard_count), shard_count),
+                            lambda data: data["pools"])
+        return table.get(pool) if table is not None else None
+
+    def health(self) -> dict:
+        version = self.version()
+        return {
+            "status": "ok" if version is not None else "no_data",
+            "data_dir": self.data_dir,
+            "directory": version["directory"] if version else None,
+            "last_updated": version["last_updated"] if version else None,
+            "reloads": self.reloads,
+            "cache": self.cache.stats()
+        }
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /wallet/{address}  -> {"wallet": ..., "pairs": [...]}
+    GET /pool/{lbPair}     -> {"pool": ..., "wallets": [...]}
+    GET /health            -> 数据版本和缓存统计
+    查询结果带 ETag（响应内容的哈希），If-None-Match 匹配时返回 304
+    """
+
+    protocol_version = "HTTP/1.1"  # 保持连接，压测和前端都可以复用连接
+    disable_nagle_algorithm = True  # 响应头和响应体分两次写出，保持连接时避免 Nagle + 延迟确认带来的约40ms等待
+    server_version = "MeteoraLookup/1.0"
+
+    def do_GET(self):
+        service = self.server.service
+        kind, _, key = urlsplit(self.path).path.strip('/').partition('/')
+        key = unquote(key)
+
+        if kind == "health" and not key:
+            self.send_json(200, service.health())
+            return
+        if kind not in ("wallet", "pool") or not key or '/' in key:
+            self.send_json(404, {"error": f"未知的路径: {self.path}"})
+            return
+        if service.version() is None:
+            self.send_json(503, {"error": "数据尚未发布"})
+            return
+
+        if kind == "wallet":
+            pairs = service.wallet_pairs(key)
+            if pairs is None:
+                self.send_json(404, {"error": f"未找到钱包: {key}"})
+            else:
+                self.send_json(200, {"wallet": key, "pairs": pairs}, cacheable=True)
+        else:
+            wallets = service.pool_wallets(key)
+            if wallets is None:
+                self.send_json(404, {"error": f"未找到交易对: {key}"})
+            else:
+                self.send_json(200, {"pool": key, "wallets": wallets}, cacheable=True)
+
+    def send_json(self, status: int, payload: dict, cacheable: bool = False):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = None
+        if cacheable:
+            etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache" if cacheable else "no-store")
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def create_server(data_dir: str, host: str = "127.0.0.1", port: int = 8080,
+                  cache_bytes: int = DEFAULT_CACHE_MB * 2 ** 20,
+                  reload_interval: float = DEFAULT_RELOAD_INTERVAL) -> ThreadingHTTPServer:
+    """创建查询服务（port=0 时由系统分配端口，见 server.server_address）"""
+    server = ThreadingHTTPServer((host, port), LookupRequestHandler)
+    server.daemon_threads = True
+    server.service = LookupService(data_dir, cache_bytes=cache_bytes, reload_interval=reload_interval)
+    return server
+
+
+def main():
+    """主函数"""
+    print("🌐 Meteora 盈利查询器 - 钱包/交易对查询服务\n")
+
+    parser = argparse.ArgumentParser(description="基于分片文件的本地查询API（LRU分片缓存、热更新、ETag）")
+    parser.add_argument('--data-dir', default="meteora_data", help="数据目录")
+    parser.add_argument('--host', default="127.0.0.1", help="监听地址")
+    parser.add_argument('--port', type=int, default=8080, help="监听端口")
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_MB, help="分片缓存的内存上限（MB）")
+    parser.add_argument('--reload-interval', type=float, default=DEFAULT_RELOAD_INTERVAL,
+                        help="检查数据是否更新的间隔（秒）")
+    args = parser.parse_args()
+
+    server = create_server(args.data_dir, args.host, args.port, cache_bytes=int(args.cache_mb * 2 ** 20),
+                           reload_interval=args.reload_interval)
+    host, port = server.server_address[:2]
+    print(f"✅ 监听 http://{host}:{port}")
+    print(f"   GET /wallet/<address>  GET /pool/<lbPair>  GET /health")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n⏹️  用户中断操作")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+pytest 公共夹具
+测试数据目录建在 pytest 的 tmp_path 下（每个测试独立，由 pytest 自动清理），
+数据获取器默认使用假的Dune客户端，不访问网络
+"""
+
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import MeteoraDataFetcher
+
+
+@pytest.fixture
+def make_data_dir(tmp_path):
+    """创建数据目录的工厂：同一个测试中每次调用返回一个新的空目录"""
+    counter = itertools.count()
+
+    def make() -> str:
+        path = tmp_path / f"meteora_data_{next(counter)}"
+        path.mkdir()
+        return str(path)
+
+    return make
+
+
+@pytest.fixture
+def data_dir(make_data_dir) -> str:
+    """测试用的数据目录"""
+    return make_data_dir()
+
+
+@pytest.fixture
+def make_fetcher(make_data_dir):
+    """
+    创建数据获取器的工厂
+
+    用法:
+        fetcher = make_fetcher()                                  # 查询 [1]，空的假客户端
+        fetcher = make_fetcher(rows_by_query={1: rows, 2: rows})  # 查询ID取自 rows_by_query
+        fetcher = make_fetcher([1, 2], data_dir=..., dune_client=client, compression=[])
+    未提供 data_dir 时每次调用使用一个新的目录
+    """
+    def make(query_ids=None, rows_by_query=None, data_dir=None, dune_client=None, **kwargs) -> MeteoraDataFetcher:
+        rows_by_query = rows_by_query or {}
+        if query_ids is None:
+            query_ids = list(rows_by_query) or [1]
+        if dune_client is None:
+            dune_client = FakeDuneClient(rows_by_query)
+        return MeteoraDataFetcher(list(query_ids), data_dir=data_dir or make_data_dir(), dune_client=dune_client,
+                                  **kwargs)
+
+    return make
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试用的Dune客户端替身
+模拟 DuneClient.get_latest_result / get_execution_results 的返回结构，不访问网络
+"""
+
+import json
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Dict, List
+
+
+class FakeDuneClient:
+    """按查询ID返回预设行数据的假Dune客户端"""
+
+    def __init__(self, rows_by_query: Dict[int, List[dict]], latency=0.0):
+        """
+        Args:
+            rows_by_query: 查询ID -> 行数据列表
+            latency: 每次请求模拟的网络延迟（秒），也可以是 查询ID -> 延迟 的字典
+        """
+        self.rows_by_query = rows_by_query
+        self.latency = latency
+        self.execution_ids = {}  # 查询ID -> 固定的执行ID，用于模拟“重新执行但结果相同”
+        self._content_ids = {}  # 查询ID -> (行数据列表, 行数, 由内容计算的执行ID)
+        self.calls = []
+        self.full_fetches = []  # 不带 sample_count 的完整结果请求（查询ID）
+        self.page_sizes = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def execution_id_for(self, query_id) -> str:
+        """
+        默认执行ID由行数据内容决定：数据变化时执行ID随之变化
+        内容哈希按查询缓存，行数据列表被替换（测试中 rows_by_query[qid] = ...）或行数变化时重新计算
+        """
+        if query_id in self.execution_ids:
+            return self.execution_ids[query_id]
+        rows = self.rows_by_query.get(query_id, [])
+        cached = self._content_ids.get(query_id)
+        if cached is not None and cached[0] is rows and cached[1] == len(rows):
+            return cached[2]
+        execution_id = f"exec_{query_id}_{zlib.crc32(json.dumps(rows, sort_keys=True).encode('utf-8')):08x}"
+        self._content_ids[query_id] = (rows, len(rows), execution_id)
+        return execution_id
+
+    def get_latest_result(self, query_id, sample_count=None, **kwargs):
+        with self._lock:
+            self.calls.append((query_id, time.monotonic()))
+            if sample_count is None:
+                self.full_fetches.append(query_id)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        try:
+            delay = self.latency.get(query_id, 0.0) if isinstance(self.latency, dict) else self.latency
+            if delay:
+                time.sleep(delay)
+
+            rows = self.rows_by_query.get(query_id, [])
+            if sample_count is not None:
+                rows = rows[:sample_count]
+            return SimpleNamespace(
+                query_id=query_id,
+                execution_id=self.execution_id_for(query_id),
+                result=SimpleNamespace(rows=rows, metadata=SimpleNamespace(total_row_count=len(rows)))
+            )
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def get_execution_results(self, job_id, limit=None, offset=None, **kwargs):
+        """按 limit/offset 分页返回结果，最后一页的 next_offset 为 None"""
+        query_id = int(job_id.split('_')[1])
+        rows = self.rows_by_query.get(query_id, [])
+        offset = offset or 0
+        end = len(rows) if limit is None else offset + limit
+        page_rows = rows[offset:end]
+
+        with self._lock:
+            self.page_sizes.append(len(page_rows))
+
+        return SimpleNamespace(
+            query_id=query_id,
+            execution_id=job_id,
+            result=SimpleNamespace(rows=page_rows, metadata=SimpleNamespace(total_row_count=len(rows))),
+            next_offset=end if end < len(rows) else None
+        )
+
+
+def make_rows(query_id: int, num_wallets: int = 20, pairs_per_wallet: int = 3) -> List[dict]:
+    """生成带有查询ID标记的行数据"""
+    rows = []
+    for w in range(num_wallets):
+        for p in range(pairs_per_wallet):
+            rows.append({
+                "evt_tx_signer": f"wallet_{w}",
+                "lbPair": f"pair_{(w + p) % 7}",
+                "source_query": query_id
+            })
+    return rows
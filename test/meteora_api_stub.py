@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试用的Meteora API替身
+在本地端口启动HTTP服务，模拟 /wallet/{wallet}/{lbPair}/earning 接口，不访问网络
+"""
+
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def expected_earning(wallet: str, lb_pair: str) -> float:
+    """由钱包和交易对决定的确定性手续费收入"""
+    return round(zlib.crc32(f"{wallet}/{lb_pair}".encode('utf-8')) % 100000 / 100, 2)
+
+
+class FakeMeteoraApi:
+    """本地Meteora API服务，支持keep-alive，统计请求数、连接数和最大并发数"""
+
+    def __init__(self, latency: float = 0.0, failing_pairs=(), status_overrides=None,
+                 max_concurrency: int = None, retry_after: float = None):
+        """
+        Args:
+            latency: 每个请求模拟的处理延迟（秒）
+            failing_pairs: 总是返回404的交易对
+            status_overrides: 可选的回调 (wallet, lb_pair, attempt) -> HTTP状态码，返回None表示正常响应
+            max_concurrency: 模拟限流：同时处理的请求超过该数量时返回429
+            retry_after: 429响应中的 Retry-After（秒）
+        """
+        self.latency = latency
+        self.failing_pairs = set(failing_pairs)
+        self.status_overrides = status_overrides
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.throttled = 0
+        self.requests = 0
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.attempts = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 支持连接复用
+            disable_nagle_algorithm = True  # 响应头和响应体分开写出，避免 Nagle + 延迟ACK 带来的40ms延迟
+
+            def setup(self):
+                super().setup()
+                with api._lock:
+                    api.connections += 1
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with api._lock:
+                    api.requests += 1
+                    api.active += 1
+                    api.max_active = max(api.max_active, api.active)
+                    throttled = api.max_concurrency is not None and api.active > api.max_concurrency
+                    if throttled:
+                        api.throttled += 1
+                try:
+                    if api.latency:
+                        time.sleep(api.latency)
+                    if throttled:
+                        status, body = 429, {"error": "too many requests"}
+                    else:
+                        status, body = api.respond(self.path)
+                finally:
+                    with api._lock:
+                        api.active -= 1
+
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                if status == 429 and api.retry_after is not None:
+                    self.send_header("Retry-After", str(api.retry_after))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def respond(self, path: str):
+        """返回 (状态码, 响应体)"""
+        parts = path.strip('/').split('/')
+        if len(parts) != 4 or parts[0] != "wallet" or parts[3] != "earning":
+            return 404, {"error": "not found"}
+
+        wallet, lb_pair = parts[1], parts[2]
+        with self._lock:
+            attempt = self.attempts[(wallet, lb_pair)] = self.attempts.get((wallet, lb_pair), 0) + 1
+
+        if lb_pair in self.failing_pairs:
+            return 404, {"error": "pair not found"}
+        if self.status_overrides:
+            status = self.status_overrides(wallet, lb_pair, attempt)
+            if status:
+                return status, {"error": f"HTTP {status}"}
+
+        return 200, {"total_fee_usd_claimed": expected_earning(wallet, lb_pair), "total_fee_x_claimed": 0}
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试用的模拟数据
+生成真实格式的Solana base58地址，以及带有交易对热度偏斜的钱包数据
+"""
+
+import random
+from typing import Dict, List
+
+import numpy as np
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def random_base58_address(rng: random.Random) -> str:
+    """生成随机的32字节公钥并按base58编码（长度32-44）"""
+    num = int.from_bytes(bytes(rng.getrandbits(8) for _ in range(32)), 'big')
+    chars = []
+    while num:
+        num, rem = divmod(num, 58)
+        chars.append(BASE58_ALPHABET[rem])
+    return ''.join(reversed(chars)) or BASE58_ALPHABET[0]
+
+
+def generate_addresses(count: int, seed: int = 0) -> List[str]:
+    """生成指定数量的不重复地址"""
+    rng = random.Random(seed)
+    addresses = set()
+    while len(addresses) < count:
+        addresses.add(random_base58_address(rng))
+    return sorted(addresses)
+
+
+def generate_wallet_data(num_wallets: int = 10000, num_pools: int = 2000, max_pairs: int = 10,
+                         seed: int = 0) -> Dict[str, List[str]]:
+    """
+    生成钱包 -> 交易对数据
+    交易对热度服从近似Zipf分布：少数热门池子被大量钱包引用
+    """
+    rng = random.Random(seed)
+    wallets = generate_addresses(num_wallets, seed=seed + 1)
+    pools = generate_addresses(num_pools, seed=seed + 2)
+    weights = [1.0 / (rank + 1) for rank in range(num_pools)]
+
+    wallet_data = {}
+    for wallet in wallets:
+        num_pairs = rng.randint(1, max_pairs)
+        wallet_data[wallet] = list(dict.fromkeys(rng.choices(pools, weights=weights, k=num_pairs)))
+    return wallet_data
+
+
+def generate_dune_rows(num_rows: int, num_queries: int = 3, duplicate_ratio: float = 0.1,
+                       seed: int = 0) -> Dict[int, List[dict]]:
+    """
+    生成模拟的Dune查询结果行（evt_tx_signer/lbPair），按查询ID拆分成多个批次
+
+    钱包活跃度和池子热度都服从近似Zipf分布；每个批次混入 duplicate_ratio 比例的
+    上一批次行，覆盖跨批次去重。返回 查询ID(1..num_queries) -> 行数据列表
+    """
+    rng = np.random.default_rng(seed)
+    num_wallets = max(num_rows // 8, 1)
+    num_pools = max(num_rows // 200, 10)
+
+    wallets = np.array(generate_addresses(num_wallets, seed=seed + 1), dtype=object)
+    pools = np.array(generate_addresses(num_pools, seed=seed + 2), dtype=object)
+
+    def zipf_choice(count: int, size: int, exponent: float) -> np.ndarray:
+        weights = 1.0 / np.arange(1, count + 1) ** exponent
+        return rng.choice(count, size=size, p=weights / weights.sum())
+
+    signers = wallets[zipf_choice(num_wallets, num_rows, 0.6)].tolist()
+    pairs = pools[zipf_choice(num_pools, num_rows, 1.0)].tolist()
+    rows = [{"evt_tx_signer": wallet, "lbPair": pair} for wallet, pair in zip(signers, pairs)]
+
+    rows_by_query = {}
+    bounds = np.linspace(0, num_rows, num_queries + 1).astype(int)
+    for i in range(num_queries):
+        batch = rows[bounds[i]:bounds[i + 1]]
+        if i > 0 and duplicate_ratio > 0:
+            previous = rows_by_query[i]
+            batch = batch + previous[:int(len(previous) * duplicate_ratio)]
+        rows_by_query[i + 1] = batch
+    return rows_by_query
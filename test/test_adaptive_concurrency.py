@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+测试手续费收入查询的自适应并发
+验证AIMD窗口的增减、限流时的退避与重试轮次，以及吞吐量统计
+
+用法（对比浏览器端固定批次调度与自适应调度的吞吐量）:
+    python test/test_adaptive_concurrency.py --pairs 600
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_api_stub import FakeMeteoraApi, expected_earning
+from meteora_earnings import AdaptiveConcurrencyController, MeteoraEarningsAggregator, backoff_delay
+
+
+def make_wallet_pairs(num_pairs: int, pairs_per_wallet: int = 10):
+    return {f"wallet{w}": [f"pool{w}_{p}" for p in range(pairs_per_wallet)]
+            for w in range(max(num_pairs // pairs_per_wallet, 1))}
+
+
+def test_additive_increase_and_multiplicative_decrease():
+    """成功时每个窗口约 +1，拥塞时减半，同一个往返时间内只减一次"""
+    controller = AdaptiveConcurrencyController(initial_window=4, max_window=32)
+    for _ in range(4):
+        controller.acquire()
+        controller.release(0.01)
+    assert 4.9 < controller.window < 5.0
+
+    window = controller.window
+    for _ in range(3):
+        controller.acquire()
+        controller.release(0.01, congested=True)
+    assert controller.window == window * 0.5
+    assert controller.throttled == 3 and controller.decreases == 1
+
+    # 持续拥塞时窗口不低于最小值
+    for _ in range(10):
+        controller._last_decrease = 0.0
+        controller.acquire()
+        controller.release(0.01, congested=True)
+    assert controller.window == controller.min_window == 1
+
+
+def test_high_latency_counts_as_congestion():
+    """延迟远高于最小延迟（且超过下限）时窗口缩小"""
+    controller = AdaptiveConcurrencyController(initial_window=8, latency_floor=0.05)
+    controller.acquire()
+    controller.release(0.01)
+    controller.acquire()
+    controller.release(0.02)  # 低于下限，不视为拥塞
+    window = controller.window
+    controller.acquire()
+    controller.release(0.2)
+    assert controller.window == window * 0.5
+
+
+def test_window_limits_in_flight_requests():
+    """并发请求数不超过当前窗口"""
+    controller = AdaptiveConcurrencyController(initial_window=3, max_window=3)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        controller.acquire()
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.pop()
+        controller.release(0.02)
+
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 3
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    """退避时间随尝试次数指数增长、带抖动、有上限，并遵守 Retry-After"""
+    delays = [backoff_delay(3, base=0.1, cap=0.5) for _ in range(200)]
+    assert all(0 <= delay <= 0.5 for delay in delays)
+    assert len(set(delays)) > 1
+    assert backoff_delay(0, base=0.1, cap=5, retry_after=2) >= 2
+
+
+def test_throttling_server_converges():
+    """服务端限流时窗口收缩，所有交易对最终成功，并报告吞吐量"""
+    wallet_pairs = make_wallet_pairs(300)
+    with FakeMeteoraApi(latency=0.01, max_concurrency=4, retry_after=0.05) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=32, initial_concurrency=16,
+                                               retries=4, backoff_base=0.02)
+        earnings = aggregator.fetch_wallet_earnings(wallet_pairs)
+
+    for wallet, pairs in wallet_pairs.items():
+        assert earnings[wallet] == [expected_earning(wallet, pair) for pair in pairs]
+
+    stats = aggregator.last_fetch_stats
+    assert api.throttled > 0 and stats["throttled"] == api.throttled
+    assert stats["succeeded"] == 300 and stats["pairs_per_second"] > 0
+    assert aggregator.controller.window < 16
+
+
+def test_throttled_stats_are_per_call():
+    """last_fetch_stats 的限流次数只统计本次 fetch_keys，不累计之前的调用"""
+    with FakeMeteoraApi(latency=0.01, max_concurrency=4, retry_after=0.05) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=32, initial_concurrency=16,
+                                               retries=4, backoff_base=0.02)
+        aggregator.fetch_wallet_earnings(make_wallet_pairs(200))
+        first_throttled = api.throttled
+        assert aggregator.last_fetch_stats["throttled"] == first_throttled > 0
+
+        aggregator.fetch_wallet_earnings({f"other_{wallet}": pairs for wallet, pairs in make_wallet_pairs(200).items()})
+        assert aggregator.last_fetch_stats["throttled"] == api.throttled - first_throttled
+        assert aggregator.controller.throttled == api.throttled
+
+
+def test_bounded_retry_pass():
+    """持续失败的交易对只重试有限次数；404 不重试"""
+    def always_503(wallet, lb_pair, attempt):
+        return 503 if lb_pair == "broken" else None
+
+    wallet_pairs = {"walletA": ["good", "broken", "missing"]}
+    with FakeMeteoraApi(status_overrides=always_503, failing_pairs={"missing"}) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, retries=2, retry_passes=1,
+                                               backoff_base=0.01)
+        earnings = aggregator.fetch_wallet_earnings(wallet_pairs)
+
+    assert earnings["walletA"] == [expected_earning("walletA", "good"), None, None]
+    assert api.attempts[("walletA", "broken")] == (2 + 1) * (1 + 1)
+    assert api.attempts[("walletA", "missing")] == 1
+    assert aggregator.last_fetch_stats["retried"] == 1
+
+
+def fixed_batch_schedule(aggregator, wallet_pairs, batch_size=5, pause=0.2):
+    """模拟 fees_checker.html 的调度：每批5个并发请求，批次之间暂停200毫秒"""
+    keys = [(wallet, pair) for wallet, pairs in wallet_pairs.items() for pair in pairs]
+    start = time.perf_counter()
+    for i in range(0, len(keys), batch_size):
+        threads = [threading.Thread(target=aggregator._request_earning, args=key) for key in keys[i:i + batch_size]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if i + batch_size < len(keys):
+            time.sleep(pause)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def run_comparison(num_pairs: int, latency: float, max_concurrency: int):
+    """对比固定批次调度与自适应调度的吞吐量"""
+    wallet_pairs = make_wallet_pairs(num_pairs)
+    print(f"📊 {num_pairs} 个交易对，服务端延迟 {latency * 1000:.0f} ms，超过 {max_concurrency} 个并发时返回429")
+
+    with FakeMeteoraApi(latency=latency, max_concurrency=max_concurrency) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=64)
+        fixed = fixed_batch_schedule(aggregator, wallet_pairs)
+    print(f"🐢 固定批次(5个/批 + 200ms): {fixed:.1f} 交易对/秒")
+
+    with FakeMeteoraApi(latency=latency, max_concurrency=max_concurrency) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=64)
+        aggregator.fetch_wallet_earnings(wallet_pairs)
+    stats = aggregator.last_fetch_stats
+    print(f"⚡ 自适应并发: {stats['pairs_per_second']:.1f} 交易对/秒（最终窗口 {stats['window']}，"
+          f"限流 {stats['throttled']} 次，失败 {stats['failed']} 个）")
+    print(f"🚀 加速比: {stats['pairs_per_second'] / fixed:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="自适应并发吞吐量对比")
+    parser.add_argument('--pairs', type=int, default=600, help="交易对数量")
+    parser.add_argument('--latency', type=float, default=0.05, help="服务端延迟（秒）")
+    parser.add_argument('--max-concurrency', type=int, default=24, help="服务端限流阈值")
+    parser.add_argument('--skip-tests', action='store_true', help="只运行吞吐量对比")
+    args = parser.parse_args()
+
+    if not args.skip_tests:
+        tests = [
+            test_additive_increase_and_multiplicative_decrease,
+            test_high_latency_counts_as_congestion,
+            test_window_limits_in_flight_requests,
+            test_backoff_delay_is_jittered_and_capped,
+            test_throttling_server_converges,
+            test_bounded_retry_pass,
+        ]
+        for test in tests:
+            test()
+            print(f"✅ {test.__name__}")
+
+    run_comparison(args.pairs, args.latency, args.max_concurrency)
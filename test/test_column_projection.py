@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+测试摄入时的列投影
+验证默认只保留 evt_tx_signer / lbPair（category 类型），extra_columns 中的列按需保留，
+"*" 保留全部列，投影后批次文件变小而钱包数据不变
+
+用法:
+    python test/test_column_projection.py
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_data_fetcher import MERGE_KEY_COLUMNS, concat_frames
+
+QUERY_IDS = [301, 302]
+
+
+def make_wide_rows(query_id: int, num_rows: int = 300) -> list:
+    """带多个未使用列的宽查询结果"""
+    return [{"block_time": f"2024-01-01 00:00:{i % 60:02d}", "evt_tx_signer": f"wallet_{i % 40}",
+             "amount": i * 1.5, "lbPair": f"pair_{(i + query_id) % 9}", "tx_hash": f"hash_{query_id}_{i}",
+             "memo": "x" * 40} for i in range(num_rows)]
+
+
+def create_fetcher(make_fetcher, extra_columns=None, rows_by_query=None):
+    rows_by_query = rows_by_query or {qid: make_wide_rows(qid) for qid in QUERY_IDS}
+    return make_fetcher(rows_by_query=rows_by_query, export_formats=["csv", "json"], extra_columns=extra_columns)
+
+
+def test_default_keeps_key_columns_as_category(make_fetcher):
+    """默认只保留必要列，且为 category 类型，值与原始行一致"""
+    fetcher = create_fetcher(make_fetcher)
+    df = fetcher.fetch_single_batch(QUERY_IDS[0], "batch_1")
+    rows = make_wide_rows(QUERY_IDS[0])
+
+    assert list(df.columns) == MERGE_KEY_COLUMNS
+    assert all(isinstance(df[col].dtype, pd.CategoricalDtype) for col in MERGE_KEY_COLUMNS)
+    assert df['evt_tx_signer'].tolist() == [row['evt_tx_signer'] for row in rows]
+    assert df['lbPair'].tolist() == [row['lbPair'] for row in rows]
+
+
+def test_extra_columns_opt_in(make_fetcher):
+    """extra_columns 中的列按查询结果中的顺序保留，不存在的列忽略；"*" 保留全部列"""
+    fetcher = create_fetcher(make_fetcher, ["amount", "block_time", "no_such_column"])
+    df = fetcher.fetch_single_batch(QUERY_IDS[0], "batch_1")
+    assert list(df.columns) == ["block_time", "evt_tx_signer", "amount", "lbPair"]
+    assert df['amount'].tolist() == [row['amount'] for row in make_wide_rows(QUERY_IDS[0])]
+
+    df = create_fetcher(make_fetcher, ["*"]).fetch_single_batch(QUERY_IDS[0], "batch_1")
+    assert list(df.columns) == list(make_wide_rows(QUERY_IDS[0])[0])
+    assert isinstance(df['lbPair'].dtype, pd.CategoricalDtype)
+
+
+def test_missing_required_column_returns_empty(make_fetcher):
+    rows = [{"evt_tx_signer": "wallet_1", "amount": 1}]
+    fetcher = create_fetcher(make_fetcher, ["*"], rows_by_query={qid: rows for qid in QUERY_IDS})
+    assert fetcher.fetch_single_batch(QUERY_IDS[0], "batch_1").empty
+
+
+def test_merged_frame_keeps_category(make_fetcher):
+    """不同批次的类别不同，合并后键列仍为 category"""
+    fetcher = create_fetcher(make_fetcher)
+    batches = [fetcher.fetch_single_batch(qid, f"batch_{i}") for i, qid in enumerate(QUERY_IDS)]
+    merged = fetcher.merge_batch_data(batches)
+    assert all(isinstance(merged[col].dtype, pd.CategoricalDtype) for col in MERGE_KEY_COLUMNS)
+
+    expected = pd.concat([batch.astype(object) for batch in batches], ignore_index=True)
+    expected = expected.drop_duplicates(subset=MERGE_KEY_COLUMNS, keep='first')
+    pd.testing.assert_frame_equal(merged.astype(object), expected)
+    assert concat_frames([batches[0]])['lbPair'].dtype == batches[0]['lbPair'].dtype
+
+
+def test_projection_shrinks_outputs_not_wallet_data(make_fetcher):
+    """投影后合并文件更小，钱包数据与保留全部列时一致（一次性获取和流式获取）"""
+    results = {}
+    for extra_columns in (None, ["*"]):
+        fetcher = create_fetcher(make_fetcher, extra_columns)
+        merged_df = fetcher.get_dune_data(delay_seconds=0, preserve_batches=False)
+        wallet_data = fetcher.process_wallet_data(merged_df)
+        size = os.path.getsize(os.path.join(fetcher.data_dir, "merged_dune_data.csv"))
+
+        streamed = create_fetcher(make_fetcher, extra_columns).stream_dune_data(
+            delay_seconds=0, preserve_batches=False, page_size=50)
+        results[extra_columns is None] = (wallet_data, size, merged_df.memory_usage(deep=True).sum())
+        assert {w: set(p) for w, p in streamed.items()} == {w: set(p) for w, p in wallet_data.items()}
+
+    projected, full = results[True], results[False]
+    assert projected[0] == full[0]
+    assert projected[1] * 3 < full[1]
+    assert projected[2] * 3 < full[2]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+测试列式二进制快照
+验证批次/合并数据和钱包状态快照可以无损还原，文本格式改为按需导出，并对比加载速度
+"""
+
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import make_rows
+from meteora_data_fetcher import WALLET_SNAPSHOT_FILE, load_columnar_snapshot, save_columnar_snapshot
+from synthetic_data import generate_wallet_data
+
+
+def as_strings(series):
+    return [None if pd.isna(value) else str(value) for value in series]
+
+
+def test_dataframe_snapshot_round_trip(data_dir):
+    """字符串、数值、空值和空字符串都能还原"""
+    df = pd.DataFrame({
+        "evt_tx_signer": ["w1", "w2", None, "w1", "钱包"],
+        "lbPair": ["p1", "p1", "p2", "", "p3"],
+        "amount": [1.5, np.nan, 3.0, 4.0, 5.0],
+        "block": [1, 2, 3, 4, 5]
+    })
+    path = os.path.join(data_dir, "data.npz")
+    save_columnar_snapshot(df, path)
+    loaded = load_columnar_snapshot(path)
+
+    assert list(loaded.columns) == list(df.columns)
+    assert isinstance(loaded['evt_tx_signer'].dtype, pd.CategoricalDtype)
+    assert as_strings(loaded['evt_tx_signer']) == as_strings(df['evt_tx_signer'])
+    assert as_strings(loaded['lbPair']) == as_strings(df['lbPair'])
+    assert loaded['amount'].equals(df['amount'])
+    assert loaded['block'].tolist() == df['block'].tolist()
+
+
+def test_snapshot_keeps_bool_datetime_and_nulls(data_dir):
+    """布尔列和时间列按原类型还原，空值不会变成字符串 "None" """
+    df = pd.DataFrame({
+        "success": [True, False, True, True],
+        "is_buy": [True, None, False, True],
+        "block_time": pd.to_datetime(["2024-01-01 00:00:01", None, "2024-03-01 12:30:00", "2024-04-01 00:00:00"]),
+        "block_time_utc": pd.to_datetime(["2024-01-01", "2024-02-01", None, "2024-04-01"]).tz_localize("UTC"),
+        "note": [None, "a", None, "b"]
+    })
+    path = os.path.join(data_dir, "data.npz")
+    save_columnar_snapshot(df, path)
+    with np.load(path) as snapshot:
+        assert "c1_bool" in snapshot and snapshot["c1_bool"].tolist() == [1, -1, 0, 1]
+        assert snapshot["c4_codes"].tolist() == [-1, 0, -1, 1]
+    loaded = load_columnar_snapshot(path)
+
+    assert loaded['success'].dtype == bool and loaded['success'].tolist() == df['success'].tolist()
+    assert loaded['is_buy'].dtype == "boolean"
+    assert loaded['is_buy'].tolist() == [True, pd.NA, False, True]
+    assert loaded['block_time'].equals(df['block_time'])
+    assert loaded['block_time_utc'].equals(df['block_time_utc'])
+    assert as_strings(loaded['note']) == [None, "a", None, "b"]
+
+
+def test_text_exports_are_opt_in(make_fetcher):
+    """默认只生成列式快照，CSV/JSON 需要显式开启"""
+    rows = {1: make_rows(1), 2: make_rows(2)}
+
+    fetcher = make_fetcher(rows_by_query=rows)
+    merged = fetcher.get_dune_data(delay_seconds=0, preserve_batches=False)
+    batch_dir = os.path.join(fetcher.batch_data_dir, "batch_1_1")
+    assert sorted(os.listdir(batch_dir)) == ["batch_1_1.npz", "batch_1_1_summary.json"]
+    assert not os.path.exists(os.path.join(fetcher.data_dir, "merged_dune_data.csv"))
+
+    reloaded = load_columnar_snapshot(os.path.join(fetcher.data_dir, "merged_dune_data.npz"))
+    assert reloaded['lbPair'].astype(str).tolist() == merged['lbPair'].tolist()
+    assert fetcher.process_wallet_data(reloaded) == fetcher.process_wallet_data(merged)
+
+    fetcher = make_fetcher(export_formats=["csv", "json"], rows_by_query=rows)
+    fetcher.get_dune_data(delay_seconds=0, preserve_batches=False)
+    assert os.path.exists(os.path.join(fetcher.batch_data_dir, "batch_1_1", "batch_1_1.csv"))
+    assert os.path.exists(os.path.join(fetcher.data_dir, "merged_dune_data.json"))
+
+
+def test_wallet_snapshot_reload_is_faster_than_json_backup(make_fetcher):
+    """累积模式优先从列式快照加载，结果与JSON备份一致且更快"""
+    wallet_data = generate_wallet_data(50000, num_pools=3000)
+    fetcher = make_fetcher()
+    fetcher.compact_wallet_changes(wallet_data)
+
+    assert os.path.exists(os.path.join(fetcher.data_dir, WALLET_SNAPSHOT_FILE))
+
+    start = time.perf_counter()
+    from_snapshot = fetcher.load_existing_wallet_data()
+    snapshot_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(os.path.join(fetcher.data_dir, "full_wallet_data_backup.json"), 'r', encoding='utf-8') as f:
+        from_backup = json.load(f)
+    backup_seconds = time.perf_counter() - start
+
+    snapshot_size = os.path.getsize(os.path.join(fetcher.data_dir, WALLET_SNAPSHOT_FILE))
+    backup_size = os.path.getsize(os.path.join(fetcher.data_dir, "full_wallet_data_backup.json"))
+    print(f"\n⚡ 列式快照: {snapshot_seconds:.3f} 秒, {snapshot_size / 1024 / 1024:.1f} MB")
+    print(f"🐢 JSON备份: {backup_seconds:.3f} 秒, {backup_size / 1024 / 1024:.1f} MB")
+
+    assert from_snapshot == from_backup == wallet_data
+    assert snapshot_size < backup_size
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
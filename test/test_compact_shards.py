@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+测试 compact 分片格式
+验证池子字典编码可以无损还原，并对比与原格式的文件大小
+"""
+
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_data_fetcher import build_shard_data, decode_shard_wallets
+from synthetic_data import generate_wallet_data
+
+
+def shard_bytes(data_dir):
+    return sum(os.path.getsize(path) for path in glob.glob(os.path.join(data_dir, "wallets_*.json")))
+
+
+def test_compact_round_trip(make_fetcher):
+    """compact 分片解码后与原始数据一致"""
+    wallet_data = generate_wallet_data(3000, num_pools=200)
+    shard = json.loads(json.dumps(build_shard_data("00", wallet_data, "compact")))
+
+    assert shard["group_info"]["format"] == "compact"
+    assert decode_shard_wallets(shard) == wallet_data
+
+    fetcher = make_fetcher()
+    fetcher.save_optimized_data(wallet_data, shard_format="compact")
+    for wallet, pairs in wallet_data.items():
+        assert fetcher.lookup_wallet_pairs(wallet) == pairs
+
+
+def test_incremental_update_keeps_compact_format(make_fetcher):
+    """增量更新沿用现有的 compact 格式"""
+    wallet_data = generate_wallet_data(500, num_pools=50)
+    fetcher = make_fetcher()
+    fetcher.save_optimized_data(wallet_data, shard_format="compact")
+
+    wallet = next(iter(wallet_data))
+    fetcher.apply_incremental_update({wallet: ["brand_new_pool"], "new_wallet": ["brand_new_pool"]})
+
+    assert fetcher.lookup_wallet_pairs(wallet) == wallet_data[wallet] + ["brand_new_pool"]
+    assert fetcher.lookup_wallet_pairs("new_wallet") == ["brand_new_pool"]
+    for path in glob.glob(os.path.join(fetcher.data_dir, "wallets_*.json")):
+        with open(path, 'r', encoding='utf-8') as f:
+            assert "pools" in json.load(f)
+
+
+def test_compact_format_is_smaller(make_fetcher):
+    """报告两种格式的总大小，compact 格式明显更小"""
+    wallet_data = generate_wallet_data(20000, num_pools=2000)
+
+    json_fetcher = make_fetcher()
+    json_fetcher.save_optimized_data(wallet_data, max_wallets_per_file=2000)
+    compact_fetcher = make_fetcher()
+    compact_fetcher.save_optimized_data(wallet_data, max_wallets_per_file=2000, shard_format="compact")
+
+    json_size = shard_bytes(json_fetcher.data_dir)
+    compact_size = shard_bytes(compact_fetcher.data_dir)
+    print(f"\n📦 json 格式: {json_size / 1024:.1f} KB")
+    print(f"📦 compact 格式: {compact_size / 1024:.1f} KB ({compact_size / json_size:.1%})")
+
+    assert compact_size < json_size * 0.75
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+测试预压缩副本
+验证每个发布的 JSON 文件都有可还原的 .gz（安装 brotli 时还有 .br）副本、metadata 中的原始和压缩大小、
+增量发布只重新压缩被重写的文件，并输出各类文件的压缩率
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_compression import COMPRESSED_SUFFIXES, available_encodings, decompress_bytes
+from meteora_data_fetcher import MeteoraDataFetcher
+from synthetic_data import generate_wallet_data
+
+WALLET_DATA = generate_wallet_data(num_wallets=3000, num_pools=300, max_pairs=6, seed=11)
+FIRST_RUN = [{"evt_tx_signer": wallet, "lbPair": pair} for wallet, pairs in WALLET_DATA.items() for pair in pairs]
+SECOND_RUN = [{"evt_tx_signer": "1" * 44, "lbPair": "newpool"}]
+
+
+def run(data_dir, rows, incremental=False, compression=("gzip", "brotli")):
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}),
+                                 compression=list(compression))
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, incremental=incremental)
+    return fetcher
+
+
+def json_files(directory):
+    files = []
+    for root, _, names in os.walk(directory):
+        files += [os.path.join(root, name) for name in names if name.endswith(".json")]
+    return files
+
+
+def test_round_trip_and_metadata_sizes(data_dir):
+    """每个 JSON 文件的压缩副本都能还原出原文件，metadata 记录的大小与实际文件一致"""
+    fetcher = run(data_dir, FIRST_RUN)
+    encodings = available_encodings()
+
+    raw_bytes = 0
+    compressed_bytes = dict.fromkeys(encodings, 0)
+    for path in json_files(fetcher.output_dir):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        for encoding in encodings:
+            with open(path + COMPRESSED_SUFFIXES[encoding], 'rb') as f:
+                compressed = f.read()
+            assert decompress_bytes(compressed, encoding) == raw, path
+            if not path.endswith("metadata.json"):
+                compressed_bytes[encoding] += len(compressed)
+        if not path.endswith("metadata.json"):
+            raw_bytes += len(raw)
+
+    compression = fetcher._load_metadata()["compression"]
+    assert compression["encodings"] == encodings
+    assert compression["raw_bytes"] == raw_bytes
+    assert compression["compressed_bytes"] == compressed_bytes
+    assert {"wallets_*.json", "pools_*.json", "wallet_prefix/*.json", "wallet_prefix_index.json"} <= set(
+        compression["groups"])
+
+    print()
+    for group, sizes in sorted(compression["groups"].items()):
+        ratios = "  ".join(f"{encoding} {sizes[encoding] / sizes['raw']:6.1%}" for encoding in encodings)
+        print(f"   {group:<28} {sizes['files']:>4} 个文件  {sizes['raw'] / 1024:>9.1f} KB  {ratios}")
+
+    shards = compression["groups"]["wallets_*.json"]
+    assert shards["gzip"] < shards["raw"] * 0.8
+
+
+def test_incremental_publish_recompresses_rewritten_files(data_dir):
+    """增量发布时未变化文件的压缩副本随硬链接继承，被重写的文件重新压缩"""
+    first_dir = run(data_dir, FIRST_RUN, compression=["gzip"]).output_dir
+    fetcher = run(data_dir, SECOND_RUN, incremental=True, compression=["gzip"])
+
+    rewritten = 0
+    for path in json_files(fetcher.output_dir):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        with open(path + ".gz", 'rb') as f:
+            assert decompress_bytes(f.read(), "gzip") == raw, path
+
+        previous = os.path.join(first_dir, os.path.relpath(path, fetcher.output_dir))
+        if os.path.exists(previous) and os.path.samefile(previous, path):
+            assert os.path.samefile(previous + ".gz", path + ".gz")
+        else:
+            rewritten += 1
+
+    assert 0 < rewritten < len(json_files(fetcher.output_dir)) / 2
+    assert fetcher._load_metadata()["total_wallets"] == len(WALLET_DATA) + 1
+
+
+def test_compression_disabled(data_dir):
+    """compression 为空时不生成压缩副本"""
+    fetcher = run(data_dir, FIRST_RUN[:50], compression=[])
+    assert not [name for name in os.listdir(fetcher.output_dir) if not name.endswith(".json") and
+                os.path.isfile(os.path.join(fetcher.output_dir, name))]
+    assert "compression" not in fetcher._load_metadata()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试并发批次获取
+使用假Dune客户端验证并发上限、令牌桶限速、批次保存和合并顺序
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient, make_rows
+from meteora_data_fetcher import TokenBucket
+
+
+def create_fetcher(make_fetcher, query_ids, latency=0.0):
+    """创建使用假客户端的数据获取器"""
+    client = FakeDuneClient({qid: make_rows(qid) for qid in query_ids}, latency=latency)
+    return make_fetcher(query_ids, dune_client=client, extra_columns=["source_query"]), client
+
+
+def test_concurrent_fetch_keeps_query_order(make_fetcher):
+    """后提交的查询先完成时，返回顺序仍与 query_ids 一致"""
+    query_ids = [101, 102, 103, 104, 105, 106]
+    latency = {qid: 0.02 * (len(query_ids) - i) for i, qid in enumerate(query_ids)}
+    fetcher, client = create_fetcher(make_fetcher, query_ids, latency=latency)
+
+    batches = fetcher.fetch_all_batches(delay_seconds=0, preserve_batches=False, max_workers=3)
+
+    assert [df['source_query'].iloc[0] for df in batches] == query_ids
+    assert 1 < client.max_active <= 3
+
+    # 每个批次仍然单独保存
+    for i, query_id in enumerate(query_ids):
+        batch_name = f"batch_{i + 1}_{query_id}"
+        assert os.path.exists(os.path.join(fetcher.batch_data_dir, batch_name, f"{batch_name}.npz"))
+
+    # 合并去重保留第一个批次的数据
+    merged = fetcher.merge_batch_data(batches)
+    assert set(merged['source_query']) == {query_ids[0]}
+
+
+def test_rate_limit_spaces_requests(make_fetcher):
+    """令牌桶限速生效，请求间隔不小于 1 / rate"""
+    query_ids = [1, 2, 3, 4]
+    fetcher, client = create_fetcher(make_fetcher, query_ids)
+
+    fetcher.fetch_all_batches(preserve_batches=False, max_workers=4, rate_limit=20)
+
+    call_times = sorted(t for _, t in client.calls)
+    assert call_times[-1] - call_times[0] >= 0.05 * (len(query_ids) - 1) * 0.9
+
+
+def test_token_bucket_allows_burst():
+    """令牌桶容量内的请求不需要等待"""
+    bucket = TokenBucket(rate=1, capacity=3)
+    start = time.monotonic()
+    for _ in range(3):
+        assert bucket.acquire() == 0
+    assert time.monotonic() - start < 0.5
+
+
+def test_token_bucket_rejects_oversized_request():
+    """请求的令牌数超过容量时立即报错，而不是无限等待"""
+    bucket = TokenBucket(rate=100, capacity=2)
+    with pytest.raises(ValueError):
+        bucket.acquire(3)
+    assert bucket.acquire(2) == 0
+
+
+def test_sequential_mode_unchanged(make_fetcher):
+    """max_workers=1 时逐个获取"""
+    query_ids = [7, 8, 9]
+    fetcher, client = create_fetcher(make_fetcher, query_ids, latency=0.01)
+
+    batches = fetcher.fetch_all_batches(delay_seconds=0, preserve_batches=False)
+
+    assert len(batches) == 3
+    assert client.max_active == 1
+    assert [qid for qid, _ in client.calls] == query_ids
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
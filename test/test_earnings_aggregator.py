@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+测试服务端手续费收入聚合
+用本地HTTP服务模拟Meteora API，验证并发查询、连接复用、失败处理以及写入分片文件的结果
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_api_stub import FakeMeteoraApi, expected_earning
+from meteora_data_fetcher import decode_shard_wallets
+from meteora_earnings import MeteoraEarningsAggregator
+from synthetic_data import generate_wallet_data
+
+
+def create_storage(make_fetcher, wallet_data, shard_format="json"):
+    fetcher = make_fetcher()
+    fetcher.save_optimized_data(wallet_data, max_files=4, max_wallets_per_file=1000, shard_format=shard_format)
+    return fetcher
+
+
+def read_shards(data_dir):
+    shards = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.startswith("wallets_") and filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                shards.append(json.load(f))
+    return shards
+
+
+def test_fetch_wallet_earnings_concurrent_and_pooled():
+    """并发查询结果与交易对顺序一致，并复用连接"""
+    wallet_data = generate_wallet_data(num_wallets=20, num_pools=30, max_pairs=6, seed=3)
+    total_pairs = sum(len(pairs) for pairs in wallet_data.values())
+
+    with FakeMeteoraApi(latency=0.02) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=8)
+        earnings = aggregator.fetch_wallet_earnings(wallet_data)
+
+    for wallet, pairs in wallet_data.items():
+        assert earnings[wallet] == [expected_earning(wallet, pair) for pair in pairs]
+    assert api.requests == total_pairs
+    assert api.max_active > 1, "请求没有并发执行"
+    assert api.connections <= 8, f"连接没有复用: {api.connections} 个连接"
+
+
+def test_failed_pairs_are_null():
+    """失败的交易对记为 None，不影响其他交易对"""
+    wallet_data = {"walletA": ["good", "bad"], "walletB": ["bad"]}
+    with FakeMeteoraApi(failing_pairs={"bad"}) as api:
+        earnings = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=4).fetch_wallet_earnings(wallet_data)
+
+    assert earnings == {"walletA": [expected_earning("walletA", "good"), None], "walletB": [None]}
+
+
+def test_server_errors_are_retried():
+    """5xx 响应按重试策略重新请求"""
+    def flaky(wallet, lb_pair, attempt):
+        return 503 if attempt == 1 else None
+
+    with FakeMeteoraApi(status_overrides=flaky) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=2, retries=2)
+        earnings = aggregator.fetch_wallet_earnings({"walletA": ["pool1", "pool2"]})
+
+    assert earnings["walletA"] == [expected_earning("walletA", "pool1"), expected_earning("walletA", "pool2")]
+    assert api.requests == 4
+
+
+def test_annotate_shards_json_and_compact(make_fetcher):
+    """写入分片的 earnings 与交易对顺序对齐，两种分片格式相同，并记录在元数据中"""
+    wallet_data = generate_wallet_data(num_wallets=50, num_pools=40, max_pairs=5, seed=4)
+
+    for shard_format in ("json", "compact"):
+        fetcher = create_storage(make_fetcher, wallet_data, shard_format)
+        with FakeMeteoraApi() as api:
+            stats = MeteoraEarningsAggregator(fetcher.data_dir, base_url=api.base_url).annotate_shards()
+
+        assert stats["wallets"] == len(wallet_data) and stats["failed_pairs"] == 0
+        for shard in read_shards(fetcher.data_dir):
+            assert "earnings_updated" in shard["group_info"]
+            for wallet, pairs in decode_shard_wallets(shard).items():
+                assert shard["earnings"][wallet] == [expected_earning(wallet, pair) for pair in pairs]
+
+        metadata = fetcher._load_metadata()
+        assert metadata["earnings"]["pairs"] == sum(len(pairs) for pairs in wallet_data.values())
+        assert metadata["sharding"]["shard_count"] == fetcher.shard_count
+
+
+def test_annotate_selected_wallets_and_incremental_update(make_fetcher):
+    """只更新指定钱包；增量更新保留已有收入并为新交易对补 null"""
+    wallet_data = {"walletA": ["pool1", "pool2"], "walletB": ["pool3"]}
+    fetcher = create_storage(make_fetcher, wallet_data)
+
+    with FakeMeteoraApi() as api:
+        MeteoraEarningsAggregator(fetcher.data_dir, base_url=api.base_url).annotate_shards(["walletA"])
+    assert api.requests == 2
+
+    fetcher.apply_incremental_update({"walletA": ["pool4"]})
+    earnings = {}
+    for shard in read_shards(fetcher.data_dir):
+        earnings.update(shard.get("earnings", {}))
+
+    assert earnings == {"walletA": [expected_earning("walletA", "pool1"), expected_earning("walletA", "pool2"), None]}
+    assert fetcher.lookup_wallet_pairs("walletA") == ["pool1", "pool2", "pool4"]
+
+
+def test_full_rewrite_keeps_earnings(make_fetcher):
+    """全量重写分片（包括改变分片数）保留已有收入，按新的交易对顺序对齐，新交易对补 null"""
+    wallet_data = generate_wallet_data(num_wallets=50, num_pools=40, max_pairs=5, seed=5)
+    fetcher = make_fetcher(compression=[])
+    with fetcher.publishing():
+        fetcher.save_optimized_data(wallet_data, max_files=4, max_wallets_per_file=1000)
+    with FakeMeteoraApi() as api:
+        MeteoraEarningsAggregator(fetcher.data_dir, base_url=api.base_url).annotate_shards()
+
+    wallet = next(iter(wallet_data))
+    updated = dict(wallet_data, new_wallet=["pool_x"])
+    updated[wallet] = ["pool_x"] + wallet_data[wallet]
+    with fetcher.publishing():
+        fetcher.save_optimized_data(updated, max_files=8, max_wallets_per_file=1000, shard_format="compact")
+
+    earnings = {}
+    for shard in read_shards(fetcher.output_dir):
+        earnings.update(shard.get("earnings", {}))
+        if shard.get("earnings"):
+            assert shard["group_info"]["earnings_updated"]
+
+    assert set(earnings) == set(wallet_data)
+    assert earnings[wallet] == [None] + [expected_earning(wallet, pair) for pair in wallet_data[wallet]]
+    for other in list(wallet_data)[1:]:
+        assert earnings[other] == [expected_earning(other, pair) for pair in wallet_data[other]]
+    assert fetcher._load_metadata()["earnings"]["wallets"] == len(wallet_data)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
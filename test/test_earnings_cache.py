@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+测试手续费收入缓存
+验证TTL过期、按访问时间淘汰、缓存命中时不再请求API，以及只刷新活跃/过期交易对的刷新任务
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_api_stub import FakeMeteoraApi, expected_earning
+from meteora_data_fetcher import MeteoraDataFetcher, shard_filename, wallet_shard_id
+from meteora_earnings import EARNINGS_CACHE_FILE, EarningsCache, MeteoraEarningsAggregator
+
+
+class FakeClock:
+    """可手动拨动的时钟"""
+
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def create_cache(data_dir, clock, **kwargs):
+    path = os.path.join(data_dir, EARNINGS_CACHE_FILE)
+    return EarningsCache(path, clock=clock, **kwargs)
+
+
+def test_ttl_and_persistence(data_dir):
+    """超过TTL的记录不再命中；缓存在重新打开后仍然存在"""
+    clock = FakeClock()
+    cache = create_cache(data_dir, clock, ttl_seconds=60)
+    cache.put_many([("walletA", "pool1", 1.5), ("walletA", "pool2", 0.0)])
+
+    assert cache.get_many([("walletA", "pool1"), ("walletA", "pool2"), ("walletB", "pool1")]) == {
+        ("walletA", "pool1"): 1.5, ("walletA", "pool2"): 0.0}
+
+    reopened = EarningsCache(cache.path, ttl_seconds=60, clock=clock)
+    assert len(reopened) == 2
+
+    clock.now += 61
+    assert reopened.get_many([("walletA", "pool1")]) == {}
+    assert reopened.stale_keys([("walletB", "pool1"), ("walletA", "pool1")]) == [("walletB", "pool1"),
+                                                                                ("walletA", "pool1")]
+
+
+def test_size_bounded_eviction(data_dir):
+    """超过容量时淘汰最久未访问的记录"""
+    clock = FakeClock()
+    cache = create_cache(data_dir, clock, max_entries=3)
+    for i in range(3):
+        clock.now += 1
+        cache.put_many([("wallet", f"pool{i}", float(i))])
+
+    clock.now += 1
+    cache.get_many([("wallet", "pool0")])  # pool0 最近被访问，pool1 成为最久未访问
+    clock.now += 1
+    cache.put_many([("wallet", "pool3", 3.0)])
+
+    assert len(cache) == 3
+    assert set(cache.get_many([("wallet", f"pool{i}") for i in range(4)])) == {
+        ("wallet", "pool0"), ("wallet", "pool2"), ("wallet", "pool3")}
+
+
+def test_cached_pairs_are_not_requested(data_dir):
+    """同一个钱包查询两次，第二次全部命中缓存；失败的结果不写入缓存"""
+    wallet_data = {"walletA": ["pool1", "pool2", "bad"], "walletB": ["pool1"]}
+    cache = create_cache(data_dir, FakeClock())
+
+    with FakeMeteoraApi(failing_pairs={"bad"}) as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, max_workers=4, cache=cache)
+        first = aggregator.fetch_wallet_earnings(wallet_data)
+        assert api.requests == 4
+
+        second = aggregator.fetch_wallet_earnings(wallet_data)
+        assert api.requests == 5, "只有失败的交易对需要重新请求"
+
+    assert first == second
+    assert second["walletA"] == [expected_earning("walletA", "pool1"), expected_earning("walletA", "pool2"), None]
+    assert aggregator.last_stats == {"cache_hits": 3, "requests": 1}
+
+
+def test_refresh_only_stale_and_active(data_dir):
+    """刷新任务只请求近期活跃以及缺失/过期的交易对"""
+    clock = FakeClock()
+    cache = create_cache(data_dir, clock, ttl_seconds=100)
+    wallet_data = {"walletA": ["pool1", "pool2"], "walletB": ["pool3"], "walletC": ["pool4"]}
+
+    clock.now = 0
+    cache.put_many([("walletA", "pool1", 0.0)])       # 将会过期
+    clock.now = 150
+    cache.put_many([("walletA", "pool2", 0.0), ("walletB", "pool3", 0.0)])  # 未过期
+    clock.now = 200
+
+    with FakeMeteoraApi() as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, cache=cache)
+        stats = aggregator.refresh_earnings(wallet_data, active_data={"walletB": ["pool3"]})
+
+    assert set(api.attempts) == {("walletA", "pool1"), ("walletC", "pool4"), ("walletB", "pool3")}
+    assert stats["stale_pairs"] == 2 and stats["active_pairs"] == 1 and stats["refreshed_pairs"] == 3
+    assert cache.get_many([("walletB", "pool3")]) == {("walletB", "pool3"): expected_earning("walletB", "pool3")}
+
+    # max_pairs 限制本次查询数量，活跃交易对优先
+    clock.now = 1000
+    with FakeMeteoraApi() as api:
+        aggregator = MeteoraEarningsAggregator(base_url=api.base_url, cache=cache)
+        stats = aggregator.refresh_earnings(wallet_data, active_data={"walletC": ["pool4"]}, max_pairs=2)
+    assert stats["refreshed_pairs"] == 2 and ("walletC", "pool4") in api.attempts
+
+
+def test_run_data_fetch_refreshes_earnings(data_dir):
+    """run_data_fetch 存储完成后刷新缓存并把手续费收入写入分片"""
+    rows = [{"evt_tx_signer": f"wallet{i}", "lbPair": f"pool{i % 3}"} for i in range(10)]
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}))
+    cache = EarningsCache(os.path.join(data_dir, EARNINGS_CACHE_FILE))
+
+    with FakeMeteoraApi() as api:
+        aggregator = MeteoraEarningsAggregator(data_dir, base_url=api.base_url, cache=cache)
+        fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, earnings_aggregator=aggregator)
+
+    assert api.requests == 10, "刷新后写入分片应全部命中缓存"
+    assert len(cache) == 10
+    stage = [stage for stage in fetcher.metrics.stages if stage["name"] == "refresh_earnings"][0]
+    assert stage["active_pairs"] == 10 and stage["annotated_pairs"] == 10
+
+
+def test_refresh_rewrites_only_changed_shards(data_dir):
+    """刷新后只重写活跃/重新查询过的钱包所在的分片，其余分片仍是上一版本的硬链接"""
+    wallet_data = {f"wallet{i}": [f"pool{i % 5}"] for i in range(40)}
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({}), compression=[])
+    with fetcher.publishing():
+        fetcher.save_optimized_data(wallet_data, max_files=8)
+    cache = EarningsCache(os.path.join(data_dir, EARNINGS_CACHE_FILE))
+
+    with FakeMeteoraApi() as api:
+        aggregator = MeteoraEarningsAggregator(data_dir, base_url=api.base_url, cache=cache)
+        aggregator.annotate_shards()
+        previous_dir = fetcher.output_dir
+        with fetcher.publishing(inherit=True):
+            fetcher.refresh_shard_earnings(aggregator, {"wallet3": ["pool3"]})
+
+    stage = [stage for stage in fetcher.metrics.stages if stage["name"] == "refresh_earnings"][0]
+    assert stage["annotated_shards"] == 1 and stage["annotated_pairs"] == 1
+    assert api.requests == 40 + 1
+
+    rewritten = [name for name in os.listdir(fetcher.output_dir) if name.startswith("wallets_")
+                 and not os.path.samefile(os.path.join(fetcher.output_dir, name), os.path.join(previous_dir, name))]
+    assert rewritten == [shard_filename(wallet_shard_id("wallet3", fetcher.shard_count), fetcher.shard_count)]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+测试版本化发布
+验证每次运行写入新的版本目录并原子切换 current.json、增量运行不修改旧版本、
+失败的运行不影响当前版本，以及旧版本的回收
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import (CURRENT_POINTER_FILE, GENERATIONS_DIR, WALLET_SNAPSHOT_FILE, GenerationPublisher,
+                                  MeteoraDataFetcher, published_dir, read_pool_wallets)
+
+
+def rows_for(wallets, pairs):
+    return [{"evt_tx_signer": wallet, "lbPair": pair} for wallet in wallets for pair in pairs]
+
+
+FIRST_RUN = rows_for([f"{c}wallet{i}" for c in "0123abcdXY" for i in range(5)], ["poolA", "poolB"])
+SECOND_RUN = rows_for(["1wallet0", "1wallet1"], ["poolC"]) + rows_for(["ewallet0"], ["poolD"])
+
+
+def run(data_dir, rows, incremental=False, keep_generations=3):
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}),
+                                 keep_generations=keep_generations)
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, incremental=incremental, use_result_cache=False)
+    return fetcher
+
+
+def read_tree(path):
+    """目录树中所有文件的内容"""
+    contents = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            filepath = os.path.join(root, name)
+            with open(filepath, 'rb') as f:
+                contents[os.path.relpath(filepath, path)] = f.read()
+    return contents
+
+
+def generations(data_dir):
+    return sorted(os.listdir(os.path.join(data_dir, GENERATIONS_DIR)))
+
+
+def test_run_publishes_generation(data_dir):
+    """输出文件写入版本目录，current.json 指向它，状态文件仍在数据目录中"""
+    fetcher = run(data_dir, FIRST_RUN)
+
+    with open(os.path.join(data_dir, CURRENT_POINTER_FILE), 'r', encoding='utf-8') as f:
+        pointer = json.load(f)
+    assert pointer["path"] == f"{GENERATIONS_DIR}/000001"
+    assert published_dir(data_dir) == fetcher.output_dir == os.path.join(data_dir, GENERATIONS_DIR, "000001")
+
+    assert os.path.exists(os.path.join(fetcher.output_dir, "metadata.json"))
+    assert not os.path.exists(os.path.join(data_dir, "metadata.json"))
+    assert os.path.exists(os.path.join(data_dir, "full_wallet_data_backup.json"))
+    assert not [name for name in os.listdir(fetcher.output_dir) if name.endswith(".tmp")]
+    assert set(fetcher.lookup_wallet_pairs("1wallet0")) == {"poolA", "poolB"}
+
+
+def test_incremental_run_keeps_previous_generation_intact(data_dir):
+    """增量运行用硬链接继承未变化的文件，替换的文件不会修改上一个版本"""
+    first_dir = run(data_dir, FIRST_RUN).output_dir
+    before = read_tree(first_dir)
+
+    fetcher = run(data_dir, SECOND_RUN, incremental=True)
+    assert fetcher.output_dir != first_dir
+    assert read_tree(first_dir) == before
+
+    after = read_tree(fetcher.output_dir)
+    unchanged = [name for name in before if after.get(name) == before[name]]
+    assert unchanged and set(after) >= set(before)
+    for name in unchanged:
+        assert os.stat(os.path.join(first_dir, name)).st_ino == os.stat(os.path.join(fetcher.output_dir, name)).st_ino
+
+    assert set(fetcher.lookup_wallet_pairs("1wallet0")) == {"poolA", "poolB", "poolC"}
+    assert read_pool_wallets(data_dir, "poolD") == ["ewallet0"]
+
+
+def test_failed_run_keeps_current_generation(data_dir):
+    """写入中途失败时删除未发布的版本目录，current.json 仍指向上一个版本"""
+    first_dir = run(data_dir, FIRST_RUN).output_dir
+    before = read_tree(first_dir)
+
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: SECOND_RUN}))
+
+    def fail(*args, **kwargs):
+        raise IOError("磁盘已满")
+
+    fetcher.create_pool_index = fail
+    try:
+        fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, use_result_cache=False)
+        assert False, "写入失败应当抛出异常"
+    except IOError:
+        pass
+
+    assert published_dir(data_dir) == first_dir
+    assert generations(data_dir) == ["000001"]
+    assert read_tree(first_dir) == before
+    assert fetcher.lookup_wallet_pairs("ewallet0") is None
+
+
+def test_garbage_collection_and_legacy_layout(data_dir):
+    """只保留最近的版本；旧布局（数据目录中直接存放输出文件）在首次发布后被清理"""
+    legacy = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({}))
+    legacy.save_optimized_data({"legacy": ["poolL"]})
+    assert published_dir(data_dir) == data_dir
+    assert legacy.lookup_wallet_pairs("legacy") == ["poolL"]
+
+    # 中断的运行遗留的未发布目录在下次开始时删除
+    os.makedirs(os.path.join(data_dir, GENERATIONS_DIR, "000007"))
+
+    for i in range(4):
+        fetcher = run(data_dir, rows_for([f"wallet{i}"], ["poolA"]), keep_generations=2)
+
+    assert generations(data_dir) == ["000003", "000004"]
+    assert published_dir(data_dir) == fetcher.output_dir
+    assert not [name for name in os.listdir(data_dir) if name.startswith("wallets_") or name == "metadata.json"]
+    assert fetcher.lookup_wallet_pairs("wallet3") == ["poolA"]
+    assert GenerationPublisher(data_dir, keep=2).collect_garbage() == []
+
+
+class FailingWallets(dict):
+    """逐个钱包写入到第 fail_after 个时抛出异常，模拟写备份途中进程退出"""
+
+    def __init__(self, data, fail_after):
+        super().__init__(data)
+        self.fail_after = fail_after
+
+    def items(self):
+        for i, item in enumerate(super().items()):
+            if i == self.fail_after:
+                raise IOError("磁盘已满")
+            yield item
+
+
+def test_interrupted_compaction_keeps_backup_and_snapshot(data_dir):
+    """写备份途中失败：备份和列式快照仍是上一次的完整内容，没有被截断"""
+    fetcher = run(data_dir, FIRST_RUN)
+    backup_file = os.path.join(data_dir, "full_wallet_data_backup.json")
+    before = read_tree(data_dir)
+    expected = fetcher.load_existing_wallet_data().to_dict()
+
+    new_data = dict(expected, new_wallet=["poolN"])
+    with pytest.raises(IOError):
+        fetcher.compact_wallet_changes(FailingWallets(new_data, fail_after=10))
+
+    for name in ("full_wallet_data_backup.json", WALLET_SNAPSHOT_FILE):
+        assert read_tree(data_dir)[name] == before[name]
+    with open(backup_file, 'r', encoding='utf-8') as f:
+        assert json.load(f) == expected
+
+
+def test_unreadable_backup_is_not_replaced_with_empty_data(data_dir):
+    """旧数据目录（只有JSON备份、没有快照）的备份被截断时报错，而不是从空数据集开始并覆盖备份"""
+    run(data_dir, FIRST_RUN)
+    os.remove(os.path.join(data_dir, WALLET_SNAPSHOT_FILE))
+    backup_file = os.path.join(data_dir, "full_wallet_data_backup.json")
+    with open(backup_file, 'rb') as f:
+        truncated = f.read()[:200]
+    with open(backup_file, 'wb') as f:
+        f.write(truncated)
+
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: SECOND_RUN}))
+    with pytest.raises(ValueError):
+        fetcher.load_existing_wallet_data()
+    with pytest.raises(ValueError):
+        fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, use_result_cache=False)
+
+    with open(backup_file, 'rb') as f:
+        assert f.read() == truncated
+    assert generations(data_dir) == ["000001"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+测试增量累积模式
+验证增量更新只重写受影响的分组文件，结果与全量累积一致，并把增量写入变更日志
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import (WALLET_CHANGES_FILE, MeteoraDataFetcher, published_dir, shard_filename,
+                                  wallet_shard_id)
+
+
+def rows_for(wallets, pairs):
+    return [{"evt_tx_signer": wallet, "lbPair": pair} for wallet in wallets for pair in pairs]
+
+
+# 第一次运行：钱包分布在多个分片中
+FIRST_RUN = rows_for([f"{c}wallet{i}" for c in "0123abcdXY" for i in range(5)], ["poolA", "poolB"])
+# 第二次运行：两个已有钱包新增交易对，以及一个新钱包
+SECOND_RUN = rows_for(["1wallet0", "1wallet1"], ["poolA", "poolC"]) + rows_for(["ewallet0"], ["poolD"])
+
+
+def run(data_dir, rows, incremental, use_result_cache=True):
+    client = FakeDuneClient({1: rows})
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=client)
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, incremental=incremental,
+                           use_result_cache=use_result_cache)
+    return fetcher
+
+
+def read_shards(data_dir):
+    data_dir = published_dir(data_dir)
+    shards = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.startswith("wallets_") and filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                shards[filename] = {w: set(p) for w, p in json.load(f)['wallets'].items()}
+    return shards
+
+
+def test_incremental_matches_full_accumulation(make_data_dir):
+    """增量更新后的分组文件与全量累积结果一致"""
+    full_dir = make_data_dir()
+    run(full_dir, FIRST_RUN, incremental=False)
+    run(full_dir, SECOND_RUN, incremental=False)
+
+    incremental_dir = make_data_dir()
+    first_dir = run(incremental_dir, FIRST_RUN, incremental=False).output_dir
+    mtimes = {name: os.stat(os.path.join(first_dir, name)).st_mtime_ns
+              for name in read_shards(incremental_dir)}
+    fetcher = run(incremental_dir, SECOND_RUN, incremental=True)
+
+    assert read_shards(incremental_dir) == read_shards(full_dir)
+
+    # 只有受影响的分片文件被重写，其余文件与上一个版本共享硬链接
+    shard_count = fetcher._load_metadata()["sharding"]["shard_count"]
+    affected = {shard_filename(wallet_shard_id(wallet, shard_count), shard_count)
+                for wallet in ("1wallet0", "1wallet1", "ewallet0")}
+    rewritten = {name for name, mtime in mtimes.items()
+                 if os.stat(os.path.join(fetcher.output_dir, name)).st_mtime_ns != mtime}
+    assert rewritten == affected & set(mtimes)
+    assert len(rewritten) < len(mtimes)
+
+    assert fetcher.lookup_wallet_pairs("ewallet0") == ["poolD"]
+
+    with open(os.path.join(fetcher.output_dir, "metadata.json"), 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    with open(os.path.join(published_dir(full_dir), "metadata.json"), 'r', encoding='utf-8') as f:
+        full_metadata = json.load(f)
+    assert metadata["total_wallets"] == full_metadata["total_wallets"]
+    assert metadata["total_pairs"] == full_metadata["total_pairs"]
+
+    # 变更日志只记录增量，回放后与全量数据一致
+    with open(os.path.join(incremental_dir, WALLET_CHANGES_FILE), 'r', encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == 1
+    assert {w: set(p) for w, p in entries[0]["changes"].items()} == {
+        "1wallet0": {"poolC"}, "1wallet1": {"poolC"}, "ewallet0": {"poolD"}
+    }
+
+    replayed = {w: set(p) for w, p in fetcher.load_existing_wallet_data().items()}
+    merged = {}
+    for shard in read_shards(full_dir).values():
+        merged.update(shard)
+    assert replayed == merged
+
+
+def test_full_run_compacts_change_log(data_dir):
+    """全量运行会把变更日志并入备份文件"""
+    run(data_dir, FIRST_RUN, incremental=False)
+    run(data_dir, SECOND_RUN, incremental=True)
+    assert os.path.exists(os.path.join(data_dir, WALLET_CHANGES_FILE))
+
+    # 结果未变化时会被缓存跳过，这里强制全量运行
+    run(data_dir, SECOND_RUN, incremental=False, use_result_cache=False)
+    assert not os.path.exists(os.path.join(data_dir, WALLET_CHANGES_FILE))
+
+    with open(os.path.join(data_dir, "full_wallet_data_backup.json"), 'r', encoding='utf-8') as f:
+        backup = json.load(f)
+    assert set(backup["1wallet0"]) == {"poolA", "poolB", "poolC"}
+
+
+def test_oversized_shard_triggers_reshard(make_data_dir):
+    """增量更新使分片超过单文件钱包数上限时全量重新分片"""
+    fetcher = MeteoraDataFetcher([1], data_dir=make_data_dir(),
+                                 dune_client=FakeDuneClient({}), compression=[])
+    initial = {f"wallet{i}": ["poolA"] for i in range(20)}
+    with fetcher.publishing():
+        fetcher.save_optimized_data(initial, max_files=4, max_wallets_per_file=10)
+    initial_shards = fetcher._load_metadata()["sharding"]["shard_count"]
+
+    added = {f"new_wallet{i}": ["poolB"] for i in range(60)}
+    with fetcher.publishing(inherit=True):
+        stats = fetcher.apply_incremental_update(added)
+
+    metadata = fetcher._load_metadata()
+    assert stats["resharded"] and stats["total_wallets"] == 80
+    assert metadata["sharding"]["shard_count"] > initial_shards
+    shards = read_shards(fetcher.data_dir)
+    assert len(shards) == metadata["total_files"]
+    assert max(len(wallets) for wallets in shards.values()) <= 10
+    assert fetcher.lookup_wallet_pairs("new_wallet7") == ["poolB"]
+    assert set(fetcher.lookup_pool_wallets("poolA")) == set(initial)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
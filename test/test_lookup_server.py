@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+测试本地查询服务
+验证 /wallet 和 /pool 的结果与 lookup_wallet_pairs / lookup_pool_wallets 一致，
+LRU 分片缓存遵守内存上限，发布新版本后热更新，以及 ETag/304
+
+用法:
+    python test/test_lookup_server.py
+"""
+
+import http.client
+import json
+import os
+import sys
+import threading
+from urllib.parse import quote
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_server import LookupService, create_server, etag_matches
+from synthetic_data import generate_wallet_data
+
+WALLET_DATA = generate_wallet_data(3000, num_pools=300, max_pairs=6, seed=25)
+
+
+def publish(make_fetcher, wallet_data, data_dir=None, shard_format="json"):
+    fetcher = make_fetcher(data_dir=data_dir, compression=[])
+    with fetcher.publishing():
+        fetcher.save_optimized_data(wallet_data, max_files=16, max_wallets_per_file=200, shard_format=shard_format)
+    return fetcher
+
+
+def test_lookups_match_fetcher(make_fetcher):
+    """钱包和交易对查询与数据获取器的查找结果一致（json 和 compact 分片）"""
+    for shard_format in ("json", "compact"):
+        fetcher = publish(make_fetcher, WALLET_DATA, shard_format=shard_format)
+        service = LookupService(fetcher.data_dir)
+        for wallet in list(WALLET_DATA)[:200]:
+            assert service.wallet_pairs(wallet) == fetcher.lookup_wallet_pairs(wallet)
+        for pool in {pairs[0] for pairs in list(WALLET_DATA.values())[:100]}:
+            assert service.pool_wallets(pool) == fetcher.lookup_pool_wallets(pool)
+        assert service.wallet_pairs("missing") is None and service.pool_wallets("missing") is None
+        assert service.cache.hits > 0
+
+
+def test_cache_respects_memory_cap(make_fetcher):
+    """缓存总大小不超过上限，超出时淘汰最久未使用的分片"""
+    fetcher = publish(make_fetcher, WALLET_DATA)
+    unbounded = LookupService(fetcher.data_dir)
+    for wallet in WALLET_DATA:
+        unbounded.wallet_pairs(wallet)
+    total = unbounded.cache.bytes
+
+    service = LookupService(fetcher.data_dir, cache_bytes=total // 4)
+    for wallet in WALLET_DATA:
+        assert service.wallet_pairs(wallet) == WALLET_DATA[wallet]
+        assert service.cache.bytes <= total // 4 or len(service.cache) == 1
+    stats = service.cache.stats()
+    assert stats["evictions"] > 0 and stats["shards"] < len(unbounded.cache)
+
+
+def test_hot_reload_on_new_generation(make_fetcher):
+    """发布新版本后，下一次检查时切换到新数据并清空缓存"""
+    fetcher = publish(make_fetcher, WALLET_DATA)
+    service = LookupService(fetcher.data_dir, reload_interval=0)
+    wallet = list(WALLET_DATA)[0]
+    assert service.wallet_pairs(wallet) == WALLET_DATA[wallet]
+    assert service.wallet_pairs("new_wallet") is None
+
+    updated = dict(WALLET_DATA, new_wallet=["new_pool"])
+    updated[wallet] = WALLET_DATA[wallet] + ["new_pool"]
+    publish(make_fetcher, updated, data_dir=fetcher.data_dir)
+
+    assert service.wallet_pairs("new_wallet") == ["new_pool"]
+    assert service.wallet_pairs(wallet)[-1] == "new_pool"
+    assert service.pool_wallets("new_pool") == [wallet, "new_wallet"]
+    assert service.reloads == 2
+
+
+def test_http_endpoints_and_etag(make_fetcher, data_dir):
+    """HTTP 接口：200 + ETag，匹配的 If-None-Match 返回 304，未知地址 404，未发布时 503"""
+    empty_server = create_server(data_dir, port=0)
+    fetcher = publish(make_fetcher, WALLET_DATA)
+    server = create_server(fetcher.data_dir, port=0)
+    threads = [threading.Thread(target=s.serve_forever, daemon=True) for s in (server, empty_server)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        conn = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+        wallet = list(WALLET_DATA)[5]
+
+        conn.request("GET", f"/wallet/{quote(wallet)}")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read()) == {"wallet": wallet, "pairs": WALLET_DATA[wallet]}
+        etag = response.getheader("ETag")
+        assert etag and etag_matches(f'W/"x", {etag}', etag)
+
+        conn.request("GET", f"/wallet/{quote(wallet)}", headers={"If-None-Match": etag})
+        response = conn.getresponse()
+        assert response.status == 304 and response.read() == b""
+
+        pool = WALLET_DATA[wallet][0]
+        conn.request("GET", f"/pool/{quote(pool)}")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read())["wallets"] == fetcher.lookup_pool_wallets(pool)
+
+        for path in ("/wallet/missing", "/pool/missing", "/unknown"):
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            assert response.status == 404
+
+        conn.request("GET", "/health")
+        health = json.loads(conn.getresponse().read())
+        assert health["status"] == "ok" and health["cache"]["shards"] >= 1
+
+        empty_conn = http.client.HTTPConnection(*empty_server.server_address[:2], timeout=10)
+        empty_conn.request("GET", f"/wallet/{quote(wallet)}")
+        response = empty_conn.getresponse()
+        response.read()
+        assert response.status == 503
+    finally:
+        for s in (server, empty_server):
+            s.shutdown()
+            s.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
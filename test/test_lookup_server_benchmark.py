@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+本地查询服务压测
+用合成数据生成分片文件，在子进程中启动 meteora_server.py，多个客户端线程通过保持的连接发送请求：
+钱包查询按近似Zipf分布选择热门钱包，另有一部分交易对查询和带 If-None-Match 的重新验证（304）。
+输出每秒请求数、p50/p99 延迟和分片缓存命中率
+
+用法:
+    python test/test_lookup_server_benchmark.py                          # 默认 100k 个钱包
+    python test/test_lookup_server_benchmark.py --sizes 1M --requests 50000 --concurrency 16 --cache-mb 64
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import MeteoraDataFetcher
+from synthetic_data import generate_wallet_data
+from test_pipeline_benchmark import format_size, parse_size
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "meteora_server.py")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(data_dir: str, cache_mb: float, timeout: float = 60.0):
+    """在子进程中启动查询服务，等待 /health 可用后返回 (进程, 端口)"""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT, "--data-dir", data_dir, "--port", str(port),
+                                "--cache-mb", str(cache_mb)], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            return process, port
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("查询服务启动失败")
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("等待查询服务启动超时")
+
+
+def build_requests(wallet_data: dict, num_requests: int, pool_ratio: float, revalidate_ratio: float,
+                   seed: int = 0) -> list:
+    """生成请求序列：(路径, 是否带 If-None-Match)，钱包热度近似Zipf分布"""
+    rng = random.Random(seed)
+    wallets = list(wallet_data)
+    rng.shuffle(wallets)
+    weights = [1.0 / (rank + 1) for rank in range(len(wallets))]
+    pools = list({pool for pairs in wallet_data.values() for pool in pairs})
+
+    requests = []
+    for wallet in rng.choices(wallets, weights=weights, k=num_requests):
+        if rng.random() < pool_ratio:
+            requests.append((f"/pool/{quote(rng.choice(pools))}", False))
+        else:
+            requests.append((f"/wallet/{quote(wallet)}", rng.random() < revalidate_ratio))
+    return requests
+
+
+def run_clients(port: int, requests: list, concurrency: int) -> dict:
+    """多个客户端线程各自保持一个连接，按顺序发送分到的请求，统计每个请求的延迟"""
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+
+    def client(worker: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        etags = {}
+        for path, revalidate in requests[worker::concurrency]:
+            headers = {"If-None-Match": etags[path]} if revalidate and path in etags else {}
+            start = time.perf_counter()
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            latencies[worker].append(time.perf_counter() - start)
+            statuses[worker][response.status] = statuses[worker].get(response.status, 0) + 1
+            if response.getheader("ETag"):
+                etags[path] = response.getheader("ETag")
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    all_latencies = np.concatenate([np.asarray(values) for values in latencies]) * 1000
+    status_counts = {}
+    for counts in statuses:
+        for status, count in counts.items():
+            status_counts[status] = status_counts.get(status, 0) + count
+    return {
+        "requests": len(all_latencies),
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(all_latencies) / seconds, 1),
+        "p50_ms": round(float(np.percentile(all_latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(all_latencies, 99)), 3),
+        "statuses": {str(status): count for status, count in sorted(status_counts.items())}
+    }
+
+
+def run_benchmark(num_wallets: int, num_requests: int = 20000, concurrency: int = 8, cache_mb: float = 256,
+                  pool_ratio: float = 0.1, revalidate_ratio: float = 0.2, seed: int = 0) -> dict:
+    """
+    生成分片文件并压测查询服务
+
+    Returns:
+        dict: 请求数、耗时、每秒请求数、p50/p99 延迟（毫秒）、各状态码数量和缓存统计
+    """
+    wallet_data = generate_wallet_data(num_wallets, num_pools=max(num_wallets // 50, 10), seed=seed)
+    with tempfile.TemporaryDirectory(prefix="meteora_bench_") as data_dir:
+        fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({}), compression=[])
+        with fetcher.publishing():
+            fetcher.save_optimized_data(wallet_data)
+
+        requests = build_requests(wallet_data, num_requests, pool_ratio, revalidate_ratio, seed=seed)
+        process, port = start_server(fetcher.data_dir, cache_mb)
+        try:
+            result = run_clients(port, requests, concurrency)
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            conn.request("GET", "/health")
+            result["cache"] = json.loads(conn.getresponse().read())["cache"]
+        finally:
+            process.terminate()
+            process.wait()
+    result["wallets"] = num_wallets
+    result["shards"] = fetcher.shard_count
+    return result
+
+
+def print_result(size: str, result: dict):
+    cache = result["cache"]
+    print(f"\n📊 {size} 个钱包，{result['shards']} 个分片，{result['requests']:,} 个请求")
+    print(f"   {result['requests_per_second']:>10,.1f} 请求/秒  p50 {result['p50_ms']:.2f} ms  "
+          f"p99 {result['p99_ms']:.2f} ms  状态码 {result['statuses']}")
+    print(f"   缓存: {cache['shards']} 个分片 {cache['bytes'] / 2 ** 20:.1f} MB / {cache['max_bytes'] / 2 ** 20:.0f} MB，"
+          f"命中率 {cache['hit_rate']:.1%}，淘汰 {cache['evictions']}")
+
+
+def test_benchmark_smoke():
+    """小规模压测：所有请求都成功（200/304），有重新验证命中 304"""
+    result = run_benchmark(5000, num_requests=2000, concurrency=4)
+    assert result["requests"] == 2000
+    assert set(result["statuses"]) <= {"200", "304"}
+    assert result["statuses"].get("304", 0) > 0
+    assert result["p99_ms"] > 0 and result["cache"]["hit_rate"] > 0.5
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地查询服务压测")
+    parser.add_argument('--sizes', default="100k", help="逗号分隔的钱包数，如 100k,1M")
+    parser.add_argument('--requests', type=int, default=20000, help="总请求数")
+    parser.add_argument('--concurrency', type=int, default=8, help="客户端连接数")
+    parser.add_argument('--cache-mb', type=float, default=256, help="服务端分片缓存上限（MB）")
+    parser.add_argument('--pool-ratio', type=float, default=0.1, help="交易对查询的比例")
+    parser.add_argument('--revalidate-ratio', type=float, default=0.2, help="带 If-None-Match 的钱包查询比例")
+    args = parser.parse_args()
+
+    for size_text in args.sizes.split(','):
+        num_wallets = parse_size(size_text)
+        print(f"⏳ 压测 {format_size(num_wallets)} 个钱包...")
+        print_result(format_size(num_wallets), run_benchmark(num_wallets, args.requests, args.concurrency,
+                                                             args.cache_mb, args.pool_ratio,
+                                                             args.revalidate_ratio))
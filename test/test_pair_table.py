@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试整数编码的钱包-交易对表
+验证 WalletPairTable 与字典形式的转换、合并、转置和按分片拆分的结果与原来的字典实现一致，
+以及累积模式下快照、合并和分片文件的输出不变
+"""
+
+import json
+import os
+import pickle
+import sys
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import WALLET_SNAPSHOT_FILE, MeteoraDataFetcher, wallet_shard_ids
+from meteora_pair_table import WalletPairTable
+from synthetic_data import generate_wallet_data
+
+WALLET_DATA = generate_wallet_data(3000, num_pools=200, max_pairs=8, seed=21)
+
+
+def test_mapping_round_trip():
+    """表实现只读 Mapping 接口，转换回字典后顺序和内容都不变"""
+    table = WalletPairTable.from_mapping(WALLET_DATA)
+    wallet = list(WALLET_DATA)[7]
+
+    assert table == WALLET_DATA
+    assert list(table.items()) == list(WALLET_DATA.items())
+    assert table[wallet] == WALLET_DATA[wallet]
+    assert wallet in table and "missing" not in table
+    assert table.total_pairs == sum(len(pairs) for pairs in WALLET_DATA.values())
+    assert table.pool_ids.dtype == np.int32
+    assert pickle.loads(pickle.dumps(table)) == WALLET_DATA
+
+
+def test_merge_matches_dict_merge():
+    """合并：已有交易对在前、新交易对追加，新钱包按出现顺序追加"""
+    wallets = list(WALLET_DATA)
+    new_data = {wallets[0]: ["newpool", WALLET_DATA[wallets[0]][0]], "newwallet": ["b", "a", "b"]}
+
+    expected = {wallet: list(pairs) for wallet, pairs in WALLET_DATA.items()}
+    expected[wallets[0]].append("newpool")
+    expected["newwallet"] = ["b", "a"]
+
+    merged = WalletPairTable.from_mapping(WALLET_DATA).merge(new_data)
+    assert list(merged.items()) == list(expected.items())
+
+
+def test_transpose_and_shard_groups():
+    """转置与逐个追加构建的反向索引一致，按分片拆分与逐个分配一致"""
+    table = WalletPairTable.from_mapping(WALLET_DATA)
+
+    pool_wallets = defaultdict(list)
+    for wallet, pairs in WALLET_DATA.items():
+        for pair in pairs:
+            pool_wallets[pair].append(wallet)
+    assert list(table.transpose().items()) == list(pool_wallets.items())
+
+    shard_ids = wallet_shard_ids(list(WALLET_DATA), 13)
+    groups = defaultdict(dict)
+    for (wallet, pairs), shard_id in zip(WALLET_DATA.items(), shard_ids.tolist()):
+        groups[shard_id][wallet] = pairs
+    assert [(shard_id, group.to_dict()) for shard_id, group in table.shard_groups(shard_ids)] == \
+        sorted(groups.items())
+
+
+def test_accumulated_run_uses_tables(data_dir):
+    """累积模式：快照直接读成表，合并后写出的备份、快照和分片与字典一致"""
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({}))
+    fetcher.compact_wallet_changes(WALLET_DATA)
+
+    with open(os.path.join(data_dir, "full_wallet_data_backup.json"), 'r', encoding='utf-8') as f:
+        text = f.read()
+    assert text == json.dumps(WALLET_DATA, indent=2, ensure_ascii=False)
+
+    existing = fetcher.load_existing_wallet_data()
+    assert isinstance(existing, WalletPairTable)
+    assert existing == WALLET_DATA
+    assert fetcher.load_wallet_snapshot(os.path.join(data_dir, WALLET_SNAPSHOT_FILE)) == WALLET_DATA
+
+    rows = [{"evt_tx_signer": "1" * 44, "lbPair": "poolN"}, {"evt_tx_signer": list(WALLET_DATA)[0], "lbPair": "poolN"}]
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}))
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, use_result_cache=False)
+
+    assert fetcher.lookup_wallet_pairs("1" * 44) == ["poolN"]
+    assert fetcher.lookup_wallet_pairs(list(WALLET_DATA)[0])[-1] == "poolN"
+    assert fetcher._load_metadata()["total_pairs"] == sum(len(pairs) for pairs in WALLET_DATA.values()) + 2
+    assert len(fetcher.load_existing_wallet_data()) == len(WALLET_DATA) + 1
+
+
+def test_empty_table():
+    empty = WalletPairTable.empty()
+    assert empty == {} and not empty and empty.total_pairs == 0
+    assert list(empty.shard_groups(np.zeros(0, dtype=np.int64))) == []
+    assert empty.merge({"w": ["p"]}) == {"w": ["p"]}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+WalletPairTable vs 字典 内存基准
+用同一份 Dune 行数据分别构建：
+- Dict[str, List[str]]（process_wallet_data 的输出）
+- Dict[str, set]（merge_wallet_data 原来的合并结构）
+- WalletPairTable（整数编码的 CSR 表）
+用 tracemalloc 统计每种结构在行数据之外额外占用的内存，以及构建和合并的耗时
+
+用法:
+    python test/test_pair_table_benchmark.py                     # 默认 100k,1M 行
+    python test/test_pair_table_benchmark.py --sizes 1M,5M
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_pair_table import WalletPairTable
+from synthetic_data import generate_dune_rows
+from test_pipeline_benchmark import format_size, parse_size
+
+
+def measure(build):
+    """返回 (结果, 结果占用的字节数, 构建耗时)"""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        result = build()
+        seconds = time.perf_counter() - start
+        return result, tracemalloc.get_traced_memory()[0], seconds
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(num_rows: int, num_queries: int = 2, seed: int = 0) -> dict:
+    """
+    生成行数据，对比三种结构的内存和耗时；合并耗时为把第二个查询合并进第一个查询
+
+    Returns:
+        dict: 钱包数、交易对引用数，以及每种结构的字节数、每个引用的字节数和耗时
+    """
+    rows_by_query = generate_dune_rows(num_rows, num_queries=num_queries, seed=seed)
+    frames = [pd.DataFrame(rows).astype(object) for rows in rows_by_query.values()]
+    df = pd.concat(frames, ignore_index=True)
+    del rows_by_query
+
+    table, table_bytes, table_seconds = measure(
+        lambda: WalletPairTable.from_columns(df['evt_tx_signer'], df['lbPair']))
+    lists, list_bytes, list_seconds = measure(table.to_dict)
+    sets, set_bytes, set_seconds = measure(lambda: {wallet: set(pairs) for wallet, pairs in lists.items()})
+
+    parts = [WalletPairTable.from_columns(frame['evt_tx_signer'], frame['lbPair']) for frame in frames]
+    start = time.perf_counter()
+    merged_table = parts[0].merge(parts[1])
+    table_merge_seconds = time.perf_counter() - start
+
+    dict_parts = [part.to_dict() for part in parts]
+    start = time.perf_counter()
+    merged_sets = {wallet: set(pairs) for wallet, pairs in dict_parts[0].items()}
+    for wallet, pairs in dict_parts[1].items():
+        merged_sets.setdefault(wallet, set()).update(pairs)
+    dict_merge_seconds = time.perf_counter() - start
+    assert merged_table.total_pairs == sum(len(pairs) for pairs in merged_sets.values())
+
+    pairs = table.total_pairs
+    assert pairs == sum(len(value) for value in lists.values()) == sum(len(value) for value in sets.values())
+    return {
+        "rows": len(df),
+        "wallets": len(table),
+        "pairs": pairs,
+        "structures": {
+            "dict_of_lists": {"bytes": list_bytes, "seconds": round(list_seconds, 3)},
+            "dict_of_sets": {"bytes": set_bytes, "seconds": round(set_seconds, 3),
+                             "merge_seconds": round(dict_merge_seconds, 3)},
+            "pair_table": {"bytes": table_bytes, "seconds": round(table_seconds, 3),
+                           "merge_seconds": round(table_merge_seconds, 3)}
+        }
+    }
+
+
+def print_result(size: str, result: dict):
+    print(f"\n📊 {size} 行，{result['wallets']:,} 个钱包，{result['pairs']:,} 个钱包-交易对引用")
+    for name, stats in result["structures"].items():
+        merge = f"  合并 {stats['merge_seconds']:.3f} 秒" if "merge_seconds" in stats else ""
+        print(f"   {name:<14} {stats['bytes'] / 2 ** 20:>9.1f} MB  {stats['bytes'] / result['pairs']:>7.1f} 字节/引用  "
+              f"构建 {stats['seconds']:.3f} 秒{merge}")
+
+
+def test_benchmark_smoke():
+    """小规模对比：表占用的内存明显小于两种字典结构"""
+    result = run_benchmark(50000)
+    structures = result["structures"]
+    assert structures["pair_table"]["bytes"] * 2 < structures["dict_of_lists"]["bytes"]
+    assert structures["pair_table"]["bytes"] * 2 < structures["dict_of_sets"]["bytes"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WalletPairTable vs 字典 内存基准")
+    parser.add_argument('--sizes', default="100k,1M", help="逗号分隔的行数，如 100k,1M")
+    args = parser.parse_args()
+
+    for size_text in args.sizes.split(','):
+        num_rows = parse_size(size_text)
+        print(f"⏳ 运行 {format_size(num_rows)} 行...")
+        print_result(format_size(num_rows), run_benchmark(num_rows))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+fetch → 索引 全流程基准
+用假Dune客户端驱动真实的 MeteoraDataFetcher.run_data_fetch，按 run_metrics.json 统计
+从 fetch_all_batches 到 save_optimized_data 每个阶段的耗时和内存，并与基线结果对比
+
+每个数据规模在独立子进程中运行，峰值内存互不影响。
+
+用法:
+    python test/test_pipeline_benchmark.py                          # 默认 10k,100k,1M，与基线对比
+    python test/test_pipeline_benchmark.py --sizes 10k,100k,1M,10M --streaming
+    python test/test_pipeline_benchmark.py --update-baseline        # 把本次结果写为新基线
+    python test/test_pipeline_benchmark.py --check                  # 出现回归时以非0状态退出
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import RUN_METRICS_FILE, MeteoraDataFetcher
+from synthetic_data import generate_dune_rows
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+# 阶段耗时超过基线的倍数且绝对差值超过阈值时视为回归
+DEFAULT_TOLERANCE = 1.5
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def parse_size(text: str) -> int:
+    """解析 10k / 1M / 2500000 形式的行数"""
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1], 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def format_size(num_rows: int) -> str:
+    """把行数格式化为基线中使用的键"""
+    if num_rows >= 1000000 and num_rows % 1000000 == 0:
+        return f"{num_rows // 1000000}M"
+    if num_rows >= 1000 and num_rows % 1000 == 0:
+        return f"{num_rows // 1000}k"
+    return str(num_rows)
+
+
+def run_pipeline(num_rows: int, streaming: bool = False, num_queries: int = 3) -> dict:
+    """
+    在当前进程中生成数据并运行一次完整流程
+
+    Returns:
+        dict: 基准结果（数据规模、生成耗时、run_metrics 中的各阶段指标）
+    """
+    start = time.perf_counter()
+    rows_by_query = generate_dune_rows(num_rows, num_queries=num_queries)
+    generate_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory(prefix="meteora_bench_") as data_dir:
+        fetcher = MeteoraDataFetcher(list(rows_by_query), data_dir=data_dir,
+                                     dune_client=FakeDuneClient(rows_by_query))
+        fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, accumulate_data=False, streaming=streaming)
+
+        with open(os.path.join(data_dir, RUN_METRICS_FILE), 'r', encoding='utf-8') as f:
+            metrics = json.load(f)
+
+    return {
+        "rows": sum(len(rows) for rows in rows_by_query.values()),
+        "streaming": streaming,
+        "generate_seconds": round(generate_seconds, 3),
+        "total_wall_seconds": metrics["total_wall_seconds"],
+        "peak_rss_mb": metrics["peak_rss_mb"],
+        "stages": {stage["name"]: {key: stage[key] for key in
+                                   ("wall_seconds", "cpu_seconds", "peak_rss_mb", "peak_rss_growth_mb")
+                                   if key in stage}
+                   for stage in metrics["stages"]}
+    }
+
+
+def run_in_subprocess(num_rows: int, streaming: bool) -> dict:
+    """在子进程中运行单个规模，避免不同规模之间的峰值内存互相干扰"""
+    output_file = tempfile.mktemp(prefix="meteora_bench_", suffix=".json")
+    command = [sys.executable, os.path.abspath(__file__), "--single", str(num_rows), "--output", output_file]
+    if streaming:
+        command.append("--streaming")
+
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(output_file, 'r', encoding='utf-8') as f:
+        result = json.load(f)
+    os.remove(output_file)
+    return result
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    对比本次结果与基线，返回回归列表
+
+    Returns:
+        list: (规模, 阶段, 基线耗时, 本次耗时)
+    """
+    regressions = []
+    for size, result in results.items():
+        base = baseline.get("results", {}).get(size)
+        if not base or base.get("streaming") != result["streaming"]:
+            continue
+        for stage, stats in result["stages"].items():
+            base_seconds = base["stages"].get(stage, {}).get("wall_seconds")
+            if base_seconds is None:
+                continue
+            seconds = stats["wall_seconds"]
+            if seconds > base_seconds * tolerance and seconds - base_seconds > MIN_REGRESSION_SECONDS:
+                regressions.append((size, stage, base_seconds, seconds))
+    return regressions
+
+
+def print_results(results: dict, baseline: dict):
+    """按规模打印各阶段耗时，附带基线耗时"""
+    for size, result in results.items():
+        base_stages = baseline.get("results", {}).get(size, {}).get("stages", {})
+        mode = "流式" if result["streaming"] else "批量"
+        print(f"\n📊 {size} 行（实际 {result['rows']:,} 行，{mode}模式），"
+              f"总耗时 {result['total_wall_seconds']:.2f} 秒，峰值内存 {result['peak_rss_mb']} MB")
+        for stage, stats in result["stages"].items():
+            base_seconds = base_stages.get(stage, {}).get("wall_seconds")
+            base_text = f"  基线 {base_seconds:.3f} 秒" if base_seconds is not None else ""
+            print(f"   {stage:<28} {stats['wall_seconds']:>8.3f} 秒  CPU {stats['cpu_seconds']:>8.3f} 秒  "
+                  f"内存增长 {stats.get('peak_rss_growth_mb', 0):>8.1f} MB{base_text}")
+
+
+def test_benchmark_smoke():
+    """小规模跑通全流程，各阶段都有指标"""
+    result = run_pipeline(10000)
+    assert result["rows"] >= 10000
+    for stage in ("fetch_all_batches", "merge_batch_data", "process_wallet_data", "save_optimized_data"):
+        assert stage in result["stages"], f"缺少阶段: {stage}"
+
+
+def test_regression_detection():
+    """超过容忍倍数且绝对差值足够大的阶段被判定为回归"""
+    baseline = {"results": {"10k": {"streaming": False, "stages": {
+        "process_wallet_data": {"wall_seconds": 0.1}, "merge_batch_data": {"wall_seconds": 0.001}}}}}
+    results = {"10k": {"streaming": False, "stages": {
+        "process_wallet_data": {"wall_seconds": 0.3}, "merge_batch_data": {"wall_seconds": 0.01}}}}
+
+    assert compare_with_baseline(results, baseline, DEFAULT_TOLERANCE) == [("10k", "process_wallet_data", 0.1, 0.3)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="fetch → 索引 全流程基准")
+    parser.add_argument('--sizes', default="10k,100k,1M", help="逗号分隔的数据规模，如 10k,100k,1M,10M")
+    parser.add_argument('--streaming', action='store_true', help="使用流式分页获取（10M 规模建议开启）")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="基线结果文件")
+    parser.add_argument('--update-baseline', action='store_true', help="把本次结果写为新基线")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="判定回归的耗时倍数")
+    parser.add_argument('--check', action='store_true', help="出现回归时以非0状态退出")
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # 子进程模式：只运行一个规模，把结果写到 --output
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(run_pipeline(args.single, streaming=args.streaming), f)
+        sys.exit(0)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results = {}
+    for size_text in args.sizes.split(','):
+        num_rows = parse_size(size_text)
+        # 流式与批量模式分别记录基线
+        key = format_size(num_rows) + ("-streaming" if args.streaming else "")
+        print(f"⏳ 运行 {key} 行...")
+        results[key] = run_in_subprocess(num_rows, args.streaming)
+
+    print_results(results, baseline)
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n⚠️  发现 {len(regressions)} 个阶段耗时回归（超过基线 {args.tolerance}x）:")
+        for size, stage, base_seconds, seconds in regressions:
+            print(f"   {size} {stage}: {base_seconds:.3f} → {seconds:.3f} 秒")
+    elif baseline:
+        print("\n✅ 未发现耗时回归")
+
+    if args.update_baseline:
+        baseline.setdefault("results", {}).update(results)
+        baseline["environment"] = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S")
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"💾 基线已更新: {args.baseline}")
+
+    if args.check and regressions:
+        sys.exit(1)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+测试交易对 -> 钱包的反向索引
+验证反向索引与钱包分片一致、钱包数统计和热门交易对、增量更新以及SQLite后端导出
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import (POOL_COUNTS_FILE, MeteoraDataFetcher, pool_shard_filename, published_dir,
+                                  read_pool_wallets, read_top_pools, wallet_shard_id)
+
+
+def rows_for(wallets, pairs):
+    return [{"evt_tx_signer": wallet, "lbPair": pair} for wallet in wallets for pair in pairs]
+
+
+# poolA 被所有钱包共享，其余交易对的钱包数依次递减
+FIRST_RUN = (rows_for([f"wallet{i}" for i in range(40)], ["poolA"]) +
+             [{"evt_tx_signer": f"wallet{i}", "lbPair": f"pool{j}"} for j in range(30) for i in range(j)])
+SECOND_RUN = rows_for(["wallet39", "newwallet"], ["poolB", "poolZ"])
+
+
+def run(data_dir, rows, incremental=False, storage_backend="json"):
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}),
+                                 storage_backend=storage_backend)
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, incremental=incremental)
+    return fetcher
+
+
+def expected_pool_wallets(*runs):
+    pools = {}
+    for rows in runs:
+        for row in rows:
+            wallets = pools.setdefault(row["lbPair"], [])
+            if row["evt_tx_signer"] not in wallets:
+                wallets.append(row["evt_tx_signer"])
+    return {pool: set(wallets) for pool, wallets in pools.items()}
+
+
+def read_pool_shards(data_dir):
+    data_dir = published_dir(data_dir)
+    pools = {}
+    for filename in os.listdir(data_dir):
+        if filename.startswith("pools_") and filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                for pool, wallets in json.load(f)["pools"].items():
+                    assert pool not in pools
+                    pools[pool] = set(wallets)
+    return pools
+
+
+def test_pool_index_matches_wallet_data(data_dir):
+    """反向索引包含所有交易对，每个交易对位于按地址哈希计算的分片中"""
+    fetcher = run(data_dir, FIRST_RUN)
+
+    expected = expected_pool_wallets(FIRST_RUN)
+    assert read_pool_shards(data_dir) == expected
+
+    metadata = fetcher._load_metadata()
+    pool_index = metadata["pool_index"]
+    assert pool_index["total_pools"] == len(expected)
+    for pool in expected:
+        filename = pool_shard_filename(wallet_shard_id(pool, pool_index["shard_count"]), pool_index["shard_count"])
+        with open(os.path.join(fetcher.output_dir, filename), 'r', encoding='utf-8') as f:
+            assert pool in json.load(f)["pools"]
+
+    assert set(fetcher.lookup_pool_wallets("pool5")) == expected["pool5"]
+    assert fetcher.lookup_pool_wallets("missing") is None
+
+
+def test_pool_counts_and_top_pools(data_dir):
+    """每个交易对的钱包数写入 pool_counts.json，metadata 中按钱包数降序保存热门交易对"""
+    fetcher = run(data_dir, FIRST_RUN)
+
+    counts = Counter({pool: len(wallets) for pool, wallets in expected_pool_wallets(FIRST_RUN).items()})
+    with open(os.path.join(fetcher.output_dir, POOL_COUNTS_FILE), 'r', encoding='utf-8') as f:
+        assert json.load(f) == dict(counts)
+
+    top = read_top_pools(data_dir, 3)
+    assert top == [["poolA", 40], ["pool29", 29], ["pool28", 28]]
+    assert read_top_pools(data_dir, 1000)[-1] == ["pool1", 1]
+
+
+def test_incremental_update_keeps_pool_index(data_dir):
+    """增量更新后的反向索引与全量重建一致"""
+    run(data_dir, FIRST_RUN)
+    fetcher = run(data_dir, SECOND_RUN, incremental=True)
+
+    expected = expected_pool_wallets(FIRST_RUN, SECOND_RUN)
+    assert read_pool_shards(data_dir) == expected
+    assert set(read_pool_wallets(data_dir, "poolZ")) == {"wallet39", "newwallet"}
+    assert fetcher._load_metadata()["pool_index"]["total_pools"] == len(expected)
+    assert read_top_pools(data_dir, 2) == [["poolA", 40], ["pool29", 29]]
+
+
+def test_sqlite_backend_exports_pool_index(make_data_dir):
+    """SQLite后端（增量导出）生成的反向索引与JSON后端一致"""
+    json_dir = make_data_dir()
+    run(json_dir, FIRST_RUN)
+    run(json_dir, SECOND_RUN, incremental=True)
+
+    sqlite_dir = make_data_dir()
+    run(sqlite_dir, FIRST_RUN, storage_backend="sqlite")
+    fetcher = run(sqlite_dir, SECOND_RUN, incremental=True, storage_backend="sqlite")
+
+    assert read_pool_shards(sqlite_dir) == read_pool_shards(json_dir)
+    assert read_top_pools(sqlite_dir, 1000) == read_top_pools(json_dir, 1000)
+    assert fetcher.lookup_pool_wallets("poolZ") == ["wallet39", "newwallet"]
+
+
+def test_cli_answers_from_pool_index(data_dir):
+    """命令行工具只读取反向索引即可回答查询"""
+    output_dir = run(data_dir, FIRST_RUN).output_dir
+    for filename in os.listdir(output_dir):
+        if filename.startswith("wallets_"):
+            os.remove(os.path.join(output_dir, filename))
+
+    output = subprocess.run([sys.executable, os.path.join(ROOT_DIR, "meteora_pools.py"), "--data-dir", data_dir,
+                             "--pool", "pool2", "--top", "2", "--json"],
+                            check=True, capture_output=True, text=True).stdout
+    result = json.loads(output[output.index('{'):])
+    assert set(result["pool2"]) == {"wallet0", "wallet1"}
+    assert result["top_pools"] == [["poolA", 40], ["pool29", 29]]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
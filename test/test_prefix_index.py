@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+测试钱包地址前缀索引
+验证前缀查询与暴力扫描结果一致、跨块查询、增量插入与拆分，以及获取器生成的索引
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import MeteoraDataFetcher, published_dir
+from meteora_prefix_index import (PREFIX_INDEX_FILE, WalletPrefixIndex, add_wallets_to_prefix_index,
+                                  build_prefix_index, separator_key)
+from synthetic_data import generate_addresses
+
+
+def brute_force(wallets, prefix, limit):
+    return [wallet for wallet in sorted(wallets) if wallet.startswith(prefix)][:limit]
+
+
+def test_separator_key():
+    """分隔键是下一块首地址大于上一块末地址的最短前缀"""
+    assert separator_key("abc", "abd") == "abd"
+    assert separator_key("abc", "b123") == "b"
+    assert separator_key("ab", "abc") == "abc"
+
+
+def test_lookup_matches_brute_force(data_dir):
+    """随机前缀（包括跨越多个块的短前缀）的查询结果与暴力扫描一致"""
+    wallets = sorted(set(generate_addresses(5000, seed=3)))
+    directory = build_prefix_index(data_dir, wallets, block_size=100)
+    assert directory["total_wallets"] == len(wallets)
+    assert len(directory["blocks"]) == 50
+
+    index = WalletPrefixIndex(data_dir)
+    rng = random.Random(0)
+    for _ in range(300):
+        wallet = rng.choice(wallets)
+        prefix = wallet[:rng.randint(0, 6)]
+        limit = rng.choice([1, 20, 500])
+        assert index.lookup(prefix, limit) == brute_force(wallets, prefix, limit), prefix
+
+    # 足够长的前缀只需读取一个块
+    assert index.lookup(wallets[1234]) == [wallets[1234]]
+    assert len(index.last_blocks_read) == 1
+    assert index.lookup("0OIl") == []  # base58 不包含这些字符
+
+
+def test_incremental_insert_splits_blocks(data_dir):
+    """增量插入只重写受影响的块，块过大时拆分且查询结果仍然正确"""
+    wallets = sorted(set(generate_addresses(1000, seed=4)))
+    build_prefix_index(data_dir, wallets, block_size=100)
+    block_dir = os.path.join(data_dir, "wallet_prefix")
+    mtimes = {name: os.stat(os.path.join(block_dir, name)).st_mtime_ns for name in os.listdir(block_dir)}
+
+    # 同一个块内插入大量地址触发拆分
+    target = wallets[450]
+    new_wallets = [target[:20] + suffix for suffix in generate_addresses(300, seed=5)] + [wallets[0]]
+    directory = add_wallets_to_prefix_index(data_dir, new_wallets)
+
+    expected = sorted(set(wallets) | set(new_wallets))
+    assert directory["total_wallets"] == len(expected)
+    assert len(directory["blocks"]) > 10
+    assert [block[0] for block in directory["blocks"]] == sorted(block[0] for block in directory["blocks"])
+
+    rewritten = {name for name, mtime in mtimes.items()
+                 if os.stat(os.path.join(block_dir, name)).st_mtime_ns != mtime}
+    assert len(rewritten) == 2
+
+    index = WalletPrefixIndex(data_dir)
+    assert index.lookup("", limit=len(expected) + 1) == expected
+    assert index.lookup(target[:20], limit=1000) == brute_force(expected, target[:20], 1000)
+
+
+def test_fetcher_writes_prefix_index(data_dir):
+    """获取器用前缀索引代替 wallet_list.json，增量更新时插入新钱包"""
+    wallets = generate_addresses(300, seed=6)
+    rows = [{"evt_tx_signer": wallet, "lbPair": "poolA"} for wallet in wallets]
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}))
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0)
+
+    assert not os.path.exists(os.path.join(fetcher.output_dir, "wallet_list.json"))
+    assert os.path.exists(os.path.join(fetcher.output_dir, PREFIX_INDEX_FILE))
+    assert fetcher._load_metadata()["prefix_index"]["block_count"] == 1
+    assert fetcher.search_wallets(wallets[7][:4]) == brute_force(wallets, wallets[7][:4], 20)
+
+    new_wallet = "1" * 44
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir,
+                                 dune_client=FakeDuneClient({1: [{"evt_tx_signer": new_wallet, "lbPair": "poolB"}]}))
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, incremental=True)
+    assert fetcher.search_wallets("111") == [new_wallet]
+    assert WalletPrefixIndex(published_dir(data_dir)).directory["total_wallets"] == 301
+
+
+def test_sqlite_store_prefix_search(data_dir):
+    """SQLite后端的前缀查询走地址索引，与导出的前缀索引结果一致"""
+    wallets = generate_addresses(300, seed=7)
+    rows = [{"evt_tx_signer": wallet, "lbPair": "poolA"} for wallet in wallets]
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}),
+                                 storage_backend="sqlite")
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0)
+
+    for prefix in ("", wallets[0][:1], wallets[1][:3]):
+        assert fetcher.search_wallets(prefix) == WalletPrefixIndex(fetcher.output_dir).lookup(prefix)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+前缀索引 vs 平铺钱包列表 基准
+模拟前端搜索提示：每次查询都从“冷”状态开始，统计需要下载的字节数和查询耗时
+
+- 平铺列表：下载并解析完整的 wallet_list.json，再二分查找前缀
+- 前缀索引：下载并解析 wallet_prefix_index.json 目录，再读取命中的块文件
+
+用法:
+    python test/test_prefix_index_benchmark.py                       # 默认 10k,100k,1M
+    python test/test_prefix_index_benchmark.py --sizes 1M --block-size 1000 --lookups 500
+"""
+
+import argparse
+import bisect
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_prefix_index import (DEFAULT_PREFIX_BLOCK_SIZE, PREFIX_INDEX_FILE, WalletPrefixIndex, block_filename,
+                                  build_prefix_index)
+from synthetic_data import generate_addresses
+from test_pipeline_benchmark import format_size, parse_size
+
+
+def flat_lookup(path: str, prefix: str, limit: int):
+    """旧方式：读取完整列表后二分查找"""
+    with open(path, 'r', encoding='utf-8') as f:
+        wallet_list = json.load(f)
+    matches = []
+    for wallet in wallet_list[bisect.bisect_left(wallet_list, prefix):]:
+        if not wallet.startswith(prefix) or len(matches) >= limit:
+            break
+        matches.append(wallet)
+    return matches
+
+
+def run_benchmark(num_wallets: int, block_size: int = DEFAULT_PREFIX_BLOCK_SIZE, num_lookups: int = 200,
+                  limit: int = 20, seed: int = 0) -> dict:
+    """
+    生成钱包地址，分别写入平铺列表和前缀索引，用随机前缀（2-6个字符）对比查询
+
+    Returns:
+        dict: 文件大小、每次查询平均下载字节数和平均耗时
+    """
+    wallets = sorted(set(generate_addresses(num_wallets, seed=seed)))
+    with tempfile.TemporaryDirectory(prefix="meteora_bench_") as data_dir:
+        flat_file = os.path.join(data_dir, "wallet_list.json")
+        with open(flat_file, 'w', encoding='utf-8') as f:
+            json.dump(wallets, f, separators=(',', ':'))
+        directory = build_prefix_index(data_dir, wallets, block_size=block_size)
+
+        rng = random.Random(seed)
+        prefixes = [rng.choice(wallets)[:rng.randint(2, 6)] for _ in range(num_lookups)]
+        flat_bytes = os.path.getsize(flat_file)
+        directory_bytes = os.path.getsize(os.path.join(data_dir, PREFIX_INDEX_FILE))
+
+        start = time.perf_counter()
+        flat_results = [flat_lookup(flat_file, prefix, limit) for prefix in prefixes]
+        flat_seconds = (time.perf_counter() - start) / num_lookups
+
+        prefix_results = []
+        prefix_bytes = 0
+        blocks_read = 0
+        start = time.perf_counter()
+        for prefix in prefixes:
+            index = WalletPrefixIndex(data_dir)  # 冷查询：每次都重新读取目录
+            prefix_results.append(index.lookup(prefix, limit))
+            blocks_read += len(index.last_blocks_read)
+            prefix_bytes += directory_bytes + sum(os.path.getsize(os.path.join(data_dir, block_filename(block_id)))
+                                                  for block_id in index.last_blocks_read)
+        prefix_seconds = (time.perf_counter() - start) / num_lookups
+
+    assert prefix_results == flat_results, "前缀索引与平铺列表的查询结果不一致"
+
+    return {
+        "wallets": len(wallets),
+        "block_size": block_size,
+        "blocks": len(directory["blocks"]),
+        "flat_file_bytes": flat_bytes,
+        "directory_bytes": directory_bytes,
+        "flat_bytes_per_lookup": flat_bytes,
+        "prefix_bytes_per_lookup": round(prefix_bytes / num_lookups),
+        "prefix_blocks_per_lookup": round(blocks_read / num_lookups, 2),
+        "flat_ms_per_lookup": round(flat_seconds * 1000, 3),
+        "prefix_ms_per_lookup": round(prefix_seconds * 1000, 3)
+    }
+
+
+def print_result(size: str, result: dict):
+    print(f"\n📊 {size} 个钱包（{result['blocks']} 个块，每块 {result['block_size']} 个，目录 "
+          f"{result['directory_bytes'] / 1024:.1f} KB）")
+    print(f"   平铺列表  每次查询下载 {result['flat_bytes_per_lookup'] / 1024:>10.1f} KB  "
+          f"耗时 {result['flat_ms_per_lookup']:>9.3f} ms")
+    print(f"   前缀索引  每次查询下载 {result['prefix_bytes_per_lookup'] / 1024:>10.1f} KB  "
+          f"耗时 {result['prefix_ms_per_lookup']:>9.3f} ms  （平均读取 {result['prefix_blocks_per_lookup']} 个块）")
+    print(f"   下载量减少 {result['flat_bytes_per_lookup'] / max(result['prefix_bytes_per_lookup'], 1):.0f}x，"
+          f"耗时减少 {result['flat_ms_per_lookup'] / max(result['prefix_ms_per_lookup'], 1e-6):.0f}x")
+
+
+def test_benchmark_smoke():
+    """小规模对比：结果一致，前缀索引的下载量和耗时都明显更小"""
+    result = run_benchmark(20000, block_size=500, num_lookups=30)
+    assert result["prefix_bytes_per_lookup"] * 5 < result["flat_bytes_per_lookup"]
+    assert result["prefix_ms_per_lookup"] < result["flat_ms_per_lookup"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="前缀索引 vs 平铺钱包列表 基准")
+    parser.add_argument('--sizes', default="10k,100k,1M", help="逗号分隔的钱包数量，如 10k,100k,1M")
+    parser.add_argument('--block-size', type=int, default=DEFAULT_PREFIX_BLOCK_SIZE, help="前缀索引每块的钱包数")
+    parser.add_argument('--lookups', type=int, default=200, help="每个规模的查询次数")
+    parser.add_argument('--limit', type=int, default=20, help="每次查询返回的最多地址数")
+    args = parser.parse_args()
+
+    for size_text in args.sizes.split(','):
+        num_wallets = parse_size(size_text)
+        print(f"⏳ 运行 {format_size(num_wallets)} 个钱包...")
+        print_result(format_size(num_wallets), run_benchmark(num_wallets, args.block_size, args.lookups, args.limit))
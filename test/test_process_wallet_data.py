@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+process_wallet_data 回归基准
+对比列式分组实现与原先的 iterrows 逐行实现，验证结果一致并测量耗时
+
+用法:
+    python test/test_process_wallet_data.py --rows 2000000
+"""
+
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from meteora_data_fetcher import MeteoraDataFetcher
+
+
+def simulate_dune_rows(num_rows: int = 100000, seed: int = 42) -> pd.DataFrame:
+    """
+    模拟Dune返回的 evt_tx_signer/lbPair 行数据
+    钱包与交易对的比例参照 test_storage_strategy.simulate_wallet_data（每钱包1-10个交易对）
+    """
+    rng = random.Random(seed)
+    chars = string.ascii_letters + string.digits
+
+    num_wallets = max(num_rows // 8, 1)
+    num_pools = max(num_rows // 50, 1)
+    wallets = [''.join(rng.choices(chars, k=44)) for _ in range(num_wallets)]
+    pools = [''.join(rng.choices(chars, k=44)) for _ in range(num_pools)]
+
+    signers = rng.choices(wallets, k=num_rows)
+    pairs = rng.choices(pools, k=num_rows)
+
+    # 混入少量空值，覆盖 dropna 分支
+    for i in range(0, num_rows, 997):
+        signers[i] = None
+    for i in range(0, num_rows, 1009):
+        pairs[i] = None
+
+    return pd.DataFrame({'evt_tx_signer': signers, 'lbPair': pairs})
+
+
+def legacy_process_wallet_data(df: pd.DataFrame) -> Dict[str, List[str]]:
+    """原先的逐行实现（从meteora_data_fetcher.py复制的逻辑）"""
+    wallet_pairs = defaultdict(set)
+
+    for _, row in df.iterrows():
+        wallet = row['evt_tx_signer']
+        lb_pair = row['lbPair']
+
+        if pd.notna(wallet) and pd.notna(lb_pair):
+            wallet_pairs[wallet].add(lb_pair)
+
+    return {wallet: list(pairs) for wallet, pairs in wallet_pairs.items()}
+
+
+def assert_same_grouping(expected: Dict[str, List[str]], actual: Dict[str, List[str]]):
+    """比较两种实现的结果（交易对顺序不作要求）"""
+    assert set(expected) == set(actual), "钱包集合不一致"
+    for wallet, pairs in expected.items():
+        assert len(actual[wallet]) == len(set(actual[wallet])), f"钱包 {wallet} 存在重复交易对"
+        assert set(pairs) == set(actual[wallet]), f"钱包 {wallet} 的交易对不一致"
+
+
+def test_vectorized_matches_legacy(make_fetcher):
+    """列式分组与逐行实现结果一致"""
+    df = simulate_dune_rows(20000)
+    # 重复一部分行，覆盖去重分支
+    df = pd.concat([df, df.head(5000)], ignore_index=True)
+
+    fetcher = make_fetcher()
+    assert_same_grouping(legacy_process_wallet_data(df), fetcher.process_wallet_data(df))
+
+
+def test_empty_and_all_null_frames(make_fetcher):
+    """空数据和全空值数据返回空字典"""
+    fetcher = make_fetcher()
+    assert fetcher.process_wallet_data(pd.DataFrame()) == {}
+    assert fetcher.process_wallet_data(pd.DataFrame({'evt_tx_signer': [None], 'lbPair': ['x']})) == {}
+
+
+def run_benchmark(num_rows: int, legacy_rows: int):
+    """运行基准测试并打印结果"""
+    print(f"📊 生成 {num_rows:,} 行模拟数据...")
+    df = simulate_dune_rows(num_rows)
+    os.environ.setdefault('DUNE_API_KEY', 'test_api_key')
+    with tempfile.TemporaryDirectory(prefix="meteora_test_") as data_dir:
+        fetcher = MeteoraDataFetcher([1], data_dir=data_dir)
+        start = time.perf_counter()
+        vectorized = fetcher.process_wallet_data(df)
+        vectorized_seconds = time.perf_counter() - start
+
+    print(f"⚡ 列式分组: {vectorized_seconds:.2f} 秒 ({len(vectorized):,} 个钱包)")
+
+    legacy_df = df.head(legacy_rows)
+    start = time.perf_counter()
+    legacy = legacy_process_wallet_data(legacy_df)
+    legacy_seconds = time.perf_counter() - start
+    print(f"🐢 逐行遍历: {legacy_seconds:.2f} 秒 ({len(legacy_df):,} 行)")
+
+    if legacy_rows < num_rows:
+        legacy_seconds = legacy_seconds * num_rows / max(legacy_rows, 1)
+        print(f"   按行数线性外推到 {num_rows:,} 行: {legacy_seconds:.2f} 秒")
+    else:
+        assert_same_grouping(legacy, vectorized)
+        print("✅ 两种实现结果一致")
+
+    print(f"🚀 加速比: {legacy_seconds / max(vectorized_seconds, 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="process_wallet_data 回归基准")
+    parser.add_argument('--rows', type=int, default=2000000, help="模拟数据行数")
+    parser.add_argument('--legacy-rows', type=int, default=None,
+                        help="逐行实现使用的行数（默认与 --rows 相同，较大时耗时很长）")
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, args.legacy_rows or args.rows)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+测试Dune结果缓存
+验证执行ID或内容哈希未变化的查询被整体跳过（不下载、不保存、不合并），以及批次保留策略
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient, make_rows
+from meteora_data_fetcher import RESULT_CACHE_FILE, MeteoraDataFetcher
+
+
+def run(data_dir, client, query_ids=(1, 2), **kwargs):
+    fetcher = MeteoraDataFetcher(list(query_ids), data_dir=data_dir, dune_client=client)
+    fetcher.run_data_fetch(batch_delay=0, **kwargs)
+    return fetcher
+
+
+def batch_dirs(fetcher):
+    return sorted(name for name in os.listdir(fetcher.batch_data_dir) if name.startswith("batch_"))
+
+
+def read_backup(data_dir):
+    with open(os.path.join(data_dir, "full_wallet_data_backup.json"), 'r', encoding='utf-8') as f:
+        return {wallet: set(pairs) for wallet, pairs in json.load(f).items()}
+
+
+def test_unchanged_queries_are_skipped(data_dir):
+    """执行ID未变化时只发出探测请求，不下载完整结果，也不创建新的批次目录"""
+    client = FakeDuneClient({1: make_rows(1), 2: make_rows(2, num_wallets=5)})
+    fetcher = run(data_dir, client)
+    assert client.full_fetches == [1, 2]
+    batches = batch_dirs(fetcher)
+    backup_mtime = os.stat(os.path.join(data_dir, "full_wallet_data_backup.json")).st_mtime_ns
+
+    with open(os.path.join(data_dir, RESULT_CACHE_FILE), 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    assert cache["1"]["execution_id"] == client.execution_id_for(1)
+
+    time.sleep(1.1)  # 批次名精确到秒，确保未跳过时会产生新目录
+    client.full_fetches.clear()
+    fetcher = run(data_dir, client)
+
+    assert client.full_fetches == []
+    assert fetcher.unchanged_queries == [1, 2]
+    assert batch_dirs(fetcher) == batches
+    assert os.stat(os.path.join(data_dir, "full_wallet_data_backup.json")).st_mtime_ns == backup_mtime
+
+
+def test_same_content_new_execution_is_not_saved(data_dir):
+    """查询重新执行但内容相同：下载后按内容哈希跳过保存，并更新缓存中的执行ID"""
+    client = FakeDuneClient({1: make_rows(1)})
+    fetcher = run(data_dir, client, query_ids=[1], preserve_batches=False)
+    summary_file = os.path.join(fetcher.batch_data_dir, "batch_1_1", "batch_1_1_summary.json")
+    summary_mtime = os.stat(summary_file).st_mtime_ns
+
+    client.execution_ids[1] = "exec_1_rerun"
+    fetcher = run(data_dir, client, query_ids=[1], preserve_batches=False)
+
+    assert client.full_fetches == [1, 1]
+    assert fetcher.unchanged_queries == [1]
+    assert os.stat(summary_file).st_mtime_ns == summary_mtime
+    assert fetcher.result_cache["1"]["execution_id"] == "exec_1_rerun"
+
+
+def test_only_changed_query_is_merged(data_dir):
+    """只有结果变化的查询被重新获取，累积数据同时保留未变化查询的数据"""
+    client = FakeDuneClient({1: make_rows(1), 2: make_rows(2, num_wallets=5)})
+    run(data_dir, client, preserve_batches=False)
+
+    client.rows_by_query[2] = [{"evt_tx_signer": "new_wallet", "lbPair": "pair_new"}]
+    client.full_fetches.clear()
+    fetcher = run(data_dir, client, preserve_batches=False)
+
+    assert client.full_fetches == [2]
+    assert fetcher.unchanged_queries == [1]
+    wallet_data = read_backup(data_dir)
+    assert wallet_data["new_wallet"] == {"pair_new"}
+    assert wallet_data["wallet_19"] == {"pair_5", "pair_6", "pair_0"}
+
+
+def test_streaming_mode_skips_unchanged(data_dir):
+    """流式模式同样按执行ID跳过未变化的查询"""
+    client = FakeDuneClient({1: make_rows(1), 2: make_rows(2)})
+    run(data_dir, client, preserve_batches=False, streaming=True, page_size=7)
+    pages_before = len(client.page_sizes)
+
+    fetcher = run(data_dir, client, preserve_batches=False, streaming=True, page_size=7)
+    assert len(client.page_sizes) == pages_before
+    assert fetcher.unchanged_queries == [1, 2]
+
+
+def test_cache_requires_existing_wallet_state(data_dir):
+    """没有累积数据（或关闭累积）时不使用缓存，保证输出完整"""
+    client = FakeDuneClient({1: make_rows(1)})
+    run(data_dir, client, query_ids=[1], preserve_batches=False)
+    os.remove(os.path.join(data_dir, "full_wallet_data_backup.json"))
+    os.remove(os.path.join(data_dir, "wallet_pairs_snapshot.npz"))
+
+    run(data_dir, client, query_ids=[1], preserve_batches=False)
+    assert client.full_fetches == [1, 1]
+
+    run(data_dir, client, query_ids=[1], preserve_batches=False, accumulate_data=False)
+    assert client.full_fetches == [1, 1, 1]
+
+
+class ProbeFailingDuneClient(FakeDuneClient):
+    """1行样本的探测请求抛出异常，完整结果请求正常"""
+
+    def get_latest_result(self, query_id, sample_count=None, **kwargs):
+        if sample_count is not None:
+            raise ConnectionError("probe failed")
+        return super().get_latest_result(query_id, sample_count=sample_count, **kwargs)
+
+
+def test_probe_failure_falls_back_to_full_fetch(data_dir):
+    """探测执行ID失败时不中断运行，改为完整获取该批次"""
+    client = FakeDuneClient({1: make_rows(1), 2: make_rows(2, num_wallets=5)})
+    run(data_dir, client)
+
+    failing = ProbeFailingDuneClient(client.rows_by_query)
+    fetcher = run(data_dir, failing)
+
+    assert failing.full_fetches == [1, 2]
+    assert fetcher.unchanged_queries == [1, 2]  # 完整获取后按内容哈希识别为未变化
+    assert len(read_backup(data_dir)) == 20
+
+
+def test_prune_batches_keeps_latest_and_referenced(data_dir):
+    """保留策略：每个查询保留最近的N个批次，缓存引用的批次不删除"""
+    fetcher = MeteoraDataFetcher([1, 2], data_dir=data_dir, dune_client=FakeDuneClient({}))
+
+    names = [f"batch_2024010{day}_000000_1_1" for day in range(1, 6)] + ["batch_20240101_000000_2_2"]
+    for age, name in enumerate(names):
+        path = os.path.join(fetcher.batch_data_dir, name)
+        os.makedirs(path)
+        os.utime(path, (1000 + age, 1000 + age))
+    fetcher.result_cache = {"1": {"batch_name": names[0]}}
+
+    removed = fetcher.prune_batches(keep=2)
+
+    assert removed == names[1:3]
+    assert batch_dirs(fetcher) == sorted([names[0], names[3], names[4], names[5]])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试滚动合并
+验证 RollingBatchMerger 逐个批次合并的结果与整体 concat + drop_duplicates 一致（含空值和行索引），
+run_data_fetch 的合并摘要不变，并对比两种方式的峰值内存
+
+用法:
+    python test/test_rolling_merge.py
+"""
+
+import json
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import MERGE_KEY_COLUMNS, MeteoraDataFetcher, RollingBatchMerger
+from synthetic_data import generate_dune_rows
+
+
+def make_batches(num_batches=4, num_rows=2000, extra_columns=4, seed=0):
+    """生成带额外列、跨批次重复和空值的批次数据"""
+    rng = np.random.default_rng(seed)
+    for _ in range(num_batches):
+        wallets = np.char.add("wallet_", rng.integers(0, num_rows // 4, num_rows).astype(str)).astype(object)
+        pairs = np.char.add("pair_", rng.integers(0, 50, num_rows).astype(str)).astype(object)
+        wallets[rng.random(num_rows) < 0.01] = None
+        pairs[rng.random(num_rows) < 0.01] = np.nan
+        columns = {"evt_tx_signer": wallets, "lbPair": pairs}
+        for i in range(extra_columns):
+            columns[f"extra_{i}"] = rng.random(num_rows)
+        columns["evt_block_time"] = np.char.add("2024-01-01 ", rng.integers(0, 10 ** 6, num_rows).astype(str))
+        yield pd.DataFrame(columns)
+
+
+def add_extra_columns(rows_by_query):
+    return {query_id: [dict(row, amount=i, block_time=f"t{i}") for i, row in enumerate(rows)]
+            for query_id, rows in rows_by_query.items()}
+
+
+def test_rolling_merge_matches_concat():
+    """保留的行、顺序和行索引与整体合并的去重键列一致"""
+    batches = list(make_batches())
+    expected = pd.concat(batches, ignore_index=True).drop_duplicates(subset=MERGE_KEY_COLUMNS, keep='first')
+
+    merger = RollingBatchMerger()
+    for df in batches:
+        merger.add(df)
+
+    pd.testing.assert_frame_equal(merger.result(), expected[MERGE_KEY_COLUMNS], check_index_type=False)
+    assert merger.batch_record_counts == [len(df) for df in batches]
+    assert merger.input_schema() == pd.concat(batches, ignore_index=True).dtypes.astype(str).to_dict()
+
+
+def test_merge_batch_data_releases_batches(make_data_dir):
+    """merge_batch_data 使用合并器时从列表中取出批次，日志统计不变"""
+    fetcher = MeteoraDataFetcher([1], data_dir=make_data_dir(),
+                                 dune_client=FakeDuneClient({}))
+    batches = list(make_batches(num_batches=3, num_rows=500))
+    expected = fetcher.merge_batch_data(list(batches))
+
+    merger = RollingBatchMerger()
+    merged = fetcher.merge_batch_data(batches, merger=merger)
+    assert batches == []
+    pd.testing.assert_frame_equal(merged, expected[MERGE_KEY_COLUMNS], check_index_type=False)
+
+
+def test_run_data_fetch_summary_unchanged(make_data_dir):
+    """滚动合并与整体合并产生相同的合并摘要和钱包数据"""
+    rows_by_query = add_extra_columns(generate_dune_rows(3000, num_queries=4, seed=5))
+    results = []
+    for rolling_merge in (False, True):
+        fetcher = MeteoraDataFetcher(list(rows_by_query), data_dir=make_data_dir(),
+                                     dune_client=FakeDuneClient(rows_by_query), extra_columns=["amount", "block_time"])
+        fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, accumulate_data=False, max_workers=2,
+                               rolling_merge=rolling_merge)
+        with open(os.path.join(fetcher.data_dir, "merge_summary.json"), 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+        summary.pop("merge_timestamp")
+        with open(os.path.join(fetcher.output_dir, "metadata.json"), 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        results.append((summary, metadata["total_wallets"], metadata["total_pairs"]))
+
+    assert results[0] == results[1]
+    assert results[1][0]["columns"] == ["evt_tx_signer", "lbPair", "amount", "block_time"]
+    assert results[1][0]["total_batches"] == 4
+
+
+def measure_peak(merge, **batch_kwargs) -> int:
+    """批次由生成器逐个产生，统计合并过程中的峰值内存（字节）"""
+    tracemalloc.start()
+    try:
+        merge(make_batches(**batch_kwargs))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def concat_merge(batches):
+    batch_dataframes = list(batches)
+    return pd.concat(batch_dataframes, ignore_index=True).drop_duplicates(subset=MERGE_KEY_COLUMNS, keep='first')
+
+
+def rolling_merge(batches):
+    merger = RollingBatchMerger()
+    for df in batches:
+        merger.add(df)
+    return merger.result()
+
+
+def test_rolling_merge_lowers_peak_memory():
+    """峰值内存约为一个批次加去重集合，明显低于同时持有全部批次再拼接"""
+    batch_kwargs = dict(num_batches=8, num_rows=20000, extra_columns=8)
+    concat_peak = measure_peak(concat_merge, **batch_kwargs)
+    rolling_peak = measure_peak(rolling_merge, **batch_kwargs)
+    print(f"\n   整体合并峰值 {concat_peak / 2 ** 20:.1f} MB，滚动合并峰值 {rolling_peak / 2 ** 20:.1f} MB")
+    assert rolling_peak * 2 < concat_peak
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+测试运行指标
+验证 run_data_fetch 为每个阶段记录耗时、内存和计数，写出 run_metrics.json，并可选输出cProfile结果
+"""
+
+import json
+import os
+import pstats
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import make_rows
+from meteora_data_fetcher import RUN_METRICS_FILE, RUN_PROFILE_FILE, RunMetrics
+
+
+def read_metrics(fetcher):
+    with open(os.path.join(fetcher.data_dir, RUN_METRICS_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_stages_are_recorded(make_fetcher):
+    """完整运行记录每个阶段的耗时与计数"""
+    fetcher = make_fetcher(rows_by_query={1: make_rows(1), 2: make_rows(2)})
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0)
+
+    report = read_metrics(fetcher)
+    stages = {stage["name"]: stage for stage in report["stages"]}
+
+    assert report["status"] == "success"
+    assert [stage["name"] for stage in report["stages"]] == [
+        "fetch_all_batches", "merge_batch_data", "save_merged_data", "process_wallet_data",
+        "load_existing_wallet_data", "merge_wallet_data", "create_wallet_index", "save_optimized_data",
+        "compact_wallet_changes", "publish_generation",
+    ]
+    assert stages["fetch_all_batches"]["rows"] == 120
+    assert stages["merge_batch_data"]["merged_rows"] == 60
+    assert stages["process_wallet_data"]["wallets"] == 20
+    assert stages["create_wallet_index"]["parent"] == "save_optimized_data"
+    assert stages["create_wallet_index"]["shards"] == fetcher.shard_count
+
+    for stage in report["stages"]:
+        assert stage["wall_seconds"] >= 0 and stage["cpu_seconds"] >= 0
+    assert report["total_wall_seconds"] >= sum(s["wall_seconds"] for s in report["stages"] if "parent" not in s)
+
+
+def test_failed_and_unchanged_runs_write_report(make_fetcher):
+    """失败和结果未变化的运行同样写出报告"""
+    fetcher = make_fetcher(rows_by_query={1: []})
+    try:
+        fetcher.run_data_fetch(preserve_batches=False, batch_delay=0)
+        assert False, "空数据应当失败"
+    except Exception:
+        pass
+    assert read_metrics(fetcher)["status"] == "failed"
+
+    fetcher = make_fetcher(rows_by_query={1: make_rows(1)})
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0)
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0)
+    assert read_metrics(fetcher)["status"] == "unchanged"
+
+
+def test_profile_dump(make_fetcher):
+    """profile=True 时输出可被 pstats 读取的cProfile结果"""
+    fetcher = make_fetcher(rows_by_query={1: make_rows(1)})
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, profile=True)
+
+    stats = pstats.Stats(os.path.join(fetcher.data_dir, RUN_PROFILE_FILE))
+    profiled = {func[2] for func in stats.stats}
+    assert "build_wallet_table" in profiled
+
+
+def test_nested_stage_counts():
+    """阶段内可以继续写入计数，嵌套阶段记录外层阶段名称"""
+    metrics = RunMetrics()
+    with metrics.stage("outer", rows=3) as outer:
+        with metrics.stage("inner"):
+            pass
+        outer["wallets"] = 2
+
+    inner, outer = metrics.stages
+    assert inner["parent"] == "outer" and "parent" not in outer
+    assert outer["rows"] == 3 and outer["wallets"] == 2
+    assert outer["wall_seconds"] >= inner["wall_seconds"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
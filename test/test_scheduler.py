@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+测试定时刷新模式
+验证按查询分别调度、失败后指数退避、常驻内存状态的增量发布（不重新加载备份）以及健康文件
+
+用法:
+    python test/test_scheduler.py
+"""
+
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import WALLET_CHANGES_FILE, MeteoraDataFetcher
+from meteora_scheduler import RefreshScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyDuneClient(FakeDuneClient):
+    """对 failing 中的查询抛出异常"""
+
+    def __init__(self, rows_by_query):
+        super().__init__(rows_by_query)
+        self.failing = set()
+
+    def get_latest_result(self, query_id, sample_count=None, **kwargs):
+        if query_id in self.failing:
+            raise ConnectionError(f"query {query_id} unavailable")
+        return super().get_latest_result(query_id, sample_count=sample_count, **kwargs)
+
+
+def rows(wallets, pools):
+    return [{"evt_tx_signer": wallet, "lbPair": pool} for wallet in wallets for pool in pools]
+
+
+def create_scheduler(make_fetcher, **kwargs):
+    client = FlakyDuneClient({
+        1: rows([f"wallet_a{i}" for i in range(40)], ["pool_1", "pool_2"]),
+        2: rows([f"wallet_b{i}" for i in range(40)], ["pool_3"])
+    })
+    fetcher = make_fetcher([1, 2], dune_client=client, compression=[])
+    clock = FakeClock()
+    scheduler = RefreshScheduler(fetcher, intervals={1: 10, 2: 30}, backoff=5, max_backoff=20, clock=clock,
+                                 **kwargs)
+    scheduler.status = "running"
+    return scheduler, client, clock
+
+
+def test_per_query_intervals(make_fetcher):
+    """每个查询按自己的间隔刷新"""
+    scheduler, client, clock = create_scheduler(make_fetcher)
+    assert scheduler.run_pending() == [1, 2]
+
+    clock.now += 10
+    assert scheduler.run_pending() == [1]
+    clock.now += 10
+    assert scheduler.run_pending() == [1]
+    clock.now += 10
+    assert scheduler.run_pending() == [1, 2]
+    assert scheduler.run_pending() == []
+    assert scheduler.next_wakeup() == clock.now + 10
+
+
+def test_incremental_publish_from_warm_state(make_fetcher):
+    """首轮全量发布；之后的新数据只增量发布，不重新加载备份"""
+    scheduler, client, clock = create_scheduler(make_fetcher)
+    fetcher = scheduler.fetcher
+    scheduler.run_pending()
+    first_generation = fetcher.generations.current()
+    assert fetcher._load_metadata()["total_wallets"] == 80
+
+    fetcher.load_existing_wallet_data = None  # 常驻状态：之后不应再读取备份
+    client.rows_by_query[1] = client.rows_by_query[1] + rows(["wallet_new"], ["pool_9"]) + \
+        rows(["wallet_a0"], ["pool_9"])
+    clock.now += 10
+    scheduler.run_pending()
+
+    assert fetcher.generations.current() == first_generation + 1
+    assert scheduler.last_publish["new_wallets"] == 1 and scheduler.last_publish["new_pairs"] == 2
+    assert fetcher.lookup_wallet_pairs("wallet_new") == ["pool_9"]
+    assert fetcher.lookup_wallet_pairs("wallet_a0") == ["pool_1", "pool_2", "pool_9"]
+    assert os.path.exists(os.path.join(fetcher.data_dir, WALLET_CHANGES_FILE))
+    assert len(scheduler.wallet_data) == 81
+
+    # 结果未变化：不发布新版本
+    clock.now += 30
+    scheduler.run_pending()
+    assert fetcher.generations.current() == first_generation + 1
+    assert scheduler.schedules[1].last_status == "unchanged"
+
+
+def test_compaction_uses_warm_state(make_fetcher):
+    """达到 compact_every 后用内存中的状态压缩变更日志"""
+    scheduler, client, clock = create_scheduler(make_fetcher, compact_every=2)
+    fetcher = scheduler.fetcher
+    scheduler.run_pending()
+    for i in range(2):
+        client.rows_by_query[1] = client.rows_by_query[1] + rows([f"wallet_c{i}"], ["pool_1"])
+        clock.now += 10
+        scheduler.run_pending()
+
+    assert not os.path.exists(os.path.join(fetcher.data_dir, WALLET_CHANGES_FILE))
+    reloaded = MeteoraDataFetcher([1], data_dir=fetcher.data_dir, dune_client=client).load_existing_wallet_data()
+    assert reloaded == scheduler.wallet_data
+
+
+def test_failure_backoff_and_health(make_fetcher):
+    """失败的查询按指数退避重试（有上限），不影响其他查询；恢复后回到正常间隔"""
+    scheduler, client, clock = create_scheduler(make_fetcher)
+    client.failing.add(2)
+    scheduler.run_pending()
+
+    schedule = scheduler.schedules[2]
+    delays = []
+    for _ in range(4):
+        delays.append(schedule.next_run - clock.now)
+        clock.now = schedule.next_run
+        scheduler.run_pending()
+    assert delays == [5, 10, 20, 20]
+    assert scheduler.fetcher._load_metadata()["total_wallets"] == 40
+
+    with open(scheduler.health_file, 'r', encoding='utf-8') as f:
+        health = json.load(f)
+    assert health["status"] == "degraded"
+    assert health["queries"]["2"]["consecutive_failures"] == 5
+    assert health["queries"]["2"]["last_error"]
+    assert health["queries"]["1"]["consecutive_failures"] == 0 and health["queries"]["1"]["last_success"]
+    assert health["wallets"] == 40 and health["last_run_metrics"]["stages"]
+
+    client.failing.clear()
+    clock.now = schedule.next_run
+    scheduler.run_pending()
+    assert schedule.failures == 0 and schedule.next_run == clock.now + 30
+    assert scheduler.write_health()["status"] == "running"
+    assert len(scheduler.wallet_data) == 80
+
+
+def test_failed_publish_is_retried(make_fetcher):
+    """发布失败时内存状态和结果缓存都不更新，之后重新获取"""
+    scheduler, client, clock = create_scheduler(make_fetcher)
+    scheduler.run_pending()
+    client.rows_by_query[1] = client.rows_by_query[1] + rows(["wallet_new"], ["pool_9"])
+
+    original = scheduler.fetcher.apply_incremental_update
+    scheduler.fetcher.apply_incremental_update = lambda data: (_ for _ in ()).throw(OSError("disk full"))
+    clock.now += 10
+    scheduler.run_pending()
+    assert "wallet_new" not in scheduler.wallet_data
+    assert scheduler.schedules[1].failures == 1
+
+    scheduler.fetcher.apply_incremental_update = original
+    clock.now = scheduler.schedules[1].next_run
+    scheduler.run_pending()
+    assert scheduler.fetcher.lookup_wallet_pairs("wallet_new") == ["pool_9"]
+
+
+def test_run_forever_stops(make_fetcher):
+    """run_forever 在 stop() 后退出，健康文件记录 stopped"""
+    scheduler, client, clock = create_scheduler(make_fetcher, health_interval=0.01)
+    thread = threading.Thread(target=scheduler.run_forever)
+    thread.start()
+    while scheduler.refreshes == 0:
+        thread.join(0.01)
+    scheduler.stop()
+    thread.join(10)
+    assert not thread.is_alive()
+
+    with open(scheduler.health_file, 'r', encoding='utf-8') as f:
+        assert json.load(f)["status"] == "stopped"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+多进程分片写入基准
+对同一份钱包数据分别用 1、2、4... 个进程运行 create_wallet_index（钱包分片 + 反向索引），
+统计耗时和相对单进程的加速比，并检查各进程数的输出完全一致
+
+用法:
+    python test/test_shard_writer_benchmark.py                            # 默认 100k 钱包，1,2,4,8 个进程
+    python test/test_shard_writer_benchmark.py --sizes 100k,1M --workers 1,2,4,8,16 --max-files 256
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import MeteoraDataFetcher
+from synthetic_data import generate_wallet_data
+from test_pipeline_benchmark import format_size, parse_size
+from test_sharding import read_output
+
+
+def run_benchmark(num_wallets: int, workers=(1, 2, 4, 8), max_files: int = 256, shard_format: str = "json",
+                  max_pairs: int = 10, seed: int = 0) -> dict:
+    """
+    生成钱包数据，按不同进程数写入分片
+
+    Returns:
+        dict: 数据规模、分片数，以及每个进程数的耗时和加速比
+    """
+    wallet_data = generate_wallet_data(num_wallets, num_pools=max(num_wallets // 50, 100), max_pairs=max_pairs,
+                                       seed=seed)
+    max_wallets_per_file = max(2 * num_wallets // max_files, 1)  # 留出哈希不均匀的余量，分片数等于 max_files
+
+    results = {}
+    reference = None
+    for write_workers in workers:
+        with tempfile.TemporaryDirectory(prefix="meteora_bench_") as data_dir:
+            fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({}),
+                                         write_workers=write_workers)
+            start = time.perf_counter()
+            index = fetcher.create_wallet_index(wallet_data, max_files=max_files,
+                                                max_wallets_per_file=max_wallets_per_file, shard_format=shard_format)
+            seconds = time.perf_counter() - start
+
+            output = (list(index.items()), read_output(fetcher.data_dir))
+            if reference is None:
+                reference = output
+            assert output == reference, f"{write_workers} 个进程的输出与单进程不一致"
+            results[write_workers] = {"seconds": round(seconds, 3)}
+
+    baseline = results[workers[0]]["seconds"]
+    for result in results.values():
+        result["speedup"] = round(baseline / max(result["seconds"], 1e-6), 2)
+
+    return {
+        "wallets": num_wallets,
+        "pairs": sum(len(pairs) for pairs in wallet_data.values()),
+        "shards": fetcher.shard_count,
+        "cpu_count": os.cpu_count(),
+        "workers": results
+    }
+
+
+def print_result(size: str, result: dict):
+    print(f"\n📊 {size} 个钱包，{result['pairs']:,} 个交易对引用，{result['shards']} 个分片"
+          f"（CPU核数 {result['cpu_count']}）")
+    for write_workers, stats in result["workers"].items():
+        print(f"   {write_workers:>3} 个进程  {stats['seconds']:>8.3f} 秒  加速 {stats['speedup']:.2f}x")
+
+
+def test_benchmark_smoke():
+    """小规模运行：不同进程数的输出一致"""
+    result = run_benchmark(3000, workers=(1, 2), max_files=16)
+    assert set(result["workers"]) == {1, 2}
+    assert result["shards"] == 16
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多进程分片写入基准")
+    parser.add_argument('--sizes', default="100k", help="逗号分隔的钱包数量，如 100k,1M")
+    parser.add_argument('--workers', default="1,2,4,8", help="逗号分隔的进程数，第一个作为加速比基准")
+    parser.add_argument('--max-files', type=int, default=256, help="分片数上限")
+    parser.add_argument('--format', default="json", choices=["json", "compact"], help="分片格式")
+    args = parser.parse_args()
+
+    workers = tuple(int(value) for value in args.workers.split(','))
+    for size_text in args.sizes.split(','):
+        num_wallets = parse_size(size_text)
+        print(f"⏳ 运行 {format_size(num_wallets)} 个钱包...")
+        print_result(format_size(num_wallets), run_benchmark(num_wallets, workers, args.max_files, args.format))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+测试哈希分片策略
+验证分片遵守 max_files / max_wallets_per_file 限制，并报告分片大小分布（与旧的16进制前缀分组对比）
+"""
+
+import json
+import os
+import statistics
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_data_fetcher import MeteoraDataFetcher, shard_filename, wallet_shard_id, wallet_shard_ids
+from synthetic_data import generate_addresses, generate_wallet_data
+
+
+def legacy_group_sizes(wallets, max_wallets_per_file):
+    """旧的16进制前缀分组（从meteora_data_fetcher.py复制的逻辑）"""
+    hex_chars = '0123456789abcdef'
+    primary = Counter()
+    members = {}
+    for wallet in wallets:
+        key = wallet[0].lower() if wallet[0].lower() in hex_chars else 'other'
+        primary[key] += 1
+        members.setdefault(key, []).append(wallet)
+
+    sizes = {}
+    for key, count in primary.items():
+        if count <= max_wallets_per_file:
+            sizes[key] = count
+            continue
+        for wallet in members[key]:
+            second = wallet[1].lower()
+            sub_key = f"{key}_{second}" if second in hex_chars else f"{key}_other"
+            sizes[sub_key] = sizes.get(sub_key, 0) + 1
+    return sizes
+
+
+def describe(sizes):
+    values = list(sizes)
+    return (f"{len(values)} 个文件, 最小 {min(values)}, 最大 {max(values)}, "
+            f"平均 {statistics.mean(values):.0f}, 标准差 {statistics.pstdev(values):.0f}")
+
+
+def test_fnv1a_known_vectors():
+    """哈希与标准 FNV-1a 32位测试向量一致（前端使用同一算法）"""
+    assert wallet_shard_id('', 2 ** 32) == 0x811c9dc5
+    assert wallet_shard_id('a', 2 ** 32) == 0xe40c292c
+    assert wallet_shard_id('foobar', 2 ** 32) == 0xbf9cf968
+
+
+def test_vectorized_hash_matches_scalar():
+    wallets = generate_addresses(2000, seed=3) + ['short', 'x']
+    assert wallet_shard_ids(wallets, 97).tolist() == [wallet_shard_id(w, 97) for w in wallets]
+
+
+def test_shards_respect_limits_and_index_is_complete(make_fetcher):
+    """分片数不超过 max_files，单分片钱包数不超过 max_wallets_per_file，所有钱包可定位"""
+    wallet_data = generate_wallet_data(20000, num_pools=500)
+    fetcher = make_fetcher()
+
+    index = fetcher.create_wallet_index(wallet_data, max_files=16, max_wallets_per_file=2000)
+    sizes = Counter(index.values())
+
+    assert len(sizes) <= 16
+    assert max(sizes.values()) <= 2000
+    assert set(index) == set(wallet_data)
+
+    for wallet, filename in index.items():
+        assert filename == shard_filename(wallet_shard_id(wallet, fetcher.shard_count), fetcher.shard_count)
+
+    for filename in sizes:
+        with open(os.path.join(fetcher.data_dir, filename), 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        assert shard['group_info']['wallet_count'] == sizes[filename]
+
+
+def read_output(data_dir):
+    """所有分片文件的内容（去掉创建时间）"""
+    files = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data.get("group_info", {}).pop("created_at", None)
+            files[filename] = data
+    return files
+
+
+def test_parallel_writer_matches_serial(make_fetcher):
+    """多进程写入的分片、反向索引和钱包索引（包括顺序）与单进程完全一致"""
+    wallet_data = generate_wallet_data(5000, num_pools=300, seed=9)
+    outputs = []
+    for write_workers in (1, 3):
+        fetcher = make_fetcher(write_workers=write_workers)
+        index = fetcher.create_wallet_index(wallet_data, max_files=8, max_wallets_per_file=1000,
+                                            shard_format="compact")
+        outputs.append((list(index.items()), read_output(fetcher.data_dir)))
+
+    assert outputs[0] == outputs[1]
+    assert len(outputs[0][1]) > 8
+
+
+def test_max_wallets_per_file_wins_when_limits_conflict():
+    """两个限制冲突时优先保证单文件钱包数"""
+    wallets = generate_addresses(20000, seed=5)
+    shard_count = MeteoraDataFetcher.plan_shard_count(wallets, max_files=4, max_wallets_per_file=2000)
+
+    assert shard_count >= 10
+    assert Counter(wallet_shard_ids(wallets, shard_count).tolist()).most_common(1)[0][1] <= 2000
+
+
+def test_plan_terminates_on_hash_collisions():
+    """多于上限的钱包落在同一个哈希上时不会无限增加分片数，最多 total 个分片"""
+    def colliding_sizes(count):
+        sizes = np.zeros(count, dtype=np.int64)
+        sizes[0] = 50
+        return sizes
+
+    shard_count = MeteoraDataFetcher.plan_shard_count(200, max_files=4, max_wallets_per_file=10,
+                                                      shard_sizes=colliding_sizes)
+    assert shard_count == 200
+
+
+def test_report_shard_size_distribution():
+    """报告哈希分片与旧前缀分组的分片大小分布"""
+    wallets = generate_addresses(50000, seed=7)
+    max_wallets_per_file = 5000
+
+    legacy = legacy_group_sizes(wallets, max_wallets_per_file)
+    shard_count = MeteoraDataFetcher.plan_shard_count(wallets, 16, max_wallets_per_file)
+    hashed = Counter(wallet_shard_ids(wallets, shard_count).tolist())
+
+    print(f"\n📊 旧前缀分组: {describe(legacy.values())}")
+    print(f"📊 哈希分片:   {describe(hashed.values())}")
+
+    assert max(hashed.values()) <= max_wallets_per_file
+    assert max(hashed.values()) < max(legacy.values())
+    assert statistics.pstdev(hashed.values()) < statistics.pstdev(legacy.values())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+测试流式分页获取
+验证逐页写入的批次文件、增量聚合结果与一次性获取完全一致，且单次请求行数不超过页大小
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient, make_rows
+from meteora_data_fetcher import load_columnar_snapshot
+
+QUERY_IDS = [201, 202, 203]
+
+
+def create_fetcher(make_fetcher):
+    """创建使用假客户端的数据获取器"""
+    rows = {qid: make_rows(qid, num_wallets=50 + i * 10) for i, qid in enumerate(QUERY_IDS)}
+    client = FakeDuneClient(rows)
+    fetcher = make_fetcher(QUERY_IDS, dune_client=client, export_formats=["csv", "json"],
+                           extra_columns=["source_query"])
+    return fetcher, client
+
+
+def as_sets(wallet_data):
+    return {wallet: set(pairs) for wallet, pairs in wallet_data.items()}
+
+
+def test_streaming_matches_in_memory_fetch(make_fetcher):
+    """流式聚合结果与 get_dune_data + process_wallet_data 一致"""
+    fetcher, client = create_fetcher(make_fetcher)
+    merged_df = fetcher.get_dune_data(delay_seconds=0, preserve_batches=False)
+    expected = fetcher.process_wallet_data(merged_df)
+
+    fetcher, client = create_fetcher(make_fetcher)
+    streamed = fetcher.stream_dune_data(delay_seconds=0, preserve_batches=False, page_size=17)
+
+    assert as_sets(streamed) == as_sets(expected)
+    assert client.page_sizes and max(client.page_sizes) <= 17
+
+    # 合并文件只包含首次出现的记录，且保留第一个批次的数据
+    merged_csv = pd.read_csv(os.path.join(fetcher.data_dir, "merged_dune_data.csv"))
+    assert len(merged_csv) == len(merged_df)
+    assert merged_csv['source_query'].tolist() == merged_df['source_query'].tolist()
+
+    with open(os.path.join(fetcher.data_dir, "merged_dune_data.json"), 'r', encoding='utf-8') as f:
+        assert len(json.load(f)) == len(merged_df)
+
+
+def test_streaming_batch_files_are_complete(make_fetcher):
+    """逐页写入的批次文件完整有效"""
+    fetcher, client = create_fetcher(make_fetcher)
+    fetcher.stream_dune_data(delay_seconds=0, preserve_batches=False, page_size=25)
+
+    for i, query_id in enumerate(QUERY_IDS):
+        batch_name = f"batch_{i + 1}_{query_id}"
+        batch_dir = os.path.join(fetcher.batch_data_dir, batch_name)
+        expected_rows = client.rows_by_query[query_id]
+
+        assert len(pd.read_csv(os.path.join(batch_dir, f"{batch_name}.csv"))) == len(expected_rows)
+        with open(os.path.join(batch_dir, f"{batch_name}.json"), 'r', encoding='utf-8') as f:
+            assert json.load(f) == expected_rows
+        with open(os.path.join(batch_dir, f"{batch_name}_raw_rows.json"), 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        assert raw['query_id'] == query_id and raw['rows'] == expected_rows
+        with open(os.path.join(batch_dir, f"{batch_name}_summary.json"), 'r', encoding='utf-8') as f:
+            assert json.load(f)['total_records'] == len(expected_rows)
+
+        # 列式快照分块拼接后与原始行一致
+        snapshot = load_columnar_snapshot(os.path.join(batch_dir, f"{batch_name}.npz"))
+        assert snapshot['evt_tx_signer'].astype(str).tolist() == [row['evt_tx_signer'] for row in expected_rows]
+
+
+def test_batch_missing_key_column_fails(make_fetcher):
+    """某个查询缺少去重键列：该批次整体失败并删除不完整的批次目录，其他批次照常合并"""
+    fetcher, client = create_fetcher(make_fetcher)
+    client.rows_by_query[202] = [{"evt_tx_signer": row["evt_tx_signer"]} for row in client.rows_by_query[202]]
+    streamed = fetcher.stream_dune_data(delay_seconds=0, preserve_batches=False, page_size=25)
+
+    batches = sorted(os.listdir(fetcher.batch_data_dir))
+    assert batches == ["batch_1_201", "batch_3_203"]
+    for name in batches:
+        with open(os.path.join(fetcher.batch_data_dir, name, f"{name}_raw_rows.json"), 'r', encoding='utf-8') as f:
+            json.load(f)
+    expected = {row["evt_tx_signer"] for qid in (201, 203) for row in client.rows_by_query[qid]}
+    assert set(streamed) == expected
+
+
+class FailingPageDuneClient(FakeDuneClient):
+    """指定查询的第 fail_page 页（从0开始）请求抛出异常"""
+
+    def __init__(self, rows_by_query, failing_query, fail_page=1):
+        super().__init__(rows_by_query)
+        self.failing_query = failing_query
+        self.fail_page = fail_page
+
+    def get_execution_results(self, job_id, limit=None, offset=None, **kwargs):
+        query_id = int(job_id.split('_')[1])
+        if query_id == self.failing_query and limit and (offset or 0) // limit == self.fail_page:
+            raise ConnectionError(f"query {query_id} page {self.fail_page} unavailable")
+        return super().get_execution_results(job_id, limit=limit, offset=offset, **kwargs)
+
+
+def test_batch_failing_on_later_page_adds_nothing(make_fetcher):
+    """
+    批次在第一页之后失败：已处理的分页不进入聚合结果、合并文件和合并摘要，
+    之后的批次中出现相同的钱包-交易对时仍按首次出现处理
+    """
+    rows = {
+        1: [{"evt_tx_signer": f"w{i}", "lbPair": "pool_a"} for i in range(10)],
+        2: [{"evt_tx_signer": f"x{i}", "lbPair": "pool_b"} for i in range(10)],
+        3: [{"evt_tx_signer": "x0", "lbPair": "pool_b"}]
+    }
+    client = FailingPageDuneClient(rows, failing_query=2)
+    fetcher = make_fetcher([1, 2, 3], dune_client=client, export_formats=["csv"])
+    streamed = fetcher.stream_dune_data(delay_seconds=0, preserve_batches=False, page_size=4)
+
+    expected = {f"w{i}": {"pool_a"} for i in range(10)}
+    expected["x0"] = {"pool_b"}
+    assert as_sets(streamed) == expected
+    assert sorted(os.listdir(fetcher.batch_data_dir)) == ["batch_1_1", "batch_3_3"]
+    for name in ("batch_1_1", "batch_3_3"):
+        assert not [f for f in os.listdir(os.path.join(fetcher.batch_data_dir, name)) if "pending" in f]
+
+    with open(os.path.join(fetcher.data_dir, "merge_summary.json"), 'r', encoding='utf-8') as f:
+        summary = json.load(f)
+    assert summary["total_batches"] == 2 and summary["batch_record_counts"] == [10, 1]
+    assert summary["merged_total_records"] == 11
+    merged = pd.read_csv(os.path.join(fetcher.data_dir, "merged_dune_data.csv"))
+    assert merged['evt_tx_signer'].tolist() == [f"w{i}" for i in range(10)] + ["x0"]
+    assert len(load_columnar_snapshot(os.path.join(fetcher.data_dir, "merged_dune_data.npz"))) == 11
+
+
+def test_run_data_fetch_streaming(make_fetcher):
+    """run_data_fetch 流式模式端到端运行"""
+    fetcher, _ = create_fetcher(make_fetcher)
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, accumulate_data=False,
+                           streaming=True, page_size=40)
+
+    with open(os.path.join(fetcher.output_dir, "metadata.json"), 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    assert metadata['total_wallets'] == 70
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
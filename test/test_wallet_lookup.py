@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+测试无索引的钱包查询
+验证每个钱包都能由地址直接定位到分片，且前端的哈希实现与Python一致
+"""
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from meteora_data_fetcher import shard_filename, wallet_shard_id
+from synthetic_data import generate_addresses, generate_wallet_data
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_every_wallet_resolves_without_index(make_fetcher):
+    """所有钱包都能通过 lookup_wallet_pairs 查到，且不生成 wallet_index.json"""
+    wallet_data = generate_wallet_data(5000, num_pools=300)
+    fetcher = make_fetcher()
+    fetcher.save_optimized_data(wallet_data, max_files=16, max_wallets_per_file=500)
+
+    assert not os.path.exists(os.path.join(fetcher.data_dir, "wallet_index.json"))
+
+    for wallet, pairs in wallet_data.items():
+        assert fetcher.lookup_wallet_pairs(wallet) == pairs
+
+    for wallet in generate_addresses(50, seed=99):
+        if wallet not in wallet_data:
+            assert fetcher.lookup_wallet_pairs(wallet) is None
+
+
+def test_optional_wallet_index_matches_computed_shards(make_fetcher):
+    """需要时仍可生成 wallet_index.json，内容与计算出的分片一致"""
+    wallet_data = generate_wallet_data(1000, num_pools=100)
+    fetcher = make_fetcher()
+    fetcher.save_optimized_data(wallet_data, write_wallet_index=True)
+
+    with open(os.path.join(fetcher.data_dir, "wallet_index.json"), 'r', encoding='utf-8') as f:
+        wallet_index = json.load(f)
+
+    shard_count = fetcher.shard_count
+    assert wallet_index == {w: shard_filename(wallet_shard_id(w, shard_count), shard_count) for w in wallet_data}
+
+
+def test_frontend_hash_matches_python():
+    """fees_checker.html 中的 fnv1a32 与 wallet_shard_id 结果一致（需要node）"""
+    node = shutil.which('node')
+    if not node:
+        print("⚠️  未找到node，跳过前端哈希一致性检查")
+        return
+
+    with open(os.path.join(ROOT_DIR, "fees_checker.html"), 'r', encoding='utf-8') as f:
+        html = f.read()
+    js_function = re.search(r"function fnv1a32\(text\) \{.*?\n        \}", html, re.S).group(0)
+
+    wallets = generate_addresses(200, seed=11)
+    script = js_function + f"\nconsole.log(JSON.stringify({json.dumps(wallets)}.map(w => fnv1a32(w) % 997)));"
+    output = subprocess.run([node, "-e", script], capture_output=True, text=True, check=True).stdout
+
+    assert json.loads(output) == [wallet_shard_id(w, 997) for w in wallets]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+测试SQLite钱包存储后端
+验证upsert累积与JSON后端的合并结果一致、点查询和反查走存储，以及按需导出的分片文件
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dune_stub import FakeDuneClient
+from meteora_data_fetcher import (WALLET_SNAPSHOT_FILE, WALLET_STORE_FILE, MeteoraDataFetcher, WalletStore,
+                                  decode_shard_wallets, published_dir, shard_filename, wallet_shard_id)
+from meteora_prefix_index import WalletPrefixIndex
+
+
+def rows_for(wallets, pairs):
+    return [{"evt_tx_signer": wallet, "lbPair": pair} for wallet in wallets for pair in pairs]
+
+
+FIRST_RUN = rows_for([f"{c}wallet{i}" for c in "0123abcdXY" for i in range(5)], ["poolA", "poolB"])
+SECOND_RUN = rows_for(["1wallet0", "1wallet1"], ["poolA", "poolC"]) + rows_for(["ewallet0"], ["poolD"])
+
+
+def run(data_dir, rows, storage_backend, incremental=False, shard_format="json"):
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: rows}),
+                                 storage_backend=storage_backend)
+    fetcher.run_data_fetch(preserve_batches=False, batch_delay=0, incremental=incremental,
+                           shard_format=shard_format)
+    return fetcher
+
+
+def read_files(data_dir):
+    """分片文件内容以及 metadata 中的总量（JSON后端合并时不保证交易对顺序，按集合比较）"""
+    data_dir = published_dir(data_dir)
+    shards = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.startswith("wallets_") and filename.endswith(".json"):
+            with open(os.path.join(data_dir, filename), 'r', encoding='utf-8') as f:
+                shards[filename] = {w: set(p) for w, p in decode_shard_wallets(json.load(f)).items()}
+    with open(os.path.join(data_dir, "metadata.json"), 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    wallet_list = WalletPrefixIndex(data_dir).lookup("", limit=10 ** 6)
+    return shards, metadata["total_wallets"], metadata["total_pairs"], metadata["sharding"], wallet_list
+
+
+def test_upsert_preserves_order_and_reports_changes(data_dir):
+    """重复的交易对不会重复写入，新交易对追加在已有交易对之后"""
+    store = WalletStore(os.path.join(data_dir, WALLET_STORE_FILE))
+    store.upsert({"w1": ["p2", "p1"], "w2": ["p1"]})
+    stats = store.upsert({"w1": ["p1", "p3"], "w2": ["p1"], "w3": ["p2"]})
+
+    assert stats["new_wallets"] == 1
+    assert stats["new_pairs"] == 2
+    assert stats["changed_wallets"] == ["w1", "w3"]
+    assert (stats["total_wallets"], stats["total_pairs"]) == (3, 5)
+    assert store.get_pairs("w1") == ["p2", "p1", "p3"]
+    assert store.get_pairs("missing") is None
+    assert store.get_wallets("p1") == ["w1", "w2"]
+    assert store.get_wallets("p2") == ["w1", "w3"]
+    assert list(store.iter_wallets()) == [("w1", ["p2", "p1", "p3"]), ("w2", ["p1"]), ("w3", ["p2"])]
+    assert list(store.iter_wallet_addresses()) == ["w1", "w2", "w3"]
+    store.close()
+
+
+def test_sqlite_backend_matches_json_backend(make_data_dir):
+    """两次累积运行后导出的分片、元数据和钱包列表与JSON后端一致"""
+    json_dir = make_data_dir()
+    run(json_dir, FIRST_RUN, "json")
+    run(json_dir, SECOND_RUN, "json")
+
+    sqlite_dir = make_data_dir()
+    run(sqlite_dir, FIRST_RUN, "sqlite")
+    fetcher = run(sqlite_dir, SECOND_RUN, "sqlite")
+
+    assert read_files(sqlite_dir) == read_files(json_dir)
+    assert fetcher.lookup_wallet_pairs("1wallet0") == ["poolA", "poolB", "poolC"]
+    assert fetcher.wallet_store.get_wallets("poolD") == ["ewallet0"]
+
+    # SQLite后端不再生成JSON备份和列式快照
+    assert not os.path.exists(os.path.join(sqlite_dir, "full_wallet_data_backup.json"))
+    assert not os.path.exists(os.path.join(sqlite_dir, WALLET_SNAPSHOT_FILE))
+
+    stages = {stage["name"] for stage in fetcher.metrics.stages}
+    assert {"upsert_wallet_store", "export_wallet_store"} <= stages
+    assert not {"load_existing_wallet_data", "merge_wallet_data"} & stages
+
+
+def test_incremental_export_rewrites_affected_shards(make_data_dir):
+    """增量模式只重新导出有新增交易对的分片，结果与全量导出一致"""
+    full_dir = make_data_dir()
+    run(full_dir, FIRST_RUN, "sqlite", shard_format="compact")
+    run(full_dir, SECOND_RUN, "sqlite", shard_format="compact")
+
+    data_dir = make_data_dir()
+    first_dir = run(data_dir, FIRST_RUN, "sqlite", shard_format="compact").output_dir
+    mtimes = {name: os.stat(os.path.join(first_dir, name)).st_mtime_ns
+              for name in os.listdir(first_dir) if name.startswith("wallets_") and name.endswith(".json")}
+    fetcher = run(data_dir, SECOND_RUN, "sqlite", incremental=True)
+
+    assert read_files(data_dir) == read_files(full_dir)
+
+    shard_count = fetcher._load_metadata()["sharding"]["shard_count"]
+    affected = {shard_filename(wallet_shard_id(wallet, shard_count), shard_count)
+                for wallet in ("1wallet0", "1wallet1", "ewallet0")}
+    rewritten = {name for name in os.listdir(fetcher.output_dir)
+                 if name.startswith("wallets_") and name.endswith(".json")
+                 and os.stat(os.path.join(fetcher.output_dir, name)).st_mtime_ns != mtimes.get(name)}
+    assert rewritten == affected
+
+
+def test_non_accumulating_run_replaces_store(data_dir):
+    """关闭累积时库中只保留本次数据，单文件API也从库中导出"""
+    run(data_dir, FIRST_RUN, "sqlite")
+
+    fetcher = MeteoraDataFetcher([1], data_dir=data_dir, dune_client=FakeDuneClient({1: SECOND_RUN}),
+                                 storage_backend="sqlite")
+    fetcher.run_data_fetch(use_grouped_storage=False, preserve_batches=False, batch_delay=0,
+                           accumulate_data=False)
+
+    assert len(fetcher.wallet_store) == 3
+    with open(os.path.join(fetcher.output_dir, "wallet_pairs_api.json"), 'r', encoding='utf-8') as f:
+        assert json.load(f) == {"1wallet0": ["poolA", "poolC"], "1wallet1": ["poolA", "poolC"],
+                                "ewallet0": ["poolD"]}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))